@@ -0,0 +1,224 @@
+# Benchmark suite run on a PC against the stm_sim simulated registers, under cpython or
+# the micropython unix port, from the project folder:
+# $ python benchmarks/host_suite.py [--json results.json] [--compare previous.json]
+# $ micropython benchmarks/host_suite.py --json results.json
+# The json results can be diffed between releases with --compare.
+import gc
+import json
+import sys
+import time
+
+sys.path.insert(0, __file__.rsplit("/", 2)[0] if __file__.count("/") > 1 else ".")
+
+import stm_sim
+
+sim = stm_sim.install()
+
+MICROPYTHON = sys.implementation.name == "micropython"
+
+# (samples, levels) of the LUT configurations to generate
+LUT_CONFIGS = ((25, 64), (100, 256), (1024, 256), (4096, 256))
+REGISTER_ITERATIONS = 10_000
+DMA_ITERATIONS = 200
+
+if MICROPYTHON:
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+else:
+    import tracemalloc
+
+    ticks_us = lambda: time.perf_counter_ns() // 1000
+    ticks_diff = lambda end, start: end - start
+
+results = []
+
+
+def record(name, value, unit):
+    results.append((name, value, unit))
+    print(f"{name:<36} {float(value):>14.2f} {unit}")
+
+
+def measure(func, *args):
+    # Returns (elapsed us, bytes allocated) of one call of func
+    gc.collect()
+    if MICROPYTHON:
+        gc.disable()
+        heap = gc.mem_alloc()
+        start = ticks_us()
+        func(*args)
+        elapsed = ticks_diff(ticks_us(), start)
+        allocated = gc.mem_alloc() - heap
+        gc.enable()
+    else:
+        tracemalloc.start()
+        start = ticks_us()
+        func(*args)
+        elapsed = ticks_diff(ticks_us(), start)
+        allocated = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return elapsed, allocated
+
+
+def bench_lut():
+    from signal_gen.lut import fill_lut, new_lut
+
+    for samples, levels in LUT_CONFIGS:
+        elapsed, allocated = measure(lambda: fill_lut(new_lut(samples), "sine", levels))
+        record(f"lut_{samples}x{levels}_time", elapsed, "us")
+        record(f"lut_{samples}x{levels}_alloc", allocated, "bytes")
+
+
+def bench_registers():
+    from signal_gen.stm_dma_timer import TIM2
+
+    def read(n):
+        reg = TIM2
+        for _ in range(n):
+            reg.CCR1
+
+    def write(n):
+        reg = TIM2
+        for i in range(n):
+            reg.CCR1 = i
+
+    def bitfield_write(n):
+        reg = TIM2
+        for i in range(n):
+            reg.CR1_ARPE = i & 1
+
+    for name, func in (
+        ("register_getattr", read),
+        ("register_setattr", write),
+        ("register_bitfield_setattr", bitfield_write),
+    ):
+        elapsed, _ = measure(func, REGISTER_ITERATIONS)
+        record(f"{name}_rate", REGISTER_ITERATIONS * 1_000_000 / max(1, elapsed), "ops/s")
+
+
+def bench_dma_bring_up():
+    from signal_gen.lut import get_lut
+    from signal_gen.stm_dma_timer import (
+        __HAL_RCC_DMAMUX1_CLK_ENABLE__,
+        __HAL_RCC_DMA1_CLK_ENABLE__,
+        HAL_DMA_Abort,
+        HAL_DMA_Init,
+        HAL_DMA_Start,
+        TIM1,
+        DMA_REQUEST_TIM16_CH1,
+        DMA_MEMORY_TO_PERIPH,
+        DMA_PINC_DISABLE,
+        DMA_MINC_ENABLE,
+        DMA_PDATAALIGN_WORD,
+        DMA_MDATAALIGN_BYTE,
+        DMA_CIRCULAR,
+        DMA_PRIORITY_HIGH,
+    )
+
+    lut = get_lut("sine", 25, 64)
+    destination = TIM1.__reg_addr__("CCR3")
+    __HAL_RCC_DMAMUX1_CLK_ENABLE__()
+    __HAL_RCC_DMA1_CLK_ENABLE__()
+
+    def bring_up(n):
+        for _ in range(n):
+            hdma = HAL_DMA_Init(
+                DMA=1,
+                Channel=2,
+                Request=DMA_REQUEST_TIM16_CH1,
+                Direction=DMA_MEMORY_TO_PERIPH,
+                PeriphInc=DMA_PINC_DISABLE,
+                MemInc=DMA_MINC_ENABLE,
+                PeriphDataAlignment=DMA_PDATAALIGN_WORD,
+                MemDataAlignment=DMA_MDATAALIGN_BYTE,
+                Mode=DMA_CIRCULAR,
+                Priority=DMA_PRIORITY_HIGH,
+            )
+            HAL_DMA_Start(hdma, DMA_MEMORY_TO_PERIPH, lut, destination, len(lut))
+            HAL_DMA_Abort(hdma)
+
+    elapsed, allocated = measure(bring_up, DMA_ITERATIONS)
+    record("dma_init_start_latency", elapsed / DMA_ITERATIONS, "us")
+    record("dma_init_start_alloc", allocated / DMA_ITERATIONS, "bytes")
+
+
+def bench_simulation():
+    # The default generator on the simulator, as simulated DMA samples per second
+    from signal_gen import SignalGenerator
+
+    generator = SignalGenerator()
+    generator.start()
+    simulated_us = 1000
+    samples = generator.freq * generator.samples * simulated_us // 1_000_000
+    elapsed, _ = measure(sim.run_us, simulated_us)
+    record("simulated_sample_rate", samples * 1_000_000 / max(1, elapsed), "samples/s")
+    generator.deinit()
+
+
+def bench_builder():
+    # Generates into a temporary file from cold and warm header index caches,
+    # in a separate process as the builder mocks out the micropython modules.
+    import subprocess
+
+    script = """
+import importlib.util, json, sys, tempfile, time
+from pathlib import Path
+spec = importlib.util.spec_from_file_location("builder", "stm_register_builder.py")
+builder = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(builder)
+header = next(Path("stm32lib/CMSIS").glob("*/Include/stm32wb55*.h"))
+hal_include = Path("stm32lib") / f"{header.parent.parent.name}_HAL_Driver" / "Inc"
+cache = dict(version=builder.HEADER_CACHE_VERSION, headers={})
+times = []
+with tempfile.TemporaryDirectory() as tmp:
+    for _ in range(2):
+        start = time.perf_counter()
+        getattr(builder, "__generate")(header.resolve(), hal_include.resolve(), ["signal_gen"], Path(tmp) / "out.py", cache)
+        times.append(time.perf_counter() - start)
+print(json.dumps(times))
+"""
+    root = __file__.rsplit("/", 2)[0] if __file__.count("/") > 1 else "."
+    proc = subprocess.run(
+        [sys.executable, "-c", script], cwd=root, capture_output=True, text=True
+    )
+    if proc.returncode:
+        print(f"builder benchmark skipped: {proc.stderr.strip().splitlines()[-1]}")
+        return
+    cold, warm = json.loads(proc.stdout.strip().splitlines()[-1])
+    record("builder_cold_time", cold * 1000, "ms")
+    record("builder_warm_time", warm * 1000, "ms")
+
+
+def compare(previous):
+    with open(previous) as f:
+        old = json.load(f)["results"]
+    print(f"\nchange since {previous}:")
+    for name, value, unit in results:
+        if name in old and old[name]["value"]:
+            change = (value - old[name]["value"]) * 100 / old[name]["value"]
+            print(f"{name:<36} {change:>+8.1f}%")
+
+
+def main(args):
+    print(f"{sys.implementation.name} {sys.version}")
+    bench_lut()
+    bench_registers()
+    bench_dma_bring_up()
+    bench_simulation()
+    if not MICROPYTHON:
+        bench_builder()
+
+    if "--json" in args:
+        with open(args[args.index("--json") + 1], "w") as f:
+            json.dump(
+                {
+                    "implementation": sys.implementation.name,
+                    "version": sys.version,
+                    "results": {name: {"value": value, "unit": unit} for name, value, unit in results},
+                },
+                f,
+            )
+    if "--compare" in args:
+        compare(args[args.index("--compare") + 1])
+
+
+main(sys.argv[1:])
@@ -0,0 +1,85 @@
+# Micro-benchmark of register access through the Register attribute dispatch
+# compared to the generated fixed address fast path, run on the device with the
+# registers generated for it too:
+# $ python stm_register_builder.py stm32wb55 signal_gen benchmarks/register_access.py
+# $ mpremote mount . run benchmarks/register_access.py
+import time
+
+import machine
+
+from signal_gen._stm_registers import (
+    TIM2,
+    TIM2_CCR1_ADDR,
+    reg_read,
+    reg_write,
+    reg_set_bits,
+)
+
+ITERATIONS = 10_000
+
+
+def bench(name, func):
+    start = time.ticks_us()
+    func(ITERATIONS)
+    elapsed = time.ticks_diff(time.ticks_us(), start)
+    print(f"{name:<28} {elapsed / ITERATIONS:8.2f} us/op  {ITERATIONS * 1_000_000 // elapsed:>8} ops/s")
+
+
+def register_read(n):
+    reg = TIM2
+    for _ in range(n):
+        reg.CCR1
+
+
+def register_write(n):
+    reg = TIM2
+    for i in range(n):
+        reg.CCR1 = i
+
+
+def register_rmw(n):
+    reg = TIM2
+    for _ in range(n):
+        reg.CCR1 |= 1
+
+
+def mem32_read(n):
+    mem32 = machine.mem32
+    for _ in range(n):
+        mem32[TIM2_CCR1_ADDR]
+
+
+def mem32_write(n):
+    mem32 = machine.mem32
+    for i in range(n):
+        mem32[TIM2_CCR1_ADDR] = i
+
+
+def viper_read(n):
+    for _ in range(n):
+        reg_read(TIM2_CCR1_ADDR)
+
+
+def viper_write(n):
+    for i in range(n):
+        reg_write(TIM2_CCR1_ADDR, i)
+
+
+def viper_rmw(n):
+    for _ in range(n):
+        reg_set_bits(TIM2_CCR1_ADDR, 1)
+
+
+saved = TIM2.CCR1
+for name, func in (
+    ("Register read", register_read),
+    ("Register write", register_write),
+    ("Register read-modify-write", register_rmw),
+    ("mem32 read", mem32_read),
+    ("mem32 write", mem32_write),
+    ("viper read", viper_read),
+    ("viper write", viper_write),
+    ("viper read-modify-write", viper_rmw),
+):
+    bench(name, func)
+TIM2.CCR1 = saved
@@ -0,0 +1,49 @@
+# Import latency and heap footprint of generated register modules, run on the device:
+# $ mpremote mount . run benchmarks/register_import.py
+import gc
+import sys
+import time
+
+# Add any other generated register modules to compare here.
+MODULES = ["signal_gen._stm_registers"]
+
+
+def measure(name):
+    sys.modules.pop(name, None)
+    gc.collect()
+    heap = gc.mem_alloc()
+    start = time.ticks_us()
+    module = __import__(name, None, None, ["Register"])
+    import_us = time.ticks_diff(time.ticks_us(), start)
+    gc.collect()
+    import_heap = gc.mem_alloc() - heap
+
+    # Peripherals and their structs are created lazily, measure touching every one of them.
+    heap = gc.mem_alloc()
+    start = time.ticks_us()
+    for peripheral in module._PERIPHERALS:
+        getattr(module, peripheral).__struct__
+    access_us = time.ticks_diff(time.ticks_us(), start)
+    gc.collect()
+    access_heap = gc.mem_alloc() - heap
+
+    # The uctypes descriptors of the register types, approximated by copying them
+    types = [
+        v for v in module.__dict__.values() if isinstance(v, type) and issubclass(v, module.Register)
+    ]
+    gc.collect()
+    heap = gc.mem_alloc()
+    copies = [dict(t.__desc__) for t in types]
+    desc_heap = gc.mem_alloc() - heap
+    entries = sum(len(t.__desc__) for t in types)
+    bitfields = entries - sum(len(t.__regs__) for t in types)
+    del copies
+
+    print(f"{name}:")
+    print(f"  import        {import_us:>8} us  {import_heap:>8} bytes heap")
+    print(f"  {len(module._PERIPHERALS):>3} peripherals {access_us:>6} us  {access_heap:>8} bytes heap on first access")
+    print(f"  {entries:>3} descriptor entries ({bitfields} bitfields)  {desc_heap:>8} bytes heap")
+
+
+for name in MODULES:
+    measure(name)
@@ -1 +1,18 @@
-from .signal_generator import *
+# The generator (and with it the register definitions and HAL layer) is only
+# loaded on first use, so importing the package costs next to nothing at boot.
+_LAZY = (
+    "SignalGenerator",
+    "SINE_FREQ",
+    "SINE_SAMPLES",
+    "SINE_MAX_LEVEL",
+    "SINE_PERIODS",
+    "SINE_NOISE_SHAPING",
+)
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module 'signal_gen' has no attribute '{name}'")
+    import signal_gen.signal_generator
+
+    return getattr(signal_gen.signal_generator, name)
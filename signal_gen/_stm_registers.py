@@ -3,28 +3,27 @@
 
 
 import uctypes
+import micropython
 from micropython import const
 
 
+_UINT32 = uctypes.UINT32
+_BFUINT32 = uctypes.BFUINT32
+_BF_POS = uctypes.BF_POS
+_BF_LEN = uctypes.BF_LEN
+
+
 class Register:
-    def __init__(self, addr) -> None:
-        if not hasattr(self.__class__, "__regs__"):
-            # We have register definitions defined on Register subclasses, which are used
-            # to create the uctypes.struct instances.
-            # These attributes get in the way of reading the struct attrs though, so move
-            # them to an class.__regs__ dict for referencing and delete from the class itself.
-            __regs__ = {k: v for k, v in self.__class__.__dict__.items() if not k.startswith("_")}
-            setattr(self.__class__, "__regs__", __regs__)
-            for k in __regs__:
-                delattr(self.__class__, k)
+    # Register offsets and the matching uctypes descriptor, generated on each subclass.
+    # The descriptor also has a <REGISTER>_<FIELD> bitfield for each field of the
+    # registers named in the requirements, eg. DMA1_Channel1.CCR_PL = 2 does a single
+    # masked write of CCR.
+    __regs__ = {}
+    __desc__ = {}
 
+    def __init__(self, addr) -> None:
         self.__addr__ = addr
 
-        descriptor = {
-            k: (v | uctypes.UINT32) for k, v in self.__class__.__regs__.items()  # type: ignore
-        }
-        self.__struct__ = uctypes.struct(addr, descriptor)
-
     def __reg_addr__(self, register: str):
         return self.__addr__ + self.__regs__[register]
 
@@ -42,6 +41,12 @@ class Register:
             print(f"{k : 10} (0x{v:04x}):  0x{val:04x}")
 
     def __getattr__(self, __name: str):
+        if __name == "__struct__":
+            # The uctypes struct is only created on first access of the peripheral.
+            struct = uctypes.struct(self.__addr__, self.__desc__)
+            self.__struct__ = struct
+            return struct
+
         if __name.startswith("_"):
             raise AttributeError(__name)
 
@@ -55,78 +60,399 @@ class Register:
             setattr(self.__struct__, __name, __value)
 
 
+# Fast path register access, bypassing the Register attribute lookups.
+# Use with the generated <INSTANCE>_<REGISTER>_ADDR constants (only those named in the
+# requirements are generated), eg.
+#   reg_set_bits(TIM16_DIER_ADDR, TIM_DIER_CC1DE)
+
+
+@micropython.viper
+def reg_read(addr: uint) -> uint:
+    return ptr32(addr)[0]
+
+
+@micropython.viper
+def reg_write(addr: uint, value: uint):
+    ptr32(addr)[0] = value
+
+
+@micropython.viper
+def reg_set_bits(addr: uint, bits: uint):
+    p = ptr32(addr)
+    p[0] = p[0] | bits
+
+
+@micropython.viper
+def reg_clear_bits(addr: uint, bits: uint):
+    p = ptr32(addr)
+    p[0] = p[0] & ~bits
+
+
+@micropython.viper
+def reg_modify(addr: uint, clear_bits: uint, set_bits: uint):
+    p = ptr32(addr)
+    p[0] = (p[0] & ~clear_bits) | set_bits
+
+
 
 
 PERIPH_BASE = const(0x40000000)  # Peripheral base address
 APB1PERIPH_BASE = const(PERIPH_BASE)
 APB2PERIPH_BASE = const(PERIPH_BASE + 0x00010000)
+AHB1PERIPH_BASE = const(PERIPH_BASE + 0x00020000)
+AHB4PERIPH_BASE = const(PERIPH_BASE + 0x18000000)
 TIM2_BASE = const(APB1PERIPH_BASE + 0x00000000)
-LPTIM1_BASE = const(APB1PERIPH_BASE + 0x00007C00)
-LPTIM2_BASE = const(APB1PERIPH_BASE + 0x00009400)
 TIM1_BASE = const(APB2PERIPH_BASE + 0x00002C00)
+TIM16_BASE = const(APB2PERIPH_BASE + 0x00004400)
+TIM17_BASE = const(APB2PERIPH_BASE + 0x00004800)
+DMA1_BASE = const(AHB1PERIPH_BASE + 0x00000000)
+DMA2_BASE = const(AHB1PERIPH_BASE + 0x00000400)
+DMAMUX1_BASE = const(AHB1PERIPH_BASE + 0x00000800)
+RCC_BASE = const(AHB4PERIPH_BASE + 0x00000000)
 DBGMCU_BASE = const(0xE0042000)
+DMA1_Channel1_BASE = const(DMA1_BASE + 0x00000008)
+DMA1_Channel2_BASE = const(DMA1_BASE + 0x0000001C)
+DMA1_Channel3_BASE = const(DMA1_BASE + 0x00000030)
+DMA1_Channel4_BASE = const(DMA1_BASE + 0x00000044)
+DMA1_Channel5_BASE = const(DMA1_BASE + 0x00000058)
+DMA1_Channel6_BASE = const(DMA1_BASE + 0x0000006C)
+DMA1_Channel7_BASE = const(DMA1_BASE + 0x00000080)
+DMA2_Channel1_BASE = const(DMA2_BASE + 0x00000008)
+DMA2_Channel2_BASE = const(DMA2_BASE + 0x0000001C)
+DMA2_Channel3_BASE = const(DMA2_BASE + 0x00000030)
+DMA2_Channel4_BASE = const(DMA2_BASE + 0x00000044)
+DMA2_Channel5_BASE = const(DMA2_BASE + 0x00000058)
+DMA2_Channel6_BASE = const(DMA2_BASE + 0x0000006C)
+DMA2_Channel7_BASE = const(DMA2_BASE + 0x00000080)
+DMAMUX1_Channel0_BASE = const(DMAMUX1_BASE + 0x00000000)
+DMAMUX1_Channel7_BASE = const(DMAMUX1_BASE + 0x0000001C)
+DMAMUX1_RequestGenerator0_BASE = const(DMAMUX1_BASE + 0x00000100)
+DMAMUX1_ChannelStatus_BASE = const(DMAMUX1_BASE + 0x00000080)
+DMAMUX1_RequestGenStatus_BASE = const(DMAMUX1_BASE + 0x00000140)
+DMA_CCR_EN = const(0x1 << 0)  # DMA_CCR_EN  # 0x00000001
+DMA_CCR_TCIE = const(0x1 << 1)  # DMA_CCR_TCIE  # 0x00000002
+DMA_CCR_HTIE = const(0x1 << 2)  # DMA_CCR_HTIE  # 0x00000004
+DMA_CCR_TEIE = const(0x1 << 3)  # DMA_CCR_TEIE  # 0x00000008
+DMA_CCR_DIR = const(0x1 << 4)  # DMA_CCR_DIR  # 0x00000010
+DMA_CCR_CIRC = const(0x1 << 5)  # DMA_CCR_CIRC  # 0x00000020
+DMA_CCR_PINC = const(0x1 << 6)  # DMA_CCR_PINC  # 0x00000040
+DMA_CCR_MINC = const(0x1 << 7)  # DMA_CCR_MINC  # 0x00000080
+DMA_CCR_PSIZE = const(0x3 << 8)  # DMA_CCR_PSIZE  # 0x00000300
+DMA_CCR_PSIZE_0 = const(0x1 << 8)
+DMA_CCR_PSIZE_1 = const(0x2 << 8)
+DMA_CCR_MSIZE = const(0x3 << 10)  # DMA_CCR_MSIZE  # 0x00000C00
+DMA_CCR_MSIZE_0 = const(0x1 << 10)
+DMA_CCR_MSIZE_1 = const(0x2 << 10)
+DMA_CCR_PL = const(0x3 << 12)  # DMA_CCR_PL  # 0x00003000
+DMA_CCR_PL_0 = const(0x1 << 12)
+DMA_CCR_PL_1 = const(0x2 << 12)
+DMA_CCR_MEM2MEM = const(0x1 << 14)  # DMA_CCR_MEM2MEM  # 0x00004000
+DMA_ISR_GIF1 = const(0x1 << 0)  # DMA_ISR_GIF1  # 0x00000001
+DMA_ISR_TCIF1 = const(0x1 << 1)  # DMA_ISR_TCIF1  # 0x00000002
+DMA_ISR_HTIF1 = const(0x1 << 2)  # DMA_ISR_HTIF1  # 0x00000004
+DMA_ISR_TEIF1 = const(0x1 << 3)  # DMA_ISR_TEIF1  # 0x00000008
+TIM_CR2_MMS = const(0x7 << 4)  # TIM_CR2_MMS  # 0x00000070
+TIM_CR2_MMS_0 = const(0x1 << 4)
+TIM_CR2_MMS_1 = const(0x2 << 4)
+TIM_SMCR_SMS = const(0x7 << 0)  # TIM_SMCR_SMS  # 0x00000007
+TIM_SMCR_SMS_1 = const(0x2 << 0)
+TIM_SMCR_SMS_2 = const(0x4 << 0)
+TIM_SMCR_TS = const(0x7 << 4)  # TIM_SMCR_TS  # 0x00000070
+TIM_SMCR_TS_0 = const(0x1 << 4)
+TIM_SMCR_TS_1 = const(0x2 << 4)
+TIM_SMCR_MSM = const(0x1 << 7)  # TIM_SMCR_MSM  # 0x00000080
+TIM_DIER_UDE = const(0x1 << 8)  # TIM_DIER_UDE  # 0x00000100
+TIM_DIER_CC1DE = const(0x1 << 9)  # TIM_DIER_CC1DE  # 0x00000200
+TIM_DIER_CC2DE = const(0x1 << 10)  # TIM_DIER_CC2DE  # 0x00000400
+TIM_DIER_CC3DE = const(0x1 << 11)  # TIM_DIER_CC3DE  # 0x00000800
+TIM_DIER_CC4DE = const(0x1 << 12)  # TIM_DIER_CC4DE  # 0x00001000
+TIM_DIER_COMDE = const(0x1 << 13)  # TIM_DIER_COMDE  # 0x00002000
+TIM_DIER_TDE = const(0x1 << 14)  # TIM_DIER_TDE  # 0x00004000
+TIM_EGR_UG = const(0x1 << 0)  # TIM_EGR_UG  # 0x00000001
+DMAMUX_CxCR_DMAREQ_ID = const(0x3F << 0)  # DMAMUX_CxCR_DMAREQ_ID  # 0x0000003F
+RCC_AHB1ENR_DMA1EN = const(0x1 << 0)  # RCC_AHB1ENR_DMA1EN  # 0x00000001
+RCC_AHB1ENR_DMA2EN = const(0x1 << 1)  # RCC_AHB1ENR_DMA2EN  # 0x00000002
+RCC_AHB1ENR_DMAMUX1EN = const(0x1 << 2)  # RCC_AHB1ENR_DMAMUX1EN  # 0x00000004
+RCC_CFGR_PPRE2 = const(0x7 << 11)  # RCC_CFGR_PPRE2  # 0x00003800
+LL_DMA_DIRECTION_PERIPH_TO_MEMORY = const(0x00000000)  # x
+LL_DMA_DIRECTION_MEMORY_TO_PERIPH = const(DMA_CCR_DIR)  # x
+LL_DMA_DIRECTION_MEMORY_TO_MEMORY = const(DMA_CCR_MEM2MEM)  # x
+LL_DMA_MODE_NORMAL = const(0x00000000)  # x
+LL_DMA_MODE_CIRCULAR = const(DMA_CCR_CIRC)  # x
+LL_DMA_PERIPH_INCREMENT = const(DMA_CCR_PINC)  # x
+LL_DMA_PERIPH_NOINCREMENT = const(0x00000000)  # x
+LL_DMA_MEMORY_INCREMENT = const(DMA_CCR_MINC)  # x
+LL_DMA_MEMORY_NOINCREMENT = const(0x00000000)  # x
+LL_DMA_PDATAALIGN_BYTE = const(0x00000000)  # x
+LL_DMA_PDATAALIGN_HALFWORD = const(DMA_CCR_PSIZE_0)  # x
+LL_DMA_PDATAALIGN_WORD = const(DMA_CCR_PSIZE_1)  # x
+LL_DMA_MDATAALIGN_BYTE = const(0x00000000)  # x
+LL_DMA_MDATAALIGN_HALFWORD = const(DMA_CCR_MSIZE_0)  # x
+LL_DMA_MDATAALIGN_WORD = const(DMA_CCR_MSIZE_1)  # x
+LL_DMA_PRIORITY_LOW = const(0x00000000)  # x
+LL_DMA_PRIORITY_MEDIUM = const(DMA_CCR_PL_0)  # x
+LL_DMA_PRIORITY_HIGH = const(DMA_CCR_PL_1)  # x
+LL_DMA_PRIORITY_VERYHIGH = const(DMA_CCR_PL)  # x
+LL_DMA_CCR_TCIE = const(DMA_CCR_TCIE)  # x
+LL_DMA_CCR_HTIE = const(DMA_CCR_HTIE)  # x
+LL_DMA_CCR_TEIE = const(DMA_CCR_TEIE)  # x
+LL_DMAMUX_REQ_MEM2MEM = const(0x00000000)  # DMAMUX MEM2MEM request
+LL_DMAMUX_REQ_GENERATOR0 = const(0x00000001)  # DMAMUX GENERATOR0 request
+LL_DMAMUX_REQ_GENERATOR1 = const(0x00000002)  # DMAMUX GENERATOR1 request
+LL_DMAMUX_REQ_GENERATOR2 = const(0x00000003)  # DMAMUX GENERATOR2 request
+LL_DMAMUX_REQ_GENERATOR3 = const(0x00000004)  # DMAMUX GENERATOR3 request
+LL_DMAMUX_REQ_SAI1_A = const(0x00000012)  # DMAMUX SAI1_A request
+LL_DMAMUX_REQ_SAI1_B = const(0x00000013)  # DMAMUX SAI1_B request
+LL_DMAMUX_REQ_TIM1_CH1 = const(0x00000015)  # DMAMUX TIM1_CH1 request
+LL_DMAMUX_REQ_TIM1_CH2 = const(0x00000016)  # DMAMUX TIM1_CH2 request
+LL_DMAMUX_REQ_TIM1_CH3 = const(0x00000017)  # DMAMUX TIM1_CH3 request
+LL_DMAMUX_REQ_TIM1_CH4 = const(0x00000018)  # DMAMUX TIM1_CH4 request
+LL_DMAMUX_REQ_TIM1_UP = const(0x00000019)  # DMAMUX TIM1_UP request
+LL_DMAMUX_REQ_TIM1_TRIG = const(0x0000001A)  # DMAMUX TIM1_TRIG request
+LL_DMAMUX_REQ_TIM1_COM = const(0x0000001B)  # DMAMUX TIM1_COM request
+LL_DMAMUX_REQ_TIM2_CH1 = const(0x0000001C)  # DMAMUX TIM2_CH1 request
+LL_DMAMUX_REQ_TIM2_CH2 = const(0x0000001D)  # DMAMUX TIM2_CH2 request
+LL_DMAMUX_REQ_TIM2_CH3 = const(0x0000001E)  # DMAMUX TIM2_CH3 request
+LL_DMAMUX_REQ_TIM2_CH4 = const(0x0000001F)  # DMAMUX TIM2_CH4 request
+LL_DMAMUX_REQ_TIM2_UP = const(0x00000020)  # DMAMUX TIM2_UP request
+LL_DMAMUX_REQ_TIM16_CH1 = const(0x00000021)  # DMAMUX TIM16_CH1 request
+LL_DMAMUX_REQ_TIM16_UP = const(0x00000022)  # DMAMUX TIM16_UP request
+LL_DMAMUX_REQ_TIM17_CH1 = const(0x00000023)  # DMAMUX TIM17_CH1 request
+LL_DMAMUX_REQ_TIM17_UP = const(0x00000024)  # DMAMUX TIM17_UP request
 
 
 # Debug MCU
 class DBGMCU_TypeDef(Register):
-    IDCODE: int = 0x00  # /*!< MCU device ID code,             Address offset: 0x00 */
-    CR: int = 0x04  # /*!< Debug MCU configuration register,      Address offset: 0x04 */
-    # RESERVED1[13]: int = 0x38  # /*!< Reserved,                        0x08-0x38 */
-    APB1FZR1: int = 0x3C  # /*!< Debug MCU CPU1 APB1 freeze register,     Address offset: 0x3C */
-    C2APB1FZR1: int = 0x40  # /*!< Debug MCU CPU2 APB1 freeze register,     Address offset: 0x40 */
-    APB1FZR2: int = 0x44  # /*!< Debug MCU CPU1 APB1 freeze register,     Address offset: 0x44 */
-    C2APB1FZR2: int = 0x48  # /*!< Debug MCU CPU2 APB1 freeze register,     Address offset: 0x48 */
-    APB2FZR: int = 0x4C  # /*!< Debug MCU CPU1 APB2 freeze register,     Address offset: 0x4C */
-    C2APB2FZR: int = 0x50  # /*!< Debug MCU CPU2 APB2 freeze register,     Address offset: 0x50 */
-
-# LPTIMER
-class LPTIM_TypeDef(Register):
-    ISR: int = 0x00  # /*!< LPTIM Interrupt and Status register,        Address offset: 0x00 */
-    ICR: int = 0x04  # /*!< LPTIM Interrupt Clear register,           Address offset: 0x04 */
-    IER: int = 0x08  # /*!< LPTIM Interrupt Enable register,          Address offset: 0x08 */
-    CFGR: int = 0x0C  # /*!< LPTIM Configuration register,            Address offset: 0x0C */
-    CR: int = 0x10  # /*!< LPTIM Control register,               Address offset: 0x10 */
-    CMP: int = 0x14  # /*!< LPTIM Compare register,               Address offset: 0x14 */
-    ARR: int = 0x18  # /*!< LPTIM Autoreload register,             Address offset: 0x18 */
-    CNT: int = 0x1C  # /*!< LPTIM Counter register,               Address offset: 0x1C */
-    OR: int = 0x20  # /*!< LPTIM Option register,               Address offset: 0x20 */
+    __regs__ = {
+        "IDCODE": 0x00,  # /*!< DBGMCU_TypeDef IDCODE register, Address offset: 0x00 */
+        "CR": 0x04,  # /*!< DBGMCU_TypeDef CR register, Address offset: 0x04 */
+    }
+    __desc__ = {
+        "IDCODE": 0x00 | _UINT32,
+        "CR": 0x04 | _UINT32,
+    }
+
+# DMA Controller
+class DMA_Channel_TypeDef(Register):
+    __regs__ = {
+        "CCR": 0x00,  # /*!< DMA_Channel_TypeDef CCR register, Address offset: 0x00 */
+        "CNDTR": 0x04,  # /*!< DMA_Channel_TypeDef CNDTR register, Address offset: 0x04 */
+        "CPAR": 0x08,  # /*!< DMA_Channel_TypeDef CPAR register, Address offset: 0x08 */
+        "CMAR": 0x0C,  # /*!< DMA_Channel_TypeDef CMAR register, Address offset: 0x0C */
+    }
+    __desc__ = {
+        "CCR": 0x00 | _UINT32,
+        "CNDTR": 0x04 | _UINT32,
+        "CPAR": 0x08 | _UINT32,
+        "CMAR": 0x0C | _UINT32,
+        "CCR_EN": 0x00 | _BFUINT32 | 0 << _BF_POS | 1 << _BF_LEN,
+    }
+
+# DMA
+class DMA_TypeDef(Register):
+    __regs__ = {
+        "ISR": 0x00,  # /*!< DMA_TypeDef ISR register, Address offset: 0x00 */
+        "IFCR": 0x04,  # /*!< DMA_TypeDef IFCR register, Address offset: 0x04 */
+    }
+    __desc__ = {
+        "ISR": 0x00 | _UINT32,
+        "IFCR": 0x04 | _UINT32,
+    }
+
+# DMAMUX Channel
+class DMAMUX_Channel_TypeDef(Register):
+    __regs__ = {
+        "CCR": 0x00,  # /*!< DMAMUX_Channel_TypeDef CCR register, Address offset: 0x00 */
+    }
+    __desc__ = {
+        "CCR": 0x00 | _UINT32,
+    }
+
+# DMAMUX Channel Status
+class DMAMUX_ChannelStatus_TypeDef(Register):
+    __regs__ = {
+        "CSR": 0x00,  # /*!< DMAMUX_ChannelStatus_TypeDef CSR register, Address offset: 0x00 */
+        "CFR": 0x04,  # /*!< DMAMUX_ChannelStatus_TypeDef CFR register, Address offset: 0x04 */
+    }
+    __desc__ = {
+        "CSR": 0x00 | _UINT32,
+        "CFR": 0x04 | _UINT32,
+    }
+
+# DMAMUX Request Generator
+class DMAMUX_RequestGen_TypeDef(Register):
+    __regs__ = {
+        "RGCR": 0x00,  # /*!< DMAMUX_RequestGen_TypeDef RGCR register, Address offset: 0x00 */
+    }
+    __desc__ = {
+        "RGCR": 0x00 | _UINT32,
+    }
+
+# DMAMUX Request Generator Status
+class DMAMUX_RequestGenStatus_TypeDef(Register):
+    __regs__ = {
+        "RGSR": 0x00,  # /*!< DMAMUX_RequestGenStatus_TypeDef RGSR register, Address offset: 0x00 */
+        "RGCFR": 0x04,  # /*!< DMAMUX_RequestGenStatus_TypeDef RGCFR register, Address offset: 0x04 */
+    }
+    __desc__ = {
+        "RGSR": 0x00 | _UINT32,
+        "RGCFR": 0x04 | _UINT32,
+    }
 
 # TIM
 class TIM_TypeDef(Register):
-    CR1: int = 0x00  # /*!< TIM control register 1,          Address offset: 0x00 */
-    CR2: int = 0x04  # /*!< TIM control register 2,          Address offset: 0x04 */
-    SMCR: int = 0x08  # /*!< TIM slave mode control register,     Address offset: 0x08 */
-    DIER: int = 0x0C  # /*!< TIM DMA/interrupt enable register,    Address offset: 0x0C */
-    SR: int = 0x10  # /*!< TIM status register,           Address offset: 0x10 */
-    EGR: int = 0x14  # /*!< TIM event generation register,      Address offset: 0x14 */
-    CCMR1: int = 0x18  # /*!< TIM capture/compare mode register 1,   Address offset: 0x18 */
-    CCMR2: int = 0x1C  # /*!< TIM capture/compare mode register 2,   Address offset: 0x1C */
-    CCER: int = 0x20  # /*!< TIM capture/compare enable register,   Address offset: 0x20 */
-    CNT: int = 0x24  # /*!< TIM counter register,           Address offset: 0x24 */
-    PSC: int = 0x28  # /*!< TIM prescaler register,          Address offset: 0x28 */
-    ARR: int = 0x2C  # /*!< TIM auto-reload register,         Address offset: 0x2C */
-    RCR: int = 0x30  # /*!< TIM repetition counter register,     Address offset: 0x30 */
-    CCR1: int = 0x34  # /*!< TIM capture/compare register 1,      Address offset: 0x34 */
-    CCR2: int = 0x38  # /*!< TIM capture/compare register 2,      Address offset: 0x38 */
-    CCR3: int = 0x3C  # /*!< TIM capture/compare register 3,      Address offset: 0x3C */
-    CCR4: int = 0x40  # /*!< TIM capture/compare register 4,      Address offset: 0x40 */
-    BDTR: int = 0x44  # /*!< TIM break and dead-time register,     Address offset: 0x44 */
-    DCR: int = 0x48  # /*!< TIM DMA control register,         Address offset: 0x48 */
-    DMAR: int = 0x4C  # /*!< TIM DMA address for full transfer,    Address offset: 0x4C */
-    OR: int = 0x50  # /*!< TIM option register            Address offset: 0x50 */
-    CCMR3: int = 0x54  # /*!< TIM capture/compare mode register 3,   Address offset: 0x54 */
-    CCR5: int = 0x58  # /*!< TIM capture/compare register5,      Address offset: 0x58 */
-    CCR6: int = 0x5C  # /*!< TIM capture/compare register6,      Address offset: 0x5C */
-    AF1: int = 0x60  # /*!< TIM Alternate function option register 1, Address offset: 0x60 */
-    AF2: int = 0x64  # /*!< TIM Alternate function option register 2, Address offset: 0x64 */
-
-TIM2 = TIM_TypeDef(TIM2_BASE)
-LPTIM1 = LPTIM_TypeDef(LPTIM1_BASE)
-LPTIM2 = LPTIM_TypeDef(LPTIM2_BASE)
-TIM1 = TIM_TypeDef(TIM1_BASE)
-DBGMCU = DBGMCU_TypeDef(DBGMCU_BASE)
-
-
-__dev_id = DBGMCU.IDCODE & 0xFFF
+    __regs__ = {
+        "CR1": 0x00,  # /*!< TIM_TypeDef CR1 register, Address offset: 0x00 */
+        "CR2": 0x04,  # /*!< TIM_TypeDef CR2 register, Address offset: 0x04 */
+        "SMCR": 0x08,  # /*!< TIM_TypeDef SMCR register, Address offset: 0x08 */
+        "DIER": 0x0C,  # /*!< TIM_TypeDef DIER register, Address offset: 0x0C */
+        "SR": 0x10,  # /*!< TIM_TypeDef SR register, Address offset: 0x10 */
+        "EGR": 0x14,  # /*!< TIM_TypeDef EGR register, Address offset: 0x14 */
+        "CCMR1": 0x18,  # /*!< TIM_TypeDef CCMR1 register, Address offset: 0x18 */
+        "CCMR2": 0x1C,  # /*!< TIM_TypeDef CCMR2 register, Address offset: 0x1C */
+        "CCER": 0x20,  # /*!< TIM_TypeDef CCER register, Address offset: 0x20 */
+        "CNT": 0x24,  # /*!< TIM_TypeDef CNT register, Address offset: 0x24 */
+        "PSC": 0x28,  # /*!< TIM_TypeDef PSC register, Address offset: 0x28 */
+        "ARR": 0x2C,  # /*!< TIM_TypeDef ARR register, Address offset: 0x2C */
+        "RCR": 0x30,  # /*!< TIM_TypeDef RCR register, Address offset: 0x30 */
+        "CCR1": 0x34,  # /*!< TIM_TypeDef CCR1 register, Address offset: 0x34 */
+        "CCR2": 0x38,  # /*!< TIM_TypeDef CCR2 register, Address offset: 0x38 */
+        "CCR3": 0x3C,  # /*!< TIM_TypeDef CCR3 register, Address offset: 0x3C */
+        "CCR4": 0x40,  # /*!< TIM_TypeDef CCR4 register, Address offset: 0x40 */
+        "BDTR": 0x44,  # /*!< TIM_TypeDef BDTR register, Address offset: 0x44 */
+        "DCR": 0x48,  # /*!< TIM_TypeDef DCR register, Address offset: 0x48 */
+        "DMAR": 0x4C,  # /*!< TIM_TypeDef DMAR register, Address offset: 0x4C */
+        "OR": 0x50,  # /*!< TIM_TypeDef OR register, Address offset: 0x50 */
+        "CCMR3": 0x54,  # /*!< TIM_TypeDef CCMR3 register, Address offset: 0x54 */
+        "CCR5": 0x58,  # /*!< TIM_TypeDef CCR5 register, Address offset: 0x58 */
+        "CCR6": 0x5C,  # /*!< TIM_TypeDef CCR6 register, Address offset: 0x5C */
+        "AF1": 0x60,  # /*!< TIM_TypeDef AF1 register, Address offset: 0x60 */
+        "AF2": 0x64,  # /*!< TIM_TypeDef AF2 register, Address offset: 0x64 */
+    }
+    __desc__ = {
+        "CR1": 0x00 | _UINT32,
+        "CR2": 0x04 | _UINT32,
+        "SMCR": 0x08 | _UINT32,
+        "DIER": 0x0C | _UINT32,
+        "SR": 0x10 | _UINT32,
+        "EGR": 0x14 | _UINT32,
+        "CCMR1": 0x18 | _UINT32,
+        "CCMR2": 0x1C | _UINT32,
+        "CCER": 0x20 | _UINT32,
+        "CNT": 0x24 | _UINT32,
+        "PSC": 0x28 | _UINT32,
+        "ARR": 0x2C | _UINT32,
+        "RCR": 0x30 | _UINT32,
+        "CCR1": 0x34 | _UINT32,
+        "CCR2": 0x38 | _UINT32,
+        "CCR3": 0x3C | _UINT32,
+        "CCR4": 0x40 | _UINT32,
+        "BDTR": 0x44 | _UINT32,
+        "DCR": 0x48 | _UINT32,
+        "DMAR": 0x4C | _UINT32,
+        "OR": 0x50 | _UINT32,
+        "CCMR3": 0x54 | _UINT32,
+        "CCR5": 0x58 | _UINT32,
+        "CCR6": 0x5C | _UINT32,
+        "AF1": 0x60 | _UINT32,
+        "AF2": 0x64 | _UINT32,
+        "CR1_CEN": 0x00 | _BFUINT32 | 0 << _BF_POS | 1 << _BF_LEN,
+        "CR1_UDIS": 0x00 | _BFUINT32 | 1 << _BF_POS | 1 << _BF_LEN,
+        "CR1_ARPE": 0x00 | _BFUINT32 | 7 << _BF_POS | 1 << _BF_LEN,
+    }
+
+# Reset and Clock Control
+class RCC_TypeDef(Register):
+    __regs__ = {
+        "CR": 0x00,  # /*!< RCC_TypeDef CR register, Address offset: 0x00 */
+        "ICSCR": 0x04,  # /*!< RCC_TypeDef ICSCR register, Address offset: 0x04 */
+        "CFGR": 0x08,  # /*!< RCC_TypeDef CFGR register, Address offset: 0x08 */
+        "PLLCFGR": 0x0C,  # /*!< RCC_TypeDef PLLCFGR register, Address offset: 0x0C */
+        "PLLSAI1CFGR": 0x10,  # /*!< RCC_TypeDef PLLSAI1CFGR register, Address offset: 0x10 */
+        # "RESERVED0": 0x14,  # /*!< Reserved, Address offset: 0x14 */
+        "CIER": 0x18,  # /*!< RCC_TypeDef CIER register, Address offset: 0x18 */
+        "CIFR": 0x1C,  # /*!< RCC_TypeDef CIFR register, Address offset: 0x1C */
+        "CICR": 0x20,  # /*!< RCC_TypeDef CICR register, Address offset: 0x20 */
+        "SMPSCR": 0x24,  # /*!< RCC_TypeDef SMPSCR register, Address offset: 0x24 */
+        "AHB1RSTR": 0x28,  # /*!< RCC_TypeDef AHB1RSTR register, Address offset: 0x28 */
+        "AHB2RSTR": 0x2C,  # /*!< RCC_TypeDef AHB2RSTR register, Address offset: 0x2C */
+        "AHB3RSTR": 0x30,  # /*!< RCC_TypeDef AHB3RSTR register, Address offset: 0x30 */
+        # "RESERVED1": 0x34,  # /*!< Reserved, Address offset: 0x34 */
+        "APB1RSTR1": 0x38,  # /*!< RCC_TypeDef APB1RSTR1 register, Address offset: 0x38 */
+        "APB1RSTR2": 0x3C,  # /*!< RCC_TypeDef APB1RSTR2 register, Address offset: 0x3C */
+        "APB2RSTR": 0x40,  # /*!< RCC_TypeDef APB2RSTR register, Address offset: 0x40 */
+        "APB3RSTR": 0x44,  # /*!< RCC_TypeDef APB3RSTR register, Address offset: 0x44 */
+        "AHB1ENR": 0x48,  # /*!< RCC_TypeDef AHB1ENR register, Address offset: 0x48 */
+        "AHB2ENR": 0x4C,  # /*!< RCC_TypeDef AHB2ENR register, Address offset: 0x4C */
+        "AHB3ENR": 0x50,  # /*!< RCC_TypeDef AHB3ENR register, Address offset: 0x50 */
+        # "RESERVED2": 0x54,  # /*!< Reserved, Address offset: 0x54 */
+        "APB1ENR1": 0x58,  # /*!< RCC_TypeDef APB1ENR1 register, Address offset: 0x58 */
+        "APB1ENR2": 0x5C,  # /*!< RCC_TypeDef APB1ENR2 register, Address offset: 0x5C */
+        "APB2ENR": 0x60,  # /*!< RCC_TypeDef APB2ENR register, Address offset: 0x60 */
+    }
+    __desc__ = {
+        "CR": 0x00 | _UINT32,
+        "ICSCR": 0x04 | _UINT32,
+        "CFGR": 0x08 | _UINT32,
+        "PLLCFGR": 0x0C | _UINT32,
+        "PLLSAI1CFGR": 0x10 | _UINT32,
+        "CIER": 0x18 | _UINT32,
+        "CIFR": 0x1C | _UINT32,
+        "CICR": 0x20 | _UINT32,
+        "SMPSCR": 0x24 | _UINT32,
+        "AHB1RSTR": 0x28 | _UINT32,
+        "AHB2RSTR": 0x2C | _UINT32,
+        "AHB3RSTR": 0x30 | _UINT32,
+        "APB1RSTR1": 0x38 | _UINT32,
+        "APB1RSTR2": 0x3C | _UINT32,
+        "APB2RSTR": 0x40 | _UINT32,
+        "APB3RSTR": 0x44 | _UINT32,
+        "AHB1ENR": 0x48 | _UINT32,
+        "AHB2ENR": 0x4C | _UINT32,
+        "AHB3ENR": 0x50 | _UINT32,
+        "APB1ENR1": 0x58 | _UINT32,
+        "APB1ENR2": 0x5C | _UINT32,
+        "APB2ENR": 0x60 | _UINT32,
+    }
+
+_PERIPHERALS = {
+    "TIM1": (TIM_TypeDef, TIM1_BASE),
+    "TIM2": (TIM_TypeDef, TIM2_BASE),
+    "TIM16": (TIM_TypeDef, TIM16_BASE),
+    "TIM17": (TIM_TypeDef, TIM17_BASE),
+    "DMA1": (DMA_TypeDef, DMA1_BASE),
+    "DMA2": (DMA_TypeDef, DMA2_BASE),
+    "DMA1_Channel1": (DMA_Channel_TypeDef, DMA1_Channel1_BASE),
+    "DMA1_Channel2": (DMA_Channel_TypeDef, DMA1_Channel2_BASE),
+    "DMA1_Channel3": (DMA_Channel_TypeDef, DMA1_Channel3_BASE),
+    "DMA1_Channel4": (DMA_Channel_TypeDef, DMA1_Channel4_BASE),
+    "DMA1_Channel5": (DMA_Channel_TypeDef, DMA1_Channel5_BASE),
+    "DMA1_Channel6": (DMA_Channel_TypeDef, DMA1_Channel6_BASE),
+    "DMA1_Channel7": (DMA_Channel_TypeDef, DMA1_Channel7_BASE),
+    "DMA2_Channel1": (DMA_Channel_TypeDef, DMA2_Channel1_BASE),
+    "DMA2_Channel2": (DMA_Channel_TypeDef, DMA2_Channel2_BASE),
+    "DMA2_Channel3": (DMA_Channel_TypeDef, DMA2_Channel3_BASE),
+    "DMA2_Channel4": (DMA_Channel_TypeDef, DMA2_Channel4_BASE),
+    "DMA2_Channel5": (DMA_Channel_TypeDef, DMA2_Channel5_BASE),
+    "DMA2_Channel6": (DMA_Channel_TypeDef, DMA2_Channel6_BASE),
+    "DMA2_Channel7": (DMA_Channel_TypeDef, DMA2_Channel7_BASE),
+    "DMAMUX1_ChannelStatus": (DMAMUX_ChannelStatus_TypeDef, DMAMUX1_ChannelStatus_BASE),
+    "DMAMUX1_RequestGenStatus": (DMAMUX_RequestGenStatus_TypeDef, DMAMUX1_RequestGenStatus_BASE),
+    "RCC": (RCC_TypeDef, RCC_BASE),
+    "DBGMCU": (DBGMCU_TypeDef, DBGMCU_BASE),
+}
+
+
+def __getattr__(name):
+    if name not in _PERIPHERALS:
+        raise AttributeError(name)
+    typedef, base = _PERIPHERALS[name]
+    peripheral = globals()[name] = typedef(base)
+    return peripheral
+
+
+
+
+__dev_id = __getattr__("DBGMCU").IDCODE & 0xFFF
 if __dev_id != 0x495:
     raise RuntimeError(f"_stm_registers.py was generated for stm32wb (0x495), running on {__dev_id}")
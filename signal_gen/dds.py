@@ -0,0 +1,201 @@
+from array import array
+
+import micropython
+from machine import Pin
+from pyb import Timer
+
+from signal_gen.dma_stream import DoubleBufferStream
+from signal_gen.lut import get_lut, lut_width_of, new_lut
+from signal_gen.resources import dma_resources
+from signal_gen.stm_dma_timer import (
+    __HAL_TIM_ENABLE_DMA__,
+    __HAL_TIM_DISABLE_DMA__,
+    TIM_DMA_CC1,
+    TIM1,
+    TIM16,
+    DMA_REQUEST_TIM16_CH1,
+    DMA_MEMORY_TO_PERIPH,
+    DMA_PINC_DISABLE,
+    DMA_MINC_ENABLE,
+    DMA_PDATAALIGN_WORD,
+    DMA_CIRCULAR,
+    DMA_PRIORITY_HIGH,
+)
+
+# Phase accumulator is a full 32bit word
+_ACC_BITS = 32
+
+
+@micropython.viper
+def _dds_fill(buf: ptr8, n: int, table: ptr8, state: ptr32, shift: int):
+    # state is [phase accumulator, tuning word], uint maths wraps at 32 bits
+    acc = uint(state[0])
+    step = uint(state[1])
+    for i in range(n):
+        buf[i] = table[acc >> shift]
+        acc += step
+    state[0] = acc
+
+
+@micropython.viper
+def _dds_fill16(buf: ptr16, n: int, table: ptr16, state: ptr32, shift: int):
+    # _dds_fill for halfword tables, above 256 levels
+    acc = uint(state[0])
+    step = uint(state[1])
+    for i in range(n):
+        buf[i] = table[acc >> shift]
+        acc += step
+    state[0] = acc
+
+
+class DDSGenerator:
+    """
+    Direct digital synthesis of a sine wave at a fixed sample clock.
+
+    A 32bit phase accumulator advances by a tuning word each sample, the top
+    `table_bits` of it index a large master sine table. The resampled output is
+    written in batches into a long ping-pong DMA buffer (see DoubleBufferStream),
+    so the frequency resolution is sample_rate / 2**32 and retuning never touches
+    the timer dividers. The timers and DMA channel are only set up by start(), and
+    handed back by stop() / deinit().
+
+    `poll()` needs calling at least twice per buffer period, eg. from a timer:
+        dds = DDSGenerator(freq=40_000.5)
+        dds.start()
+        poll_timer = Timer(2, freq=1000, callback=lambda t: dds.poll())
+    """
+
+    def __init__(
+        self,
+        freq,
+        sample_rate=1_000_000,
+        levels=64,
+        table_bits=12,
+        buffer_samples=4096,
+        pwm_pin="A10",
+        pwm_freq=1_000_000,
+        dma=None,
+        dma_channel=None,
+    ):
+        self.sample_rate = sample_rate
+        self.max_level = levels
+        self.table_bits = table_bits
+        self.buffer_samples = buffer_samples
+        self.pwm_pin = pwm_pin
+        self.pwm_freq = pwm_freq
+        self.dma = (dma, dma_channel)
+        self.shift = _ACC_BITS - table_bits
+        self.state = array("I", (0, 0))
+        self.set_frequency(freq)
+        self.table = None
+        self.buffer = None
+        self.pwm_timer = None
+        self.pwm_channel = None
+        self.sample_timer = None
+        self.stream = None
+
+    def running(self):
+        return self.stream is not None
+
+    def start(self):
+        if self.stream is not None:
+            return
+        # Any free DMA channel unless one's given, TIM1 and TIM16 are booked with it
+        # before touching any of them
+        self.dma = dma_resources.claim(self, DMA_REQUEST_TIM16_CH1, (1, 16), *self.dma)
+        try:
+            self._start()
+        except Exception:
+            self._deinit_timers()
+            dma_resources.release(self)
+            raise
+
+    def _start(self):
+        # For PWM, the pin, timer and channel number must all match,
+        # eg pin PA10 has an Alternate Function of TIM1_CH3
+        self.pwm_timer = Timer(1, freq=self.pwm_freq)
+        if self.max_level > self.pwm_timer.period() + 1:
+            raise ValueError(
+                f"{self.max_level} levels exceed the PWM resolution at {self.pwm_freq}Hz"
+            )
+        self.pwm_channel = self.pwm_timer.channel(
+            3, Timer.PWM, pin=Pin(self.pwm_pin, Pin.OUT), pulse_width=0
+        )
+
+        # Fixed sample clock, triggering the DMA through the TIM16 CH1 request.
+        self.sample_timer = Timer(16, freq=self.sample_rate)
+        self.sample_timer.channel(1, Timer.OC_TIMING, pulse_width=1)
+
+        # The master table and DMA buffer are kept from the first start()
+        if self.table is None:
+            self.table = get_lut("sine", 1 << self.table_bits, self.max_level)
+            width = lut_width_of(self.table)
+            self._fill = _dds_fill16 if width == 2 else _dds_fill
+            self.buffer = new_lut(self.buffer_samples, width)
+
+        hdma = dma_resources.init(
+            self,
+            DMA_REQUEST_TIM16_CH1,
+            (1, 16),
+            *self.dma,
+            Direction=DMA_MEMORY_TO_PERIPH,
+            PeriphInc=DMA_PINC_DISABLE,
+            MemInc=DMA_MINC_ENABLE,
+            PeriphDataAlignment=DMA_PDATAALIGN_WORD,
+            MemDataAlignment=self.table,
+            Mode=DMA_CIRCULAR,
+            Priority=DMA_PRIORITY_HIGH,
+        )
+        stream = DoubleBufferStream(hdma, TIM1.__reg_addr__("CCR3"), self.buffer, self.fill)
+        self.state[0] = 0
+        stream.start()
+        __HAL_TIM_ENABLE_DMA__(TIM16, TIM_DMA_CC1)
+        self.stream = stream
+
+    def set_frequency(self, freq):
+        """
+        Change the tuning word, taking effect from the next buffer refill.
+        Returns the actual frequency achieved.
+        """
+        if not 0 <= freq < self.sample_rate / 2:
+            raise ValueError(f"{freq}Hz is above the nyquist limit of {self.sample_rate // 2}Hz")
+        # Single precision floats can't hold freq * 2**32, so it's worked out in
+        # integers: the whole Hz, and the fraction (exact once split off) to
+        # 2**-20Hz, well below the sample_rate / 2**32 resolution.
+        whole = int(freq)
+        frac = int((freq - whole) * (1 << 20))
+        step = (((whole << 20) + frac) << (_ACC_BITS - 20)) // self.sample_rate
+        self.state[1] = step
+        self.freq = step * self.sample_rate / (1 << _ACC_BITS)
+        return self.freq
+
+    def fill(self, buf):
+        self._fill(buf, len(buf), self.table, self.state, self.shift)
+
+    def stop(self):
+        if self.stream is None:
+            return
+        __HAL_TIM_DISABLE_DMA__(TIM16, TIM_DMA_CC1)
+        self.stream.stop()
+        self.pwm_channel.pulse_width(0)
+        self.stream = None
+        dma_resources.release(self)
+
+    def _deinit_timers(self):
+        for timer in (self.pwm_timer, self.sample_timer):
+            if timer is not None:
+                timer.deinit()
+        self.pwm_timer = None
+        self.pwm_channel = None
+        self.sample_timer = None
+
+    def deinit(self):
+        # stop() and switch off both timers
+        self.stop()
+        self._deinit_timers()
+
+    def poll(self):
+        # Safe from a timer callback left running after stop()
+        stream = self.stream
+        if stream is not None:
+            stream.poll()
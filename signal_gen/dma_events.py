@@ -0,0 +1,154 @@
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+from pyb import Timer
+
+from signal_gen.hot_swap import HotSwap
+from signal_gen.stm_dma_timer import (
+    DMA_HandleTypeDef,
+    DMA_GetMemDataAlignment,
+    DMA_FLAG_HT1,
+    DMA_FLAG_TC1,
+    DMA_FLAG_TE1,
+    HAL_DMA_ERROR_TE,
+)
+
+_DMA_FLAGS = DMA_FLAG_HT1 | DMA_FLAG_TC1 | DMA_FLAG_TE1
+
+
+class DMAEvents:
+    """
+    Wakes asyncio tasks on a DMA channel's half transfer, transfer complete and
+    transfer error events, each a ThreadSafeFlag:
+
+        events = DMAEvents(hdma, 4, 2000)
+        events.start()
+        await events.half.wait()
+
+    The micropython firmware owns the DMA interrupt vectors, so the handler runs
+    from a pyb.Timer interrupt at poll_freq instead, picking up the ISR flags the
+    channel latches regardless. Waiting tasks cost nothing in between and wake at
+    most 1 / poll_freq after the event. For halves / periods to be counted exactly
+    poll_freq needs to be at least twice the half transfer rate, so there's no
+    default: a channel wrapping a 25 sample LUT at 40kHz needs 160kHz.
+    """
+
+    def __init__(self, hdma: DMA_HandleTypeDef, timer, poll_freq):
+        self.hdma = hdma
+        self.timer_id = timer
+        self.poll_freq = poll_freq
+        self.half = asyncio.ThreadSafeFlag()
+        self.complete = asyncio.ThreadSafeFlag()
+        self.error = asyncio.ThreadSafeFlag()
+        self.halves = 0
+        self.periods = 0
+        self.errors = 0
+        self.timer = None
+
+    def start(self):
+        self.reset()
+        self.timer = Timer(self.timer_id, freq=self.poll_freq, callback=self._irq)
+
+    def set_poll_freq(self, poll_freq):
+        # Eg. following the DMA to a new sample rate
+        self.poll_freq = poll_freq
+        if self.timer is not None:
+            self.timer.freq(poll_freq)
+
+    def stop(self):
+        if self.timer is not None:
+            self.timer.deinit()
+            self.timer = None
+
+    def reset(self):
+        # Forget any events so far, eg. after re-pointing the channel
+        hdma = self.hdma
+        hdma.DmaBaseAddress.IFCR = _DMA_FLAGS << (hdma.ChannelIndex & 0x1C)
+        self.half.clear()
+        self.complete.clear()
+        self.error.clear()
+
+    def _irq(self, timer):
+        hdma = self.hdma
+        shift = hdma.ChannelIndex & 0x1C
+        flags = (hdma.DmaBaseAddress.ISR >> shift) & _DMA_FLAGS
+        if not flags:
+            return
+        hdma.DmaBaseAddress.IFCR = flags << shift
+        if flags & DMA_FLAG_HT1:
+            self.halves += 1
+            self.half.set()
+        if flags & DMA_FLAG_TC1:
+            self.periods += 1
+            self.complete.set()
+        if flags & DMA_FLAG_TE1:
+            # As HAL_DMA_IRQHandler, for anyone else watching the channel
+            hdma.ErrorCode = HAL_DMA_ERROR_TE
+            self.errors += 1
+            self.error.set()
+
+
+class WaveformQueue:
+    """
+    Plays LUT's one after the other on a running SignalGenerator with events, from
+    an asyncio task:
+
+        queue = WaveformQueue(generator)
+        asyncio.create_task(queue.run())
+        await queue.put(fill_lut(new_lut(25), "triangle", 64), repeat=1000)
+
+    Each LUT loops repeat times, then the next one takes over. A LUT of the same
+    size, width and periods as the one playing is swapped in at the end of its last loop with no
+    gap (see HotSwap); others restart the DMA like SignalGenerator.set_waveform(),
+    as soon as the last loop's transfer complete event is picked up.
+    Once the queue runs dry the last LUT keeps looping.
+    """
+
+    def __init__(self, generator, size=4):
+        if generator.event_timer is None:
+            raise ValueError("The generator needs an event_timer for a WaveformQueue")
+        self.generator = generator
+        self.size = size
+        self._items = []  # (lut, periods, repeat)
+        self._added = asyncio.ThreadSafeFlag()
+        self._taken = asyncio.ThreadSafeFlag()
+
+    def __len__(self):
+        return len(self._items)
+
+    async def put(self, lut, periods=1, repeat=1):
+        while len(self._items) >= self.size:
+            await self._taken.wait()
+        self._items.append((lut, periods, repeat))
+        self._added.set()
+
+    async def run(self):
+        generator = self.generator
+        events = generator._events()
+        swap = HotSwap(generator.hdma, generator.DstAddress)
+        while True:
+            while not self._items:
+                await self._added.wait()
+            lut, periods, repeat = self._items.pop(0)
+            self._taken.set()
+
+            current = generator.lut
+            width = DMA_GetMemDataAlignment(lut)
+            same = len(lut) == len(current) and periods == generator.periods
+            events.reset()
+            if not same or width != DMA_GetMemDataAlignment(current):
+                await events.complete.wait()
+                generator.set_waveform(lut, periods)
+            else:
+                # Into the second half of the last loop, then spin for the wrap
+                await events.half.wait()
+                swap.current = current
+                swap.stage(lut)
+                while not swap.poll():
+                    await asyncio.sleep(0)
+                generator.lut = lut
+            events.reset()
+            for _ in range(repeat - 1):
+                await events.complete.wait()
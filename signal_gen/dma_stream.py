@@ -0,0 +1,122 @@
+import micropython
+
+from signal_gen.stm_dma_timer import (
+    DMA_HandleTypeDef,
+    HAL_DMA_Abort,
+    HAL_DMA_IRQHandler,
+    HAL_DMA_Start_IT,
+    DMA_MEMORY_TO_PERIPH,
+)
+
+
+class DoubleBufferStream:
+    """
+    Streams samples from a python producer through a circular DMA channel
+    using a ping-pong buffer.
+
+    The DMA channel loops over `buffer` as usual. Each time it finishes one half
+    (half-transfer / transfer-complete flags) that half is refilled by the producer
+    while the DMA clocks out the other half.
+
+    `producer` is either:
+     * a callable `producer(buf) -> int` which fills the memoryview `buf` in place
+       and returns the number of samples written (None meaning all of them), or
+     * an iterator / generator yielding buffers of samples, copied into the half.
+
+    If the producer can't provide a full half, or the DMA wraps back into a half
+    that has not been refilled in time, `underruns` is incremented. Short fills are
+    padded with `idle`.
+
+    `poll()` must be called regularly (at least twice per buffer period), typically
+    from a pyb.Timer callback:
+        stream_timer = Timer(4, freq=1000, callback=lambda t: stream.poll())
+    """
+
+    def __init__(
+        self,
+        hdma: DMA_HandleTypeDef,
+        DstAddress,
+        buffer,
+        producer,
+        idle=0,
+        Direction=DMA_MEMORY_TO_PERIPH,
+    ):
+        self.hdma = hdma
+        self.DstAddress = DstAddress
+        self.Direction = Direction
+        self.buffer = buffer
+        self.producer = producer
+        self.idle = idle
+
+        half = len(buffer) // 2
+        if not half or len(buffer) % 2:
+            raise ValueError("buffer needs an even, non-zero length")
+        mv = memoryview(buffer)
+        self._halves = (mv[:half], mv[half:])
+        self._iterator = not callable(producer)
+
+        self.underruns = 0
+        self.exhausted = False
+        # A half is stale once the DMA has finished with it and until it's been refilled.
+        self._stale = [False, False]
+
+        # Pre-bound so that scheduling from the irq handler doesn't allocate.
+        self._refill_cb = self._refill
+
+        hdma.XferHalfCpltCallback = self._half_done
+        hdma.XferCpltCallback = self._full_done
+
+    def start(self):
+        self._fill(0)
+        self._fill(1)
+        HAL_DMA_Start_IT(
+            self.hdma, self.Direction, self.buffer, self.DstAddress, len(self.buffer)
+        )
+
+    def stop(self):
+        HAL_DMA_Abort(self.hdma)
+
+    def poll(self):
+        HAL_DMA_IRQHandler(self.hdma)
+
+    def _half_done(self, hdma):
+        # First half has been sent, DMA is now reading the second half.
+        self._finished(0)
+
+    def _full_done(self, hdma):
+        # Second half has been sent, DMA has wrapped back to the first half.
+        self._finished(1)
+
+    def _finished(self, half):
+        if self._stale[half ^ 1]:
+            # DMA has moved on into the other half before it was refilled.
+            self.underruns += 1
+        self._stale[half] = True
+        micropython.schedule(self._refill_cb, half)
+
+    def _refill(self, half):
+        self._fill(half)
+        self._stale[half] = False
+
+    def _fill(self, half):
+        buf = self._halves[half]
+        size = len(buf)
+        n = 0
+        if not self.exhausted:
+            if self._iterator:
+                try:
+                    chunk = next(self.producer)
+                    n = min(len(chunk), size)
+                    buf[:n] = chunk[:n]
+                except StopIteration:
+                    self.exhausted = True
+            else:
+                n = self.producer(buf)
+                if n is None:
+                    n = size
+            if n < size and not self.exhausted:
+                self.underruns += 1
+
+        idle = self.idle
+        for i in range(n, size):
+            buf[i] = idle
@@ -0,0 +1,148 @@
+import micropython
+from micropython import const
+
+from signal_gen.lut import new_lut
+from signal_gen.stm_dma_timer import (
+    DMA_HandleTypeDef,
+    DMA_CheckBuffer,
+    HAL_DMA_Start,
+    DMA_MEMORY_TO_PERIPH,
+)
+
+# Word offsets in DMA_Channel_TypeDef
+_CCR = const(0)
+_CNDTR = const(1)
+_CMAR = const(3)
+
+
+@micropython.viper
+def _swap_at_wrap(addr: uint, cmar: int, cndtr: int, spins: int) -> bool:
+    # Busy-wait for the circular transfer to wrap (CNDTR reloading back up), then
+    # re-point the channel before the next request. The channel has to be disabled
+    # to write CMAR / CNDTR; the timer's DMA request is held meanwhile, so as long as
+    # this takes less than a sample period no sample is lost or delayed.
+    channel = ptr32(addr)
+    last = channel[_CNDTR]
+    while spins > 0:
+        remaining = channel[_CNDTR]
+        if remaining > last:
+            ccr = channel[_CCR]
+            channel[_CCR] = ccr & ~1
+            channel[_CMAR] = cmar
+            channel[_CNDTR] = cndtr
+            channel[_CCR] = ccr | 1
+            return True
+        last = remaining
+        spins -= 1
+    return False
+
+
+class BufferPool:
+    """
+    A fixed set of equally sized LUT buffers, allocated up front and handed out /
+    returned without touching the heap.
+    """
+
+    def __init__(self, count, samples, width=1):
+        self.buffers = [new_lut(samples, width) for _ in range(count)]
+        self._free = list(self.buffers)
+
+    def acquire(self):
+        if not self._free:
+            raise RuntimeError("Buffer pool exhausted")
+        return self._free.pop()
+
+    def release(self, buf):
+        # Buffers from elsewhere (eg. the first one started) are left alone
+        for b in self.buffers:
+            if b is buf:
+                self._free.append(buf)
+                return
+
+    def free(self):
+        return len(self._free)
+
+
+class HotSwap:
+    """
+    Switches a running circular memory to peripheral DMA channel from one waveform
+    to the next exactly at the end of a period, with no gap in the output.
+
+    The STM32WB DMA has no double buffer mode and only accepts a new CMAR / CNDTR
+    while disabled, which it must not be for longer than a sample period. The
+    micropython firmware owns the DMA interrupt vectors, so the transfer complete
+    flag is only seen from a polled timer interrupt (see DMAEvents), after the
+    channel has already started the old buffer over. So instead poll() busy-waits
+    on CNDTR for the wrap and then swaps in a few register writes.
+
+    poll() returns straight away unless the channel is within max_spin samples of
+    the wrap, so the busy-wait lasts at most max_spin sample periods (or spins
+    iterations) and the caller needs to poll at least that often to catch it,
+    eg. from a loop yielding to other asyncio tasks in between.
+
+    Without a pool the buffers are just left to the caller.
+
+        pool = BufferPool(4, 100)
+        swap = HotSwap(hdma, TIM1.__reg_addr__("CCR3"), pool)
+        swap.start(fill_lut(pool.acquire(), "sine", 64))
+        ...
+        swap.stage(fill_lut(pool.acquire(), "triangle", 64))
+        while not swap.poll():
+            pass
+    """
+
+    def __init__(self, hdma: DMA_HandleTypeDef, DstAddress, pool=None, max_spin=8, spins=10_000):
+        self.hdma = hdma
+        self.DstAddress = DstAddress
+        self.pool = pool
+        self.max_spin = max_spin
+        self.spins = spins
+        self.swaps = 0
+        self.current = None
+        self._next = None
+        self._next_address = 0
+        self._next_length = 0
+
+    def start(self, buf, length=None):
+        self.current = buf
+        HAL_DMA_Start(
+            self.hdma, DMA_MEMORY_TO_PERIPH, buf, self.DstAddress, length or len(buf)
+        )
+
+    def stage(self, buf, length=None):
+        """
+        Queue buf (length samples of it) to take over at the next period end.
+        An earlier staged buffer that hasn't gone out yet goes back to the pool.
+        """
+        if length is None:
+            length = len(buf)
+        if not 0 < length <= len(buf):
+            raise ValueError(f"length {length} doesn't fit the {len(buf)} sample buffer")
+        # Same checks as HAL_DMA_Start, the channel's MSIZE is kept for buf
+        address = DMA_CheckBuffer(self.hdma, buf, length)
+        if self._next is not None and self.pool is not None:
+            self.pool.release(self._next)
+        self._next_address = address
+        self._next_length = length
+        self._next = buf
+
+    def pending(self):
+        return self._next is not None
+
+    def poll(self):
+        # Returns True once the staged buffer is playing and the old one's back in the pool
+        if self._next is None:
+            return False
+        instance = self.hdma.Instance
+        if instance.CNDTR > self.max_spin:
+            return False
+        if not _swap_at_wrap(
+            instance.__addr__, self._next_address, self._next_length, self.spins
+        ):
+            return False
+        if self.pool is not None:
+            self.pool.release(self.current)
+        self.current = self._next
+        self._next = None
+        self.swaps += 1
+        return True
@@ -0,0 +1,384 @@
+from array import array
+
+try:
+    from micropython import const
+except ImportError:
+    # Allow building tables from cpython too
+    const = lambda v: v
+
+# Integer only look-up-table synthesis.
+# Everything here is shifts and adds on values kept below 2**30 so that it stays in
+# micropython small ints and doesn't need the (soft-)float unit or heap allocations.
+
+_QUARTER_BITS = const(26)
+_QUARTER = const(1 << _QUARTER_BITS)
+_TURN = const(_QUARTER << 2)  # phase units in one full sine period
+_FRAC = const(14)  # fractional bits kept on sample values
+_SHAPED_FRAC = const(8)  # fractional bits carried through the noise shaper
+
+# atan(2**-i) in _TURN phase units
+_CORDIC_ATAN = (
+    33554432, 19808338, 10466182, 5312797, 2666708, 1334654, 667490, 333765, 166885, 83443,
+    41722, 20861, 10430, 5215, 2608, 1304, 652, 326, 163, 81,
+)  # fmt: skip
+# 1/cordic-gain as a Q30 fraction, split into its top 14 fractional bits and the next
+# 12 so scaling by it stays in small ints
+_CORDIC_K_HI = const(652032874 >> 16)
+_CORDIC_K_LO = const((652032874 >> 4) & 0xFFF)
+
+# Typecodes for sample widths (bytes per sample), matching the DMA memory data alignment.
+_TYPECODES = {1: "B", 2: "H", 4: "I"}
+
+
+def _cordic_sin(phase, x0):
+    # Rotate (x0, 0) by phase (0 <= phase <= _QUARTER), returns x0 / K * sin(phase)
+    x = x0
+    y = 0
+    z = phase
+    i = 0
+    for atan in _CORDIC_ATAN:
+        if z >= 0:
+            x, y = x - (y >> i), y + (x >> i)
+            z -= atan
+        else:
+            x, y = x + (y >> i), y - (x >> i)
+            z += atan
+        i += 1
+    return y
+
+
+def _fill_sine(buf, levels, frac=0):
+    # frac extra fractional bits are kept on the values, for the noise shaper
+    samples = len(buf)
+    half = levels // 2
+    x0 = (half - 1) * _CORDIC_K_HI + (((half - 1) * _CORDIC_K_LO) >> 12)
+    shift = _FRAC - frac
+    offset = (half << _FRAC) + ((1 << shift) >> 1)  # mid level + rounding
+
+    # phase of sample i is floor(i * _TURN / samples), tracked without multiplies
+    step = _TURN // samples
+    rem = _TURN % samples
+    phase = 0
+    err = 0
+
+    if samples % 4 == 0:
+        # Quarter-wave symmetry: only calculate the first quarter and mirror it.
+        mid = samples // 2
+        for i in range(samples // 4 + 1):
+            y = _cordic_sin(phase, x0)
+            buf[i] = buf[mid - i] = (offset + y) >> shift
+            buf[mid + i] = (offset - y) >> shift
+            if i:
+                buf[samples - i] = (offset - y) >> shift
+            phase += step
+            err += rem
+            if err >= samples:
+                err -= samples
+                phase += 1
+    else:
+        for i in range(samples):
+            quadrant = phase >> _QUARTER_BITS
+            angle = phase & (_QUARTER - 1)
+            if quadrant & 1:
+                angle = _QUARTER - angle
+            y = _cordic_sin(angle, x0)
+            if quadrant & 2:
+                y = -y
+            buf[i] = (offset + y) >> shift
+            phase += step
+            err += rem
+            if err >= samples:
+                err -= samples
+                phase += 1
+
+
+def _noise_shape(buf, fine, step, levels, order):
+    # Requantise every step'th value of the circular fine table (_SHAPED_FRAC extra bits)
+    # into buf, feeding the quantisation error forward so its spectrum is shaped by
+    # (1 - z^-1)^order, away from the signal and up towards the sample rate.
+    period = len(fine)
+    top = levels - 1
+    rounding = 1 << (_SHAPED_FRAC - 1)
+    e1 = e2 = 0
+    # The first pass only settles the error state, so the end of the table runs
+    # seamlessly into the start when the DMA wraps around.
+    for write in (False, True):
+        j = 0
+        for i in range(len(buf)):
+            v = fine[j]
+            if order == 1:
+                v += e1
+            elif order == 2:
+                v += 2 * e1 - e2
+            q = (v + rounding) >> _SHAPED_FRAC
+            if q < 0:
+                q = 0
+            elif q > top:
+                q = top
+            e2 = e1
+            e1 = v - (q << _SHAPED_FRAC)
+            if write:
+                buf[i] = q
+            j += step
+            if j >= period:
+                j -= period
+
+
+def _ramp(buf, start, count, first, last):
+    # buf[start:start + count] stepping evenly from first towards last (exclusive)
+    step = (last - first) // count
+    rem = (last - first) - step * count
+    v = first
+    err = 0
+    for i in range(start, start + count):
+        buf[i] = v
+        v += step
+        err += rem
+        if err >= count:
+            err -= count
+            v += 1
+
+
+def _fill_square(buf, levels, frac=0):
+    half = len(buf) // 2
+    top = (levels - 1) << frac
+    for i in range(len(buf)):
+        buf[i] = top if i < half else 0
+
+
+def _fill_triangle(buf, levels, frac=0):
+    half = len(buf) // 2
+    top = (levels - 1) << frac
+    _ramp(buf, 0, half, 0, top)
+    _ramp(buf, half, len(buf) - half, top, 0)
+
+
+def _fill_saw(buf, levels, frac=0):
+    # Each level gets an equal share of the period, the noise shaper clamps the top
+    _ramp(buf, 0, len(buf), 0, levels << frac)
+
+
+def _normalise(buf, values, levels, frac, lo, hi):
+    # buf[i] = values (nearest resampled to the length of buf) scaled from lo -> hi
+    # to 0 -> levels - 1
+    scale = (levels - 1) << frac
+    span = hi - lo
+    if not span:
+        span = 1
+    half = span // 2
+    n = len(buf)
+    m = len(values)
+    for i in range(n):
+        buf[i] = int(((values[i * m // n] - lo) * scale + half) // span)
+
+
+class _Shape:
+    # A generated shape, equal to any other of the same spec so LUTCache finds
+    # the LUT's already built for it.
+    def __init__(self, fill, spec):
+        self._fill = fill
+        self._spec = spec
+
+    def __call__(self, buf, levels, frac=0):
+        self._fill(buf, levels, frac, self._spec)
+
+    def __eq__(self, other):
+        return isinstance(other, _Shape) and self._fill is other._fill and self._spec == other._spec
+
+    def __hash__(self):
+        return hash(self._spec)
+
+
+def _fill_tones(buf, levels, frac, spec):
+    n = len(buf)
+    # One shared sine period the length of the table, each tone steps through it
+    # cycles samples at a time, added tone by tone into sums.
+    table = new_lut(n, 2)
+    _fill_sine(table, 1 << 15)
+    mid = 1 << 14
+    sums = array("i", bytes(4 * n))
+    for cycles, weight in spec:
+        j = 0
+        for i in range(n):
+            sums[i] += weight * (table[j] - mid)
+            j += cycles
+            if j >= n:
+                j %= n
+    _normalise(buf, sums, levels, frac, min(sums), max(sums))
+
+
+def tones(*spec):
+    """
+    Composite of sine tones, each (cycles, weight) with an integer number of cycles
+    in the table and a relative integer amplitude, eg. a two-tone (IMD) test signal:
+        get_lut(tones((9, 1), (10, 1)), 1000, 256)
+    Returns a shape for fill_lut / get_lut.
+    """
+    return _Shape(_fill_tones, tuple(tuple(tone) for tone in spec))
+
+
+def _fill_samples(buf, levels, frac, values):
+    _normalise(buf, values, levels, frac, min(values), max(values))
+
+
+def user_waveform(values):
+    """
+    A user supplied waveform, any sequence of numbers, normalised from its min / max
+    to the full level range and (nearest) resampled to the table length.
+    Returns a shape for fill_lut / get_lut.
+    """
+    return _Shape(_fill_samples, tuple(values))
+
+
+# Waveform shape name: function(buf, levels, frac=0) filling buf in place.
+# fill_lut and get_lut also take other shapes directly, eg. from tones() or user_waveform().
+SHAPES = {
+    "sine": _fill_sine,
+    "square": _fill_square,
+    "triangle": _fill_triangle,
+    "saw": _fill_saw,
+}
+
+
+def lut_width(levels):
+    # Smallest sample width (bytes) holding values up to levels - 1
+    if levels <= 0x100:
+        return 1
+    if levels <= 0x10000:
+        return 2
+    return 4
+
+
+def new_lut(samples, width=1):
+    """
+    Allocate a zeroed LUT buffer of samples, each width bytes wide.
+    """
+    if width == 1:
+        return bytearray(samples)
+    return array(_TYPECODES[width], bytes(samples * width))
+
+
+def fill_lut(buf, shape="sine", levels=256, periods=1, order=0):
+    """
+    Fill an existing buffer in place with periods periods of shape,
+    scaled to 0 -> levels - 1.
+
+    With order 1 or 2 the values are noise shaped (sigma-delta error feedback)
+    rather than rounded. Spread over several periods of a longer table, the
+    quantisation noise is then pushed up in frequency where the RC filter removes
+    it, giving extra effective bits at the same DMA rate. It only pays off with the
+    sample rate well above the filter corner and a filter at least as steep as the
+    shaping (one RC stage per order). The amplitude is reduced by order levels at
+    each end to leave the shaper headroom.
+    """
+    if not callable(shape):
+        shape = SHAPES[shape]
+    samples = len(buf)
+    if order and levels - 2 * order < 4:
+        raise ValueError(f"{levels} levels leave no amplitude for order {order} noise shaping")
+    if periods == 1 and not order:
+        shape(buf, levels)
+        return buf
+
+    # Table length sample i lands on phase (i * periods) % samples of one period,
+    # which only needs samples / gcd distinct values.
+    a, b = periods, samples
+    while b:
+        a, b = b, a % b
+    fine = array("i", bytes(4 * (samples // a)))
+    shape(fine, levels - 2 * order, _SHAPED_FRAC)
+    for i in range(len(fine)):
+        fine[i] += order << _SHAPED_FRAC
+    _noise_shape(buf, fine, periods // a, levels, order)
+    return buf
+
+
+def interleave(lut, offsets, width=1):
+    """
+    Interleave copies of lut each shifted by a number of samples in offsets,
+    eg. for a timer DMA burst updating one channel per offset on each request.
+    """
+    samples = len(lut)
+    outputs = len(offsets)
+    buf = new_lut(samples * outputs, width)
+    for k in range(outputs):
+        j = offsets[k] % samples
+        for i in range(k, samples * outputs, outputs):
+            buf[i] = lut[j]
+            j += 1
+            if j == samples:
+                j = 0
+    return buf
+
+
+class LUTCache:
+    """
+    Small least-recently-used cache of generated LUT's, so switching between a
+    few configurations reuses the already-built buffers.
+    """
+
+    def __init__(self, size=4):
+        self.size = size
+        self._luts = {}
+        self._order = []
+
+    def get(self, shape, samples, levels, width=None, periods=1, order=0):
+        if width is None:
+            width = lut_width(levels)
+        if levels > 1 << (8 * width):
+            raise ValueError(f"{levels} levels don't fit in {width} byte samples")
+
+        key = (shape, samples, levels, width, periods, order)
+        lut = self._luts.get(key)
+        if lut is None:
+            lut = fill_lut(new_lut(samples, width), shape, levels, periods, order)
+            if len(self._order) >= self.size:
+                del self._luts[self._order.pop(0)]
+            self._luts[key] = lut
+        else:
+            self._order.remove(key)
+        self._order.append(key)
+        return lut
+
+    def clear(self):
+        self._luts.clear()
+        self._order.clear()
+
+    def nbytes(self):
+        return sum(len(lut) * lut_width_of(lut) for lut in self._luts.values())
+
+
+lut_cache = LUTCache()
+
+
+def get_lut(shape, samples, levels, width=None, periods=1, order=0):
+    # width defaults to the smallest holding levels, eg. array('H') above 256 levels
+    return lut_cache.get(shape, samples, levels, width, periods, order)
+
+
+def lut_width_of(lut):
+    return 1 if isinstance(lut, bytearray) else len(bytes(memoryview(lut)[:1]))
+
+
+def memory_report(samples, levels=(64, 256, 1024, 4096, 65536), periods=1):
+    """
+    LUT RAM needed for a table of samples * periods samples at each amplitude
+    resolution, next to the free heap (on the device) and the cached LUT's.
+    """
+    try:
+        from gc import mem_free
+
+        free = mem_free()
+    except ImportError:
+        free = None
+    lines = [f"{'levels':>6} {'bits':>4} {'width':>5} {'bytes':>8}"]
+    for level in levels:
+        width = lut_width(level)
+        nbytes = samples * periods * width
+        bits = len(bin(level - 1)) - 2
+        fits = "" if free is None or nbytes < free else "  doesn't fit"
+        lines.append(f"{level:>6} {bits:>4} {width:>5} {nbytes:>8}{fits}")
+    lines.append(f"LUT cache: {len(lut_cache._luts)} LUT's, {lut_cache.nbytes()} bytes")
+    if free is not None:
+        lines.append(f"free heap: {free} bytes")
+    return "\n".join(lines)
@@ -0,0 +1,172 @@
+from machine import Pin
+from pyb import Timer
+
+from signal_gen.lut import get_lut, interleave, lut_width_of
+from signal_gen.resources import dma_resources
+from signal_gen.stm_dma_timer import (
+    HAL_TIM_DMABurst_MultiWriteStart,
+    HAL_TIM_DMABurst_WriteStop,
+    HAL_TIM_GenerateEvent,
+    TIM1,
+    TIM_DMA_UPDATE,
+    TIM_DMABASE_CCR1,
+    TIM_DMABURSTLENGTH_1TRANSFER,
+    TIM_DMABURSTLENGTH_2TRANSFERS,
+    TIM_DMABURSTLENGTH_3TRANSFERS,
+    TIM_DMABURSTLENGTH_4TRANSFERS,
+    TIM_EVENTSOURCE_UPDATE,
+    DMA_REQUEST_TIM1_UP,
+    DMA_MEMORY_TO_PERIPH,
+    DMA_PINC_DISABLE,
+    DMA_MINC_ENABLE,
+    DMA_PDATAALIGN_WORD,
+    DMA_CIRCULAR,
+    DMA_PRIORITY_HIGH,
+)
+
+# Maximum TIM1 repetition counter value
+RCR_MAX = 0xFFFF
+
+_BURST_LENGTHS = (
+    TIM_DMABURSTLENGTH_1TRANSFER,
+    TIM_DMABURSTLENGTH_2TRANSFERS,
+    TIM_DMABURSTLENGTH_3TRANSFERS,
+    TIM_DMABURSTLENGTH_4TRANSFERS,
+)
+
+
+class MultiPhaseGenerator:
+    """
+    Phase locked sine outputs on consecutive PWM channels of TIM1.
+
+    Rather than one DMA channel per output, TIM1's DMA burst feature is used: on each
+    TIM1 update event a single DMA request writes CCR<first>..CCR<first+n-1> together,
+    through the DMAR register, from an interleaved look up table. The outputs can't
+    drift apart as they're all updated by the same transfer.
+
+    The sample rate is the PWM frequency divided down by the repetition counter, so
+    `pwm_freq` needs to be a multiple of `freq * samples`. TIM1 and the DMA channel
+    are only set up by start(), and handed back by stop() / deinit().
+
+    eg. three phase on PA8, PA9, PA10:
+        gen = MultiPhaseGenerator(("A8", "A9", "A10"), phases=(0, 120, 240))
+        gen.start()
+    """
+
+    def __init__(
+        self,
+        pins,
+        phases,
+        freq=40_000,
+        samples=25,
+        levels=64,
+        pwm_freq=1_000_000,
+        first_channel=1,
+        dma=None,
+        dma_channel=None,
+    ):
+        if not 1 <= len(pins) <= 4 - first_channel + 1 or len(phases) != len(pins):
+            raise ValueError("need one phase per pin, on up to CH1-CH4")
+
+        rate = freq * samples
+        repetition = pwm_freq // rate
+        if not 1 <= repetition <= RCR_MAX + 1 or repetition * rate != pwm_freq:
+            raise ValueError(f"pwm_freq must be a multiple of freq * samples ({rate})")
+        self.freq = freq
+        self.pins = pins
+        self.phases = phases
+        self.samples = samples
+        self.max_level = levels
+        self.pwm_freq = pwm_freq
+        self.first_channel = first_channel
+        self.repetition = repetition
+        self.outputs = len(pins)
+        # TIM_DMABASE_CCR1..4 are consecutive
+        self.base = TIM_DMABASE_CCR1 + first_channel - 1
+        self.dma = (dma, dma_channel)
+        self.timer = None
+        self.channels = None
+        self.lut = None
+        self.hdma = None
+
+    def running(self):
+        return self.hdma is not None
+
+    def start(self):
+        if self.hdma is not None:
+            return
+        # Any free DMA channel unless one's given, booked along with TIM1
+        # before it's reconfigured
+        self.dma = dma_resources.claim(self, DMA_REQUEST_TIM1_UP, (1,), *self.dma)
+        try:
+            self._start()
+        except Exception:
+            if self.timer is not None:
+                self.timer.deinit()
+                self.timer = None
+            dma_resources.release(self)
+            raise
+
+    def _start(self):
+        self.timer = Timer(1, freq=self.pwm_freq)
+        if self.max_level > self.timer.period() + 1:
+            raise ValueError(
+                f"{self.max_level} levels exceed the PWM resolution at {self.pwm_freq}Hz"
+            )
+        self.channels = [
+            self.timer.channel(
+                self.first_channel + i, Timer.PWM, pin=Pin(pin, Pin.OUT), pulse_width=0
+            )
+            for i, pin in enumerate(self.pins)
+        ]
+
+        if self.lut is None:
+            # Phase shifts in degrees, as offsets into the table
+            offsets = [(self.samples * phase) // 360 for phase in self.phases]
+            table = get_lut("sine", self.samples, self.max_level)
+            self.lut = interleave(table, offsets, lut_width_of(table))
+
+        # Only update (and DMA request) every `repetition` PWM periods
+        TIM1.RCR = self.repetition - 1
+        HAL_TIM_GenerateEvent(TIM1, TIM_EVENTSOURCE_UPDATE)
+
+        hdma = dma_resources.init(
+            self,
+            DMA_REQUEST_TIM1_UP,
+            (1,),
+            *self.dma,
+            Direction=DMA_MEMORY_TO_PERIPH,
+            PeriphInc=DMA_PINC_DISABLE,
+            MemInc=DMA_MINC_ENABLE,
+            PeriphDataAlignment=DMA_PDATAALIGN_WORD,
+            MemDataAlignment=self.lut,
+            Mode=DMA_CIRCULAR,
+            Priority=DMA_PRIORITY_HIGH,
+        )
+        HAL_TIM_DMABurst_MultiWriteStart(
+            TIM1,
+            hdma,
+            self.base,
+            TIM_DMA_UPDATE,
+            self.lut,
+            _BURST_LENGTHS[self.outputs - 1],
+            len(self.lut),
+        )
+        self.hdma = hdma
+
+    def stop(self):
+        if self.hdma is None:
+            return
+        HAL_TIM_DMABurst_WriteStop(TIM1, self.hdma, TIM_DMA_UPDATE)
+        for ch in self.channels:
+            ch.pulse_width(0)
+        self.hdma = None
+        dma_resources.release(self)
+
+    def deinit(self):
+        # stop() and switch off TIM1
+        self.stop()
+        if self.timer is not None:
+            self.timer.deinit()
+        self.timer = None
+        self.channels = None
@@ -0,0 +1,140 @@
+from collections import namedtuple
+
+# Pure integer / float maths only, so plans can be made offline under cpython:
+#   $ python signal_gen/planner.py 40000 0.001
+# or on the device with the running timer clocks:
+#   >>> from signal_gen.planner import plan, timer_clocks
+#   >>> plan(40_000, *timer_clocks())
+
+# Default timer kernel clock, STM32WB55 at 64MHz with APB2 undivided
+DEFAULT_CLOCK = 64_000_000
+
+TIM_MAX_PSC = 0xFFFF
+TIM_MAX_ARR = 0xFFFF
+
+Plan = namedtuple(
+    "Plan",
+    (
+        "freq",  # achieved sine frequency
+        "error",  # relative frequency error
+        "samples",  # LUT samples per period
+        "levels",  # LUT amplitude levels
+        "sample_rate",  # TIM16 update rate
+        "pwm_freq",  # TIM1 carrier frequency
+        "tim1_psc",
+        "tim1_arr",
+        "tim16_psc",
+        "tim16_arr",
+    ),
+)
+
+
+def calc_prescaler_period(source_freq, freq, max_period=TIM_MAX_ARR):
+    # Returns the (PSC, ARR) pair giving the closest update rate to freq, or None
+    ticks = max(1, round(source_freq / freq))
+    prescaler = (ticks - 1) // (max_period + 1)
+    if prescaler > TIM_MAX_PSC:
+        return None
+    period = max(1, (ticks + (prescaler + 1) // 2) // (prescaler + 1))
+    return prescaler, period - 1
+
+
+def plan(
+    freq,
+    tim1_clock=DEFAULT_CLOCK,
+    tim16_clock=DEFAULT_CLOCK,
+    max_error=0.001,
+    min_samples=16,
+    max_samples=1024,
+    min_levels=2,
+    max_levels=256,
+    max_sample_rate=2_000_000,
+):
+    """
+    Search the sample count, TIM16 sample clock and TIM1 PWM carrier together for
+    a sine of freq Hz, returning the Plan with the most amplitude levels and then
+    the lowest frequency error. Returns None when nothing is within max_error.
+
+    TIM1 runs undivided with one PWM period (ARR + 1 levels) per sample or faster,
+    so every extra sample per period costs amplitude resolution; min_samples sets
+    the time resolution floor. max_levels defaults to what fits a byte LUT and
+    max_sample_rate keeps the DMA request rate to something the bus can sustain.
+    """
+    best = None
+    best_key = None
+    for samples in range(min_samples, max_samples + 1):
+        psc_arr = calc_prescaler_period(tim16_clock, freq * samples)
+        if psc_arr is None:
+            continue
+        psc16, arr16 = psc_arr
+        sample_rate = tim16_clock / ((psc16 + 1) * (arr16 + 1))
+        if sample_rate > max_sample_rate:
+            break
+        achieved = sample_rate / samples
+        error = abs(achieved - freq) / freq
+        if error > max_error:
+            continue
+
+        levels = min(max_levels, TIM_MAX_ARR + 1, int(tim1_clock // sample_rate))
+        if levels < min_levels:
+            # Higher sample counts only make it worse
+            break
+
+        key = (-levels, error, -samples)
+        if best_key is None or key < best_key:
+            best_key = key
+            best = Plan(
+                freq=achieved,
+                error=error,
+                samples=samples,
+                levels=levels,
+                sample_rate=sample_rate,
+                pwm_freq=tim1_clock / levels,
+                tim1_psc=0,
+                tim1_arr=levels - 1,
+                tim16_psc=psc16,
+                tim16_arr=arr16,
+            )
+    return best
+
+
+def timer_clocks():
+    """
+    Read the TIM1 and TIM16 kernel clocks from RCC on the running device.
+    Both are on APB2, which feeds the timers at twice PCLK2 when it's divided.
+    """
+    import machine
+    from signal_gen.stm_dma_timer import RCC, RCC_CFGR_PPRE2, RCC_CFGR_PPRE2_Pos
+
+    pclk2 = machine.freq()[3]
+    # PPRE2: 0xx = not divided, 1xx = divided by 2, 4, 8, 16
+    if (RCC.CFGR & RCC_CFGR_PPRE2) >> RCC_CFGR_PPRE2_Pos >= 4:
+        pclk2 *= 2
+    return pclk2, pclk2
+
+
+def report(p: Plan):
+    return "\n".join(
+        (
+            f"freq: {p.freq:.3f}Hz (error {p.error * 1e6:.1f}ppm)",
+            f"samples: {p.samples}, levels: {p.levels}",
+            f"TIM1: PSC={p.tim1_psc} ARR={p.tim1_arr} ({p.pwm_freq:.0f}Hz PWM)",
+            f"TIM16: PSC={p.tim16_psc} ARR={p.tim16_arr} ({p.sample_rate:.0f}Hz sample rate)",
+        )
+    )
+
+
+if __name__ == "__main__":
+    import sys
+
+    args = sys.argv[1:]
+    if not args:
+        raise SystemExit(f"usage: {sys.argv[0]} freq [max_error] [timer_clock]")
+    freq = float(args[0])
+    max_error = float(args[1]) if len(args) > 1 else 0.001
+    clock = int(float(args[2])) if len(args) > 2 else DEFAULT_CLOCK
+
+    result = plan(freq, clock, clock, max_error)
+    if result is None:
+        raise SystemExit(f"No configuration within {max_error} of {freq}Hz")
+    print(report(result))
@@ -0,0 +1,304 @@
+import struct
+from array import array
+
+import micropython
+from machine import Pin
+from micropython import const
+from pyb import Timer
+
+from signal_gen.dma_stream import DoubleBufferStream
+from signal_gen.lut import new_lut
+from signal_gen.resources import dma_resources
+from signal_gen.stm_dma_timer import (
+    __HAL_TIM_ENABLE_DMA__,
+    __HAL_TIM_DISABLE_DMA__,
+    TIM_DMA_CC1,
+    TIM1,
+    TIM16,
+    DMA_REQUEST_TIM16_CH1,
+    DMA_MEMORY_TO_PERIPH,
+    DMA_PINC_DISABLE,
+    DMA_MINC_ENABLE,
+    DMA_PDATAALIGN_WORD,
+    DMA_CIRCULAR,
+    DMA_PRIORITY_HIGH,
+)
+
+WAVE_FORMAT_PCM = 1
+
+# _params
+_STRIDE = const(0)
+_BITS = const(1)
+_LEVELS = const(2)
+_WIDE = const(3)
+_START = const(4)
+
+
+@micropython.viper
+def _pcm_to_levels(dst_buf, src_buf, n: int, params: ptr32):
+    # n PCM samples, stride bytes apart in src, scaled to 0 .. levels - 1 and written
+    # from sample start on in dst, as bytes or little endian halfwords if wide.
+    # 16bit PCM is signed, 8bit unsigned. Safe in place as long as the output is no
+    # wider than the stride.
+    dst = ptr8(dst_buf)
+    src = ptr8(src_buf)
+    stride = params[_STRIDE]
+    levels = params[_LEVELS]
+    wide = params[_WIDE]
+    i = params[_START]
+    end = i + n
+    j = 0
+    # levels up to 65536, split so 16bit samples * levels stays within 32bit
+    levels_hi = levels >> 8
+    levels_lo = levels & 0xFF
+    if params[_BITS] == 16:
+        while i < end:
+            s = (src[j] | (src[j + 1] << 8)) ^ 0x8000
+            v = (s * levels_hi + (s * levels_lo >> 8)) >> 8
+            if wide:
+                dst[2 * i] = v
+                dst[2 * i + 1] = v >> 8
+            else:
+                dst[i] = v
+            i += 1
+            j += stride
+    else:
+        while i < end:
+            v = src[j] * levels >> 8
+            if wide:
+                dst[2 * i] = v
+                dst[2 * i + 1] = v >> 8
+            else:
+                dst[i] = v
+            i += 1
+            j += stride
+
+
+def parse_wav(f):
+    """
+    Read a RIFF / WAVE header from f, leaving it at the start of the sample data.
+    Returns (channels, sample_rate, bits, data_bytes).
+    """
+    riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+    if riff != b"RIFF" or wave != b"WAVE":
+        raise ValueError("Not a WAV file")
+    fmt = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError("No data chunk in WAV file")
+        chunk, size = struct.unpack("<4sI", header)
+        if chunk == b"fmt ":
+            fmt = struct.unpack("<HHIIHH", f.read(16))
+            size -= 16
+        elif chunk == b"data":
+            break
+        # Chunks are padded to an even length
+        f.seek(size + (size & 1), 1)
+    if fmt is None:
+        raise ValueError("No fmt chunk before the WAV data")
+    tag, channels, sample_rate, _, _, bits = fmt
+    if tag != WAVE_FORMAT_PCM:
+        raise ValueError(f"WAV format {tag} isn't PCM")
+    return channels, sample_rate, bits, size
+
+
+class PCMPlayer:
+    """
+    Plays a PCM recording from a file (or any stream with readinto()) on the PWM
+    output: a WAV file, or raw little endian PCM given its sample_rate, bits and
+    channels. 8bit samples are unsigned, 16bit signed, as in WAV files.
+
+    TIM16 CH1 triggers the DMA at the file's sample rate / decimate, which takes
+    every decimate'th sample, and the first channel of each frame. The DMA loops
+    over a ping-pong buffer (see DoubleBufferStream) whose halves are refilled with
+    readinto() and scaled to the TIM1 levels in place by a viper routine. For mono
+    files played at their own rate the file is read straight into the DMA buffer,
+    otherwise through a scratch buffer, both allocated by the first start() so
+    playback doesn't touch the heap. The timers and DMA channel are only set up by
+    start(), and handed back by stop() / deinit().
+
+    `poll()` needs calling at least twice per buffer period, eg. from a timer:
+        player = PCMPlayer(open("chirp.wav", "rb"))
+        player.start()
+        poll_timer = Timer(2, freq=200, callback=lambda t: player.poll())
+        while not player.done():
+            ...
+    """
+
+    def __init__(
+        self,
+        file,
+        sample_rate=None,
+        bits=16,
+        channels=1,
+        decimate=1,
+        loop=False,
+        buffer_samples=2048,
+        pwm_pin="A10",
+        pwm_freq=250_000,
+        dma=None,
+        dma_channel=None,
+    ):
+        self.file = file
+        if sample_rate is None:
+            channels, sample_rate, bits, data_bytes = parse_wav(file)
+        else:
+            start = file.tell()
+            data_bytes = file.seek(0, 2) - start
+            file.seek(start)
+        if bits not in (8, 16):
+            raise ValueError(f"{bits}bit PCM isn't supported, only 8 or 16bit")
+        self.channels = channels
+        self.bits = bits
+        self.loop = loop
+        self._data_start = file.tell()
+        self._data_bytes = data_bytes
+        self._remaining = data_bytes
+        sample_bytes = bits // 8
+        stride = channels * sample_bytes * decimate
+        # Bytes of a stride after its sample, the end of the data may cut them short
+        self._tail = stride - sample_bytes
+        self._stride = stride
+        self.sample_rate = sample_rate // decimate
+        self.buffer_samples = buffer_samples
+        self.pwm_pin = pwm_pin
+        self.pwm_freq = pwm_freq
+        self.dma = (dma, dma_channel)
+        self.pwm_timer = None
+        self.pwm_channel = None
+        self.sample_timer = None
+        self.levels = None
+        self.buffer = None
+        self.zero_copy = None
+        self._scratch = None
+        self._params = None
+        self.stream = None
+
+    def running(self):
+        return self.stream is not None
+
+    def _start(self):
+        # For PWM, the pin, timer and channel number must all match,
+        # eg pin PA10 has an Alternate Function of TIM1_CH3
+        self.pwm_timer = Timer(1, freq=self.pwm_freq)
+        self.levels = levels = self.pwm_timer.period() + 1
+        self.pwm_channel = self.pwm_timer.channel(
+            3, Timer.PWM, pin=Pin(self.pwm_pin, Pin.OUT), pulse_width=0
+        )
+
+        # The sample clock follows the file, triggering the DMA through the TIM16 CH1 request.
+        self.sample_timer = Timer(16, freq=self.sample_rate)
+        self.sample_timer.channel(1, Timer.OC_TIMING, pulse_width=1)
+        self.sample_rate = self.sample_timer.freq()
+
+        # Allocated on the first start() and kept, so playback doesn't touch the heap
+        stride = self._stride
+        width = 2 if levels > 256 or stride == 2 else 1
+        if self.buffer is None:
+            self.buffer = new_lut(self.buffer_samples, width)
+            # readinto() straight into the DMA buffer if its samples are the file's,
+            # the scratch buffer is still needed to wrap around when looping
+            self.zero_copy = stride == width
+            if self.loop or not self.zero_copy:
+                self._scratch = bytearray(self.buffer_samples // 2 * stride)
+            self._params = array("I", (stride, self.bits, levels, width == 2, 0))
+
+        hdma = dma_resources.init(
+            self,
+            DMA_REQUEST_TIM16_CH1,
+            (1, 16),
+            *self.dma,
+            Direction=DMA_MEMORY_TO_PERIPH,
+            PeriphInc=DMA_PINC_DISABLE,
+            MemInc=DMA_MINC_ENABLE,
+            PeriphDataAlignment=DMA_PDATAALIGN_WORD,
+            MemDataAlignment=self.buffer,
+            Mode=DMA_CIRCULAR,
+            Priority=DMA_PRIORITY_HIGH,
+        )
+        # Silence between and after blocks is the mid level
+        stream = DoubleBufferStream(
+            hdma, TIM1.__reg_addr__("CCR3"), self.buffer, self.fill, idle=levels // 2
+        )
+        self.rewind()
+        self.stream = stream
+        stream.start()
+        __HAL_TIM_ENABLE_DMA__(TIM16, TIM_DMA_CC1)
+
+    def _read(self, raw, samples):
+        # readinto() up to samples samples of raw, returning how many came in
+        stride = self._params[_STRIDE]
+        want = min(samples * stride, self._remaining)
+        size = len(raw) * (stride if raw is not self._scratch else 1)
+        if want < size:
+            # Only at the end of the data, so the slice is no per block allocation
+            raw = memoryview(raw)[: want * len(raw) // size]
+        got = self.file.readinto(raw) or 0
+        self._remaining -= got
+        return (got + self._tail) // stride
+
+    def fill(self, buf):
+        # DoubleBufferStream producer, the next block of the file into one half
+        size = len(buf)
+        params = self._params
+        raw = buf if self.zero_copy else self._scratch
+        n = self._read(raw, size)
+        params[_START] = 0
+        _pcm_to_levels(buf, raw, n, params)
+        while n < size and self.loop and self._data_bytes:
+            self.rewind()
+            got = self._read(self._scratch, size - n)
+            if not got:
+                break
+            params[_START] = n
+            _pcm_to_levels(buf, self._scratch, got, params)
+            n += got
+        if n < size:
+            self.stream.exhausted = True
+        return n
+
+    def rewind(self):
+        self.file.seek(self._data_start)
+        self._remaining = self._data_bytes
+
+    def start(self):
+        if self.stream is not None:
+            return
+        # Any free DMA channel unless one's given, TIM1 and TIM16 are booked with it
+        # before touching any of them
+        self.dma = dma_resources.claim(self, DMA_REQUEST_TIM16_CH1, (1, 16), *self.dma)
+        try:
+            self._start()
+        except Exception:
+            self.stream = None
+            dma_resources.release(self)
+            raise
+
+    def stop(self):
+        if self.stream is None:
+            return
+        __HAL_TIM_DISABLE_DMA__(TIM16, TIM_DMA_CC1)
+        self.stream.stop()
+        self.pwm_channel.pulse_width(0)
+        self.stream = None
+        dma_resources.release(self)
+
+    def deinit(self):
+        # stop() and switch off both timers
+        self.stop()
+        for timer in (self.pwm_timer, self.sample_timer):
+            if timer is not None:
+                timer.deinit()
+        self.pwm_timer = None
+        self.sample_timer = None
+
+    def poll(self):
+        # Safe from a timer callback left running after stop()
+        stream = self.stream
+        if stream is not None:
+            stream.poll()
+
+    def done(self):
+        # The whole file has been queued, the last half buffer may still be playing
+        return self.stream is None or self.stream.exhausted
@@ -0,0 +1,98 @@
+from signal_gen.stm_dma_timer import (
+    __HAL_RCC_DMAMUX1_CLK_ENABLE__,
+    __HAL_RCC_DMA1_CLK_ENABLE__,
+    __HAL_RCC_DMA2_CLK_ENABLE__,
+    DMA_CHANNELS,
+    DMA_GetChannel,
+    HAL_DMA_Init,
+)
+
+
+class ResourceConflict(RuntimeError):
+    pass
+
+
+class DMAResources:
+    """
+    Book keeping of the DMA channels, DMAMUX channels, DMA request lines and timers
+    claimed by each generator, so two can't end up driving the same hardware.
+
+    Resources are keyed by ("dma", DMA, Channel), ("mux", status mask),
+    ("request", id) and ("timer", number); every claim and conflict check is a
+    dict lookup, with the per channel DMAMUX details from DMA_GetChannel().
+
+        hdma = dma_resources.init(self, DMA_REQUEST_TIM16_CH1, timers=(1, 16), ...)
+        ...
+        dma_resources.release(self)
+    """
+
+    def __init__(self):
+        self._owners = {}  # resource key: owner
+
+    def owner(self, key):
+        return self._owners.get(key)
+
+    def _keys(self, DMA, Channel, Request, timers):
+        keys = [("dma", DMA, Channel), ("mux", DMA_GetChannel(DMA, Channel)[4])]
+        if Request:
+            keys.append(("request", Request))
+        for timer in timers:
+            keys.append(("timer", timer))
+        return keys
+
+    def _conflict(self, owner, keys):
+        for key in keys:
+            other = self._owners.get(key)
+            if other is not None and other != owner:
+                return key, other
+        return None
+
+    def free_channel(self, DMA=None):
+        # First unclaimed (DMA, Channel), DMA1 first unless DMA is given
+        for dma in (1, 2) if DMA is None else (DMA,):
+            for channel in range(1, 8):
+                if (dma, channel) in DMA_CHANNELS and ("dma", dma, channel) not in self._owners:
+                    return dma, channel
+        raise ResourceConflict(f"No free DMA{DMA or ''} channel")
+
+    def claim(self, owner, Request=None, timers=(), DMA=None, Channel=None):
+        """
+        Claim a DMA channel (a free one unless DMA and Channel are both given), its
+        DMAMUX channel, the request line and the timers for owner. Claiming a given
+        channel again for the same owner is a no-op. Returns (DMA, Channel).
+        """
+        if Channel is None:
+            DMA, Channel = self.free_channel(DMA)
+        elif DMA is None:
+            DMA = 1
+        keys = self._keys(DMA, Channel, Request, timers)
+        conflict = self._conflict(owner, keys)
+        if conflict is not None:
+            key, other = conflict
+            raise ResourceConflict(f"{key} is already in use by {other}")
+        for key in keys:
+            self._owners[key] = owner
+        return DMA, Channel
+
+    def release(self, owner):
+        for key in [key for key, other in self._owners.items() if other == owner]:
+            del self._owners[key]
+
+    def init(self, owner, Request, timers=(), DMA=None, Channel=None, **config):
+        """
+        claim() then enable the clocks and HAL_DMA_Init() the channel with config.
+        """
+        DMA, Channel = self.claim(owner, Request, timers, DMA, Channel)
+        try:
+            __HAL_RCC_DMAMUX1_CLK_ENABLE__()
+            if DMA == 1:
+                __HAL_RCC_DMA1_CLK_ENABLE__()
+            else:
+                __HAL_RCC_DMA2_CLK_ENABLE__()
+            return HAL_DMA_Init(DMA=DMA, Channel=Channel, Request=Request, **config)
+        except Exception:
+            self.release(owner)
+            raise
+
+
+dma_resources = DMAResources()
@@ -1,24 +1,25 @@
-import math
 from pyb import Timer
 
 from machine import Pin
 
+from signal_gen.dma_events import DMAEvents
+from signal_gen.lut import get_lut
+from signal_gen.resources import dma_resources
 from signal_gen.stm_dma_timer import (
-    __HAL_RCC_DMAMUX1_CLK_ENABLE__,
-    __HAL_RCC_DMA1_CLK_ENABLE__,
-    __HAL_RCC_DMA2_CLK_ENABLE__,
     __HAL_TIM_ENABLE_DMA__,
-    HAL_DMA_Init,
+    __HAL_TIM_DISABLE_DMA__,
+    HAL_DMA_Abort,
     HAL_DMA_Start,
-    TIM_DMA_CC1,
-    TIM1,
-    TIM16,
-    DMA_REQUEST_TIM16_CH1,
+    DMA_GetMemDataAlignment,
+    DMA_SetMemDataAlignment,
+    TIM_SetFrequency,
+    __HAL_TIM_ENABLE_ARR_PRELOAD__,
+    TIMERS,
+    TIM_CC_DMA_REQUESTS,
     DMA_MEMORY_TO_PERIPH,
     DMA_PINC_DISABLE,
     DMA_MINC_ENABLE,
     DMA_PDATAALIGN_WORD,
-    DMA_MDATAALIGN_BYTE,
     DMA_CIRCULAR,
     DMA_PRIORITY_HIGH,
 )
@@ -26,56 +27,293 @@ from signal_gen.stm_dma_timer import (
 SINE_FREQ = 40_000  # sine wave frequency in HZ
 SINE_SAMPLES = 25  # number of sample points in time domain
 SINE_MAX_LEVEL = 64  # number of aplitude / volts levels.
+SINE_PERIODS = 1  # sine periods spread across one longer LUT
+SINE_NOISE_SHAPING = 0  # noise shaping order (0-2) on the LUT values, see lut.fill_lut
 
-# For PWM, the pin, timer and channel number must all match,
-# eg pin PA10 has an Alternate Function of TIM1_CH3
-PWM_PIN = Pin("A10", Pin.OUT)
-PWM_TIMER = Timer(1, freq=1_000_000)
-PWM_TIMER_CH = PWM_TIMER.channel(3, Timer.PWM, pin=PWM_PIN, pulse_width_percent=0)
-
-# This is the register for the timer/channel above which the DMA will transfer
-# pwm levels to from the look up table.
-DMA_DESTINATION_ADDR = TIM1.__reg_addr__("CCR3")
-
-# This DMA timer is used to trigger the regular dma transfers at required
-# rate to clock out each individual SINE_SAMPLE point to make up the desired
-# final SINE_FREQ
-DMA_TIMER = Timer(16, freq=SINE_FREQ * SINE_SAMPLES)
-DMA_TIMER_CH = DMA_TIMER.channel(1, Timer.OC_TIMING, pulse_width=1)
-
-
-# Generate the look up table of sine wave sample values.
-SINE_HALF_LEVEL = SINE_MAX_LEVEL // 2
-Wave_LUT = bytearray(
-    [
-        int(
-            (SINE_HALF_LEVEL - 1) * math.sin(i * 2 * math.pi / SINE_SAMPLES)
-            + SINE_HALF_LEVEL
-            + 0.5
+
+class SignalGenerator:
+    """
+    PWM / fake-dac waveform output. A circular DMA copies each LUT value into the
+    PWM timer's compare register, triggered by a second (sample) timer's compare
+    channel at freq * samples, so once started it runs with no CPU involvement.
+
+    Nothing touches the hardware until start(). The timers, DMA channel and request
+    line are booked with signal_gen.resources while running, so several generators
+    can run at once on separate timers:
+
+        gen = SignalGenerator()  # 40kHz sine on A10 (TIM1 CH3), sampled by TIM16 CH1
+        gen.start()
+        gen2 = SignalGenerator(5_000, pwm_pin="A0", pwm_timer=2, pwm_channel=1, sample_timer=17)
+        gen2.start()
+        ...
+        gen2.deinit()
+
+    With an event_timer, a pyb.Timer interrupt at event_freq services the DMA flags
+    (see dma_events.DMAEvents) so asyncio tasks can await half_done() / period_done(),
+    or feed a dma_events.WaveformQueue. For every half / period to be counted it needs
+    to poll at twice the half transfer rate, 4 * freq / periods, which is what
+    event_freq=None gives and follows set_frequency(). A lower event_freq raises
+    ValueError. At the default 40kHz that's 160kHz, more than a python callback
+    keeps up with, so events are for lower frequencies or LUT's of many periods.
+    """
+
+    __slots__ = (
+        "freq",
+        "samples",
+        "max_level",
+        "periods",
+        "order",
+        "pwm_pin",
+        "pwm_timer_id",
+        "pwm_channel",
+        "pwm_freq",
+        "sample_timer_id",
+        "sample_channel",
+        "dma",
+        "request",
+        "dma_source",
+        "DstAddress",
+        "lut",
+        "pwm_timer",
+        "dma_timer",
+        "timer_regs",
+        "hdma",
+        "source_freq",
+        "event_timer",
+        "event_freq",
+        "events",
+    )
+
+    def __init__(
+        self,
+        freq=SINE_FREQ,
+        samples=SINE_SAMPLES,
+        levels=SINE_MAX_LEVEL,
+        periods=SINE_PERIODS,
+        order=SINE_NOISE_SHAPING,
+        pwm_pin="A10",
+        pwm_timer=1,
+        pwm_channel=3,
+        pwm_freq=1_000_000,
+        sample_timer=16,
+        sample_channel=1,
+        dma=None,
+        dma_channel=None,
+        event_timer=None,
+        event_freq=None,
+    ):
+        # For PWM, the pin, timer and channel number must all match,
+        # eg pin PA10 has an Alternate Function of TIM1_CH3
+        if pwm_timer not in TIMERS or not 1 <= pwm_channel <= 4:
+            raise ValueError(f"No PWM output TIM{pwm_timer} CH{pwm_channel}")
+        if (sample_timer, sample_channel) not in TIM_CC_DMA_REQUESTS or sample_timer == pwm_timer:
+            raise ValueError(f"TIM{sample_timer} CH{sample_channel} can't be the sample timer")
+        if event_timer in (pwm_timer, sample_timer):
+            raise ValueError(f"TIM{event_timer} is already in use by the generator")
+        self.freq = freq
+        self.samples = samples
+        self.max_level = levels
+        self.periods = periods
+        self.order = order
+        self.pwm_pin = pwm_pin
+        self.pwm_timer_id = pwm_timer
+        self.pwm_channel = pwm_channel
+        self.pwm_freq = pwm_freq
+        self.sample_timer_id = sample_timer
+        self.sample_channel = sample_channel
+        # Any free DMA channel unless one's given
+        self.dma = (dma, dma_channel)
+        self.request, self.dma_source = TIM_CC_DMA_REQUESTS[(sample_timer, sample_channel)]
+        # This is the register for the timer/channel above which the DMA will transfer
+        # pwm levels to from the look up table.
+        self.DstAddress = TIMERS[pwm_timer].__reg_addr__(f"CCR{pwm_channel}")
+        self.lut = None
+        self.pwm_timer = None
+        self.dma_timer = None
+        self.timer_regs = None
+        self.hdma = None
+        self.source_freq = None
+        self.event_timer = event_timer
+        self.event_freq = event_freq
+        self.events = None
+
+    def running(self):
+        return self.hdma is not None
+
+    def start(self):
+        if self.hdma is not None:
+            return
+        timers = (self.pwm_timer_id, self.sample_timer_id)
+        if self.event_timer is not None:
+            self._poll_freq(self.freq, self.periods)
+            timers += (self.event_timer,)
+        # The timers are booked along with the DMA channel before touching any of them
+        self.dma = dma_resources.claim(self, self.request, timers, *self.dma)
+        try:
+            self._start(timers)
+        except Exception:
+            # Undo however far it got, so a later start() finds everything free
+            if self.hdma is not None:
+                HAL_DMA_Abort(self.hdma)
+                self.hdma = None
+            self.events = None
+            self._deinit_timers()
+            dma_resources.release(self)
+            raise
+
+    def _start(self, timers):
+        self.pwm_timer = pwm_timer = Timer(self.pwm_timer_id, freq=self.pwm_freq)
+        if self.max_level > pwm_timer.period() + 1:
+            raise ValueError(
+                f"{self.max_level} levels exceed the PWM resolution at {self.pwm_freq}Hz"
+            )
+        pwm_timer.channel(
+            self.pwm_channel, Timer.PWM, pin=Pin(self.pwm_pin, Pin.OUT), pulse_width=0
         )
-        for i in range(SINE_SAMPLES)
-    ]
-)
 
-# Configure and start the DMA
-
-__HAL_RCC_DMAMUX1_CLK_ENABLE__()
-__HAL_RCC_DMA1_CLK_ENABLE__()
-
-dma_timer = HAL_DMA_Init(
-    DMA=1,
-    Channel=1,
-    Request=DMA_REQUEST_TIM16_CH1,  # Needs to match settings of DMA_TIMER above.
-    Direction=DMA_MEMORY_TO_PERIPH,
-    PeriphInc=DMA_PINC_DISABLE,
-    MemInc=DMA_MINC_ENABLE,
-    PeriphDataAlignment=DMA_PDATAALIGN_WORD,
-    MemDataAlignment=DMA_MDATAALIGN_BYTE,
-    Mode=DMA_CIRCULAR,
-    Priority=DMA_PRIORITY_HIGH,
-)
+        # This DMA timer is used to trigger the regular dma transfers at required
+        # rate to clock out each individual sample point to make up the desired freq
+        self.dma_timer = dma_timer = Timer(self.sample_timer_id, freq=self.freq * self.samples)
+        dma_timer.channel(self.sample_channel, Timer.OC_TIMING, pulse_width=1)
+
+        # Generate (or re-use a cached copy of) the look up table of sine wave sample
+        # values, unless set_waveform() has given one.
+        if self.lut is None:
+            self.lut = get_lut(
+                "sine",
+                self.samples * self.periods,
+                self.max_level,
+                periods=self.periods,
+                order=self.order,
+            )
+
+        hdma = dma_resources.init(
+            self,
+            self.request,  # Needs to match settings of dma_timer above.
+            timers,
+            *self.dma,
+            Direction=DMA_MEMORY_TO_PERIPH,
+            PeriphInc=DMA_PINC_DISABLE,
+            MemInc=DMA_MINC_ENABLE,
+            PeriphDataAlignment=DMA_PDATAALIGN_WORD,
+            MemDataAlignment=self.lut,  # byte / halfword from the LUT, array('H') above 256 levels
+            Mode=DMA_CIRCULAR,
+            Priority=DMA_PRIORITY_HIGH,
+        )
+        HAL_DMA_Start(hdma, DMA_MEMORY_TO_PERIPH, self.lut, self.DstAddress, len(self.lut))
+
+        self.timer_regs = TIMERS[self.sample_timer_id]
+        __HAL_TIM_ENABLE_DMA__(self.timer_regs, self.dma_source)
+
+        # Cached so a retune is just a couple of register writes.
+        self.source_freq = dma_timer.source_freq()
+        self.freq = dma_timer.freq() / self.samples
+        __HAL_TIM_ENABLE_ARR_PRELOAD__(self.timer_regs)
+        self.hdma = hdma
+        if self.event_timer is not None:
+            poll_freq = self._poll_freq(self.freq, self.periods)
+            self.events = DMAEvents(hdma, self.event_timer, poll_freq)
+            self.events.start()
+
+    def stop(self):
+        """
+        Stop the DMA requests and channel, leaving the PWM output low and the timers
+        configured. start() picks up again with the current waveform.
+        """
+        if self.hdma is None:
+            return
+        if self.events is not None:
+            self.events.stop()
+        __HAL_TIM_DISABLE_DMA__(self.timer_regs, self.dma_source)
+        HAL_DMA_Abort(self.hdma)
+        self.pwm_timer.channel(self.pwm_channel).pulse_width(0)
+        self.hdma = None
+        dma_resources.release(self)
+
+    def _deinit_timers(self):
+        for timer in (self.pwm_timer, self.dma_timer):
+            if timer is not None:
+                timer.deinit()
+        self.pwm_timer = None
+        self.dma_timer = None
+        self.timer_regs = None
+
+    def deinit(self):
+        # stop() and switch off both timers
+        self.stop()
+        self._deinit_timers()
+
+    def half_done(self):
+        # Awaitable, the DMA having clocked out the first half of the LUT
+        return self._events().half.wait()
+
+    def period_done(self):
+        # Awaitable, the DMA having clocked out the whole LUT and wrapped
+        return self._events().complete.wait()
+
+    def _events(self):
+        if self.events is None or self.hdma is None:
+            raise RuntimeError("Needs an event_timer and start()")
+        return self.events
+
+    def set_frequency(self, freq):
+        """
+        Change the output frequency, taking effect on the next DMA timer update event.
+        Returns the actual frequency achieved, or before start() the requested one.
+        """
+        if self.hdma is None:
+            self.freq = freq
+            return freq
+        if self.events is not None:
+            self._poll_freq(freq, self.periods)
+        rate = TIM_SetFrequency(self.timer_regs, self.source_freq, freq * self.samples)
+        self.freq = rate / self.samples
+        if self.events is not None and self.event_freq is None:
+            self.events.set_poll_freq(self._poll_freq(self.freq, self.periods))
+        return self.freq
+
+    def _poll_freq(self, freq, periods):
+        # The event timer rate that catches every half / period of the DMA
+        rate = 4 * freq / periods
+        if self.event_freq is None:
+            return rate
+        if self.event_freq < rate:
+            raise ValueError(
+                f"event_freq {self.event_freq}Hz misses DMA events at {freq}Hz, needs {rate}Hz"
+            )
+        return self.event_freq
+
+    def levels(self):
+        # Duty levels of the PWM output, what the waveforms get quantised to
+        if self.pwm_timer is None:
+            return self.max_level
+        return self.pwm_timer.period() + 1
 
-HAL_DMA_Start(dma_timer, DMA_MEMORY_TO_PERIPH, Wave_LUT, DMA_DESTINATION_ADDR, SINE_SAMPLES)
+    def set_waveform(self, lut, periods=1):
+        """
+        Restart the DMA on a new LUT holding periods periods of the waveform,
+        keeping the output frequency. Byte and halfword LUT's can be swapped freely.
+        Before start() the LUT is just kept for it.
+        """
+        freq = self.freq
+        if self.events is not None:
+            self._poll_freq(freq, periods)
+        # The LUT is only referenced by address from here on, so keep it alive
+        self.lut = lut
+        self.samples = len(lut) // periods
+        self.periods = periods
+        if self.hdma is None:
+            return
+        HAL_DMA_Abort(self.hdma)
+        DMA_SetMemDataAlignment(self.hdma, DMA_GetMemDataAlignment(lut))
+        self.set_frequency(freq)
+        HAL_DMA_Start(self.hdma, DMA_MEMORY_TO_PERIPH, lut, self.DstAddress, len(lut))
 
-# Needs to match settings of DMA_TIMER above.
-__HAL_TIM_ENABLE_DMA__(TIM16, TIM_DMA_CC1)
+    def waveform(self, shape, samples, periods=1, order=0):
+        """
+        Generate shape ("sine", "square", "triangle", "saw" or a shape from
+        lut.tones() / lut.user_waveform()) quantised to the PWM levels, and play it.
+        """
+        lut = get_lut(shape, samples * periods, self.levels(), None, periods, order)
+        self.set_waveform(lut, periods)
+        return lut
@@ -3,10 +3,13 @@ from micropython import const
 
 from typing import Any, Optional
 
+from signal_gen.planner import calc_prescaler_period
+
 __all__ = [
     "TIM1",
     "TIM2",
     "TIM16",
+    "TIM17",
     "DMA1_Channel1",
     "DMA1_Channel2",
     "DMA2_Channel1",
@@ -14,6 +17,7 @@ __all__ = [
 ]
 
 try:
+    from signal_gen import _stm_registers
     from signal_gen._stm_registers import *
 
 except ImportError:
@@ -25,6 +29,28 @@ except ImportError:
     raise RuntimeError()
 
 
+def __getattr__(name):
+    # The peripherals (TIM1, DMA1_Channel1, ...) aren't star imported, they're created
+    # by _stm_registers on first access.
+    return getattr(_stm_registers, name)
+
+
+class _Peripherals:
+    # Read only mapping to peripherals by name, each only created when looked up
+    def __init__(self, names):
+        self._names = names
+
+    def __contains__(self, key):
+        return key in self._names
+
+    def __getitem__(self, key):
+        return getattr(_stm_registers, self._names[key])
+
+    def get(self, key, default=None):
+        name = self._names.get(key)
+        return default if name is None else getattr(_stm_registers, name)
+
+
 # DMA_request DMA request
 # From stm32wbxx_hal_driver/Inc/stm32wbxx_hal_dma.h
 
@@ -96,6 +122,12 @@ DMA_IT_TC = LL_DMA_CCR_TCIE  # Transfer complete interrupt
 DMA_IT_HT = LL_DMA_CCR_HTIE  # Half Transfer interrupt
 DMA_IT_TE = LL_DMA_CCR_TEIE  # Transfer error interrupt
 
+# DMA_flag_definitions DMA flag definitions
+DMA_FLAG_GL1 = DMA_ISR_GIF1  # Channel 1 global flag
+DMA_FLAG_TC1 = DMA_ISR_TCIF1  # Channel 1 transfer complete flag
+DMA_FLAG_HT1 = DMA_ISR_HTIF1  # Channel 1 half transfer flag
+DMA_FLAG_TE1 = DMA_ISR_TEIF1  # Channel 1 transfer error flag
+
 # From STM32WBxx_HAL_Driver/Inc/stm32wbxx_ll_bus.h
 LL_AHB1_GRP1_PERIPH_DMA1 = RCC_AHB1ENR_DMA1EN
 LL_AHB1_GRP1_PERIPH_DMA2 = RCC_AHB1ENR_DMA2EN
@@ -113,6 +145,82 @@ TIM_DMA_CC4 = TIM_DIER_CC4DE  # DMA triggered by capture/compare match 4 event
 TIM_DMA_COM = TIM_DIER_COMDE  # DMA triggered by commutation event
 TIM_DMA_TRIGGER = TIM_DIER_TDE  # DMA triggered by trigger event
 
+# Timer number: registers
+TIMERS = _Peripherals({1: "TIM1", 2: "TIM2", 16: "TIM16", 17: "TIM17"})
+
+# (Timer, Channel): (DMAMUX request, DIER DMA source) of the capture/compare DMA requests
+TIM_CC_DMA_REQUESTS = {
+    (1, 1): (DMA_REQUEST_TIM1_CH1, TIM_DMA_CC1),
+    (1, 2): (DMA_REQUEST_TIM1_CH2, TIM_DMA_CC2),
+    (1, 3): (DMA_REQUEST_TIM1_CH3, TIM_DMA_CC3),
+    (1, 4): (DMA_REQUEST_TIM1_CH4, TIM_DMA_CC4),
+    (2, 1): (DMA_REQUEST_TIM2_CH1, TIM_DMA_CC1),
+    (2, 2): (DMA_REQUEST_TIM2_CH2, TIM_DMA_CC2),
+    (2, 3): (DMA_REQUEST_TIM2_CH3, TIM_DMA_CC3),
+    (2, 4): (DMA_REQUEST_TIM2_CH4, TIM_DMA_CC4),
+    (16, 1): (DMA_REQUEST_TIM16_CH1, TIM_DMA_CC1),
+    (17, 1): (DMA_REQUEST_TIM17_CH1, TIM_DMA_CC1),
+}
+
+# TIM_Master_Mode_Selection TIM Master Mode Selection
+TIM_TRGO_RESET = 0x00000000  # TIMx_EGR.UG bit is used as trigger output (TRGO)
+TIM_TRGO_ENABLE = TIM_CR2_MMS_0  # TIMx_CR1.CEN bit is used as trigger output (TRGO)
+TIM_TRGO_UPDATE = TIM_CR2_MMS_1  # Update event is used as trigger output (TRGO)
+
+# TIM_Master_Slave_Mode TIM Master/Slave Mode
+TIM_MASTERSLAVEMODE_ENABLE = TIM_SMCR_MSM  # Master/slave mode is selected
+TIM_MASTERSLAVEMODE_DISABLE = 0x00000000  # No action
+
+# TIM_Slave_Mode TIM Slave mode
+TIM_SLAVEMODE_DISABLE = 0x00000000  # Slave mode disabled
+TIM_SLAVEMODE_TRIGGER = TIM_SMCR_SMS_2 | TIM_SMCR_SMS_1  # Trigger Mode
+
+# TIM_Trigger_Selection TIM Trigger Selection
+TIM_TS_ITR0 = 0x00000000  # Internal Trigger 0 (ITR0)
+TIM_TS_ITR1 = TIM_SMCR_TS_0  # Internal Trigger 1 (ITR1)
+TIM_TS_ITR2 = TIM_SMCR_TS_1  # Internal Trigger 2 (ITR2)
+TIM_TS_ITR3 = TIM_SMCR_TS_0 | TIM_SMCR_TS_1  # Internal Trigger 3 (ITR3)
+
+# (Slave, Master): internal trigger selecting the master's TRGO, RM0434 TIMx internal
+# trigger connection tables. TIM16 / TIM17 have no slave mode controller.
+TIM_ITR_CONNECTIONS = {
+    (1, 2): TIM_TS_ITR1,
+    (2, 1): TIM_TS_ITR0,
+}
+
+# TIM_DMA_Base_address TIM DMA Base Address
+TIM_DMABASE_CR1 = 0x00000000
+TIM_DMABASE_CR2 = 0x00000001
+TIM_DMABASE_SMCR = 0x00000002
+TIM_DMABASE_DIER = 0x00000003
+TIM_DMABASE_SR = 0x00000004
+TIM_DMABASE_EGR = 0x00000005
+TIM_DMABASE_CCMR1 = 0x00000006
+TIM_DMABASE_CCMR2 = 0x00000007
+TIM_DMABASE_CCER = 0x00000008
+TIM_DMABASE_CNT = 0x00000009
+TIM_DMABASE_PSC = 0x0000000A
+TIM_DMABASE_ARR = 0x0000000B
+TIM_DMABASE_RCR = 0x0000000C
+TIM_DMABASE_CCR1 = 0x0000000D
+TIM_DMABASE_CCR2 = 0x0000000E
+TIM_DMABASE_CCR3 = 0x0000000F
+TIM_DMABASE_CCR4 = 0x00000010
+
+# TIM_DMA_Burst_Length TIM DMA Burst Length
+TIM_DMABURSTLENGTH_1TRANSFER = 0x00000000
+TIM_DMABURSTLENGTH_2TRANSFERS = 0x00000100
+TIM_DMABURSTLENGTH_3TRANSFERS = 0x00000200
+TIM_DMABURSTLENGTH_4TRANSFERS = 0x00000300
+
+# TIM_Event_Source TIM Event Source
+TIM_EVENTSOURCE_UPDATE = TIM_EGR_UG  # Reinitialize the counter and generates an update of the registers
+
+
+# DMA_Error_Code DMA Error Code
+HAL_DMA_ERROR_NONE = 0x00  # No error
+HAL_DMA_ERROR_TE = 0x01  # Transfer error
+
 
 class DMA_HandleTypeDef:
     Instance: DMA_Channel_TypeDef
@@ -126,11 +234,15 @@ class DMA_HandleTypeDef:
         DMAMUX_RequestGenStatus_TypeDef
     ]  # DMAMUX request generator Address
     DMAmuxRequestGenStatusMask: int
+    XferCpltCallback = None  # DMA transfer complete callback
+    XferHalfCpltCallback = None  # DMA Half transfer complete callback
+    XferErrorCallback = None  # DMA transfer error callback
+    ErrorCode: int = 0  # DMA Error code
 
 
 def LL_AHB1_GRP1_EnableClock(Periphs):
     # SET_BIT(RCC_BASE + RCC_TypeDef.AHB1ENR, Periphs)
-    RCC.AHB1ENR |= Periphs
+    _stm_registers.RCC.AHB1ENR |= Periphs
 
 
 # stm32wbxx_hal_driver/Inc/stm32wbxx_hal_rcc.h
@@ -153,20 +265,87 @@ def __HAL_TIM_ENABLE_DMA__(TIMER, TIM_DMA_source):
     TIMER.DIER |= TIM_DMA_source
 
 
+def __HAL_TIM_ENABLE__(TIMER):
+    # ((__HANDLE__)->Instance->CR1|=(TIM_CR1_CEN))
+    TIMER.CR1_CEN = 1
+
+
+def __HAL_TIM_DISABLE__(TIMER):
+    # Unconditional, unlike the HAL which waits for the outputs to be disabled
+    TIMER.CR1_CEN = 0
+
+
+def __HAL_TIM_ENABLE_ARR_PRELOAD__(TIMER):
+    # ((__HANDLE__)->Instance->CR1 |= (TIM_CR1_ARPE))
+    TIMER.CR1_ARPE = 1
+
+
+def __HAL_TIM_SET_PRESCALER__(TIMER, Prescaler):
+    # ((__HANDLE__)->Instance->PSC = (__PRESC__))
+    TIMER.PSC = Prescaler
+
+
+def __HAL_TIM_SET_AUTORELOAD__(TIMER, Autoreload):
+    # ((__HANDLE__)->Instance->ARR = (__AUTORELOAD__))
+    TIMER.ARR = Autoreload
+
+
+def TIM_CalcPrescalerPeriod(source_freq, freq, max_period=0xFFFF):
+    # Returns the (PSC, ARR) pair giving the closest update rate to freq
+    prescaler_period = calc_prescaler_period(source_freq, freq, max_period)
+    if prescaler_period is None:
+        raise ValueError(f"{freq}Hz is too slow for a {source_freq}Hz timer clock")
+    return prescaler_period
+
+
+def TIM_SetFrequency(TIMER, source_freq, freq, max_period=0xFFFF):
+    # Both PSC and (with ARPE set) ARR are shadowed by preload registers, loaded
+    # on update events without stopping the counter or any compare triggered DMA.
+    # UDIS holds off update events while they're written separately, so an update
+    # can't load a new PSC with the old ARR; the first one after loads both.
+    # Returns the achieved update rate.
+    prescaler, period = TIM_CalcPrescalerPeriod(source_freq, freq, max_period)
+    __HAL_TIM_ENABLE_ARR_PRELOAD__(TIMER)
+    TIMER.CR1_UDIS = 1
+    __HAL_TIM_SET_PRESCALER__(TIMER, prescaler)
+    __HAL_TIM_SET_AUTORELOAD__(TIMER, period)
+    TIMER.CR1_UDIS = 0
+    return source_freq / ((prescaler + 1) * (period + 1))
+
+
+def __HAL_TIM_DISABLE_DMA__(TIMER, TIM_DMA_source):
+    # ((__HANDLE__)->Instance->DIER &= ~(__DMA__))
+    TIMER.DIER &= ~TIM_DMA_source
+
+
+def HAL_TIM_GenerateEvent(TIMER, EventSource):
+    # Set the event sources
+    TIMER.EGR = EventSource
+
+
+def HAL_TIMEx_MasterConfigSynchronization(TIMER, MasterOutputTrigger, MasterSlaveMode):
+    # Select the TRGO source
+    TIMER.CR2 = (TIMER.CR2 & ~TIM_CR2_MMS) | MasterOutputTrigger
+    # Select the Master Slave Mode
+    TIMER.SMCR = (TIMER.SMCR & ~TIM_SMCR_MSM) | MasterSlaveMode
+
+
+def TIM_SlaveTimer_SetConfig(TIMER, SlaveMode, InputTrigger):
+    # Set the Input Trigger source and the slave mode
+    TIMER.SMCR = (TIMER.SMCR & ~(TIM_SMCR_TS | TIM_SMCR_SMS)) | InputTrigger | SlaveMode
+
+
 def DMA_CalcDMAMUXChannelBaseAndMask(hdma: DMA_HandleTypeDef):
-    if hdma.DmaBaseAddress is DMA1:
-        # print(f"DMAmuxChannel: {DMAMUX1_Channel0_BASE + (hdma.ChannelIndex >> 2)}")
-        hdma.DMAmuxChannel = DMAMUX_Channel_TypeDef(
-            DMAMUX1_Channel0_BASE + (hdma.ChannelIndex >> 2)
-        )
+    # DMAMUX channels 0-6 feed DMA1 channels 1-7 and 7-13 feed DMA2, 4 bytes apart
+    mux_channel = hdma.ChannelIndex >> 2
+    if hdma.DmaBaseAddress is _stm_registers.DMA1:
+        hdma.DMAmuxChannel = DMAMUX_Channel_TypeDef(DMAMUX1_Channel0_BASE + mux_channel * 4)
     else:
-        hdma.DMAmuxChannel = DMAMUX_Channel_TypeDef(
-            DMAMUX1_Channel7_BASE + (hdma.ChannelIndex >> 2)
-        )
+        hdma.DMAmuxChannel = DMAMUX_Channel_TypeDef(DMAMUX1_Channel7_BASE + mux_channel * 4)
+        mux_channel += 7
 
-    channel_number = ((hdma.Instance.__addr__ & 0xFF) - 8) // 20
-    hdma.DMAmuxChannelStatus = DMAMUX1_ChannelStatus
-    hdma.DMAmuxChannelStatusMask = 1 << (channel_number & 0x1C)
+    hdma.DMAmuxChannelStatus = _stm_registers.DMAMUX1_ChannelStatus
+    hdma.DMAmuxChannelStatusMask = 1 << mux_channel
 
 
 def DMA_CalcDMAMUXRequestGenBaseAndMask(hdma: DMA_HandleTypeDef, Request):
@@ -177,12 +356,105 @@ def DMA_CalcDMAMUXRequestGenBaseAndMask(hdma: DMA_HandleTypeDef, Request):
         (DMAMUX1_RequestGenerator0_BASE + ((request - 1) * 4))
     )
 
-    hdma.DMAmuxRequestGenStatus = DMAMUX1_RequestGenStatus
+    hdma.DMAmuxRequestGenStatus = _stm_registers.DMAMUX1_RequestGenStatus
 
     # here "Request" is either DMA_REQUEST_GENERATOR0 to DMA_REQUEST_GENERATOR3, i.e. <= 4
     hdma.DMAmuxRequestGenStatusMask = 1 << ((request - 1) & 0x3)
 
 
+# Memory data alignment for a buffer's item size in bytes
+DMA_MDATAALIGN_BY_SIZE = {
+    1: DMA_MDATAALIGN_BYTE,
+    2: DMA_MDATAALIGN_HALFWORD,
+    4: DMA_MDATAALIGN_WORD,
+}
+
+
+def DMA_GetItemSize(buf):
+    # Bytes per item of a bytearray / array / memoryview, without copying more than one
+    if not len(buf):
+        return 1
+    return len(bytes(memoryview(buf)[:1]))
+
+
+def DMA_GetMemDataAlignment(buf):
+    size = DMA_GetItemSize(buf)
+    if size not in DMA_MDATAALIGN_BY_SIZE:
+        raise ValueError(f"No DMA memory data alignment for {size} byte items")
+    return DMA_MDATAALIGN_BY_SIZE[size]
+
+
+def DMA_SetMemDataAlignment(hdma: DMA_HandleTypeDef, MemDataAlignment):
+    # MSIZE can only be changed with the channel disabled
+    hdma.Instance.CCR = (hdma.Instance.CCR & ~DMA_CCR_MSIZE) | MemDataAlignment
+
+
+def DMA_CheckBuffer(hdma: DMA_HandleTypeDef, buf, DataLength):
+    # Returns the address of buf for the memory side of the transfer, checking it
+    # matches the channel's MSIZE, is aligned to it and holds DataLength items.
+    # Memoryview slices are passed by address so a part of a buffer needs no copy.
+    size = DMA_GetItemSize(buf)
+    msize = hdma.Instance.CCR & DMA_CCR_MSIZE
+    if DMA_MDATAALIGN_BY_SIZE.get(size) != msize:
+        raise ValueError(f"{size} byte items don't match the channel's memory data alignment")
+    address = uctypes.addressof(buf)
+    if address % size:
+        raise ValueError(f"Buffer at 0x{address:08x} isn't aligned to its {size} byte items")
+    if DataLength > len(buf):
+        raise ValueError(f"DataLength {DataLength} is longer than the {len(buf)} item buffer")
+    return address
+
+
+# (DMA, Channel): channel registers
+DMA_CHANNELS = _Peripherals(
+    {
+        (1, 1): "DMA1_Channel1",
+        (1, 2): "DMA1_Channel2",
+        (1, 3): "DMA1_Channel3",
+        (1, 4): "DMA1_Channel4",
+        (1, 5): "DMA1_Channel5",
+        (1, 6): "DMA1_Channel6",
+        (1, 7): "DMA1_Channel7",
+        (2, 1): "DMA2_Channel1",
+        (2, 2): "DMA2_Channel2",
+        (2, 3): "DMA2_Channel3",
+        (2, 4): "DMA2_Channel4",
+        (2, 5): "DMA2_Channel5",
+        (2, 6): "DMA2_Channel6",
+        (2, 7): "DMA2_Channel7",
+    }
+)
+
+# (DMA, Channel): (Instance, DmaBaseAddress, ChannelIndex, DMAmuxChannel, DMAmuxChannelStatusMask)
+_dma_channel_cache = {}
+
+
+def DMA_GetChannel(DMA: int, Channel: int):
+    # The fixed per channel part of a DMA handle, calculated once per channel
+    channel = _dma_channel_cache.get((DMA, Channel))
+    if channel is None:
+        Instance = DMA_CHANNELS.get((DMA, Channel))
+        if Instance is None:
+            raise AttributeError(f"Cannot find: DMA{DMA}_Channel{Channel}")
+
+        hdma = DMA_HandleTypeDef()
+        hdma.Instance = Instance
+        hdma.DmaBaseAddress = _stm_registers.DMA1 if DMA == 1 else _stm_registers.DMA2
+        # Offset of the channel's flags in ISR / IFCR, 4 per channel
+        hdma.ChannelIndex = (Channel - 1) << 2
+        DMA_CalcDMAMUXChannelBaseAndMask(hdma)
+
+        channel = (
+            hdma.Instance,
+            hdma.DmaBaseAddress,
+            hdma.ChannelIndex,
+            hdma.DMAmuxChannel,
+            hdma.DMAmuxChannelStatusMask,
+        )
+        _dma_channel_cache[(DMA, Channel)] = channel
+    return channel
+
+
 def HAL_DMA_Init(
     DMA: int,
     Channel: int,
@@ -195,23 +467,20 @@ def HAL_DMA_Init(
     Mode,
     Priority,
 ):
-
-    dma_obj_name = f"DMA{DMA}_Channel{Channel}"
-    Instance = globals().get(dma_obj_name)
-    if not isinstance(Instance, DMA_Channel_TypeDef):
-        raise AttributeError(f"Cannot find: {dma_obj_name}")
+    # MemDataAlignment can also be the memory buffer itself (bytearray, array('H'),
+    # array('I') or a memoryview of one) to select the alignment from its item size.
+    if not isinstance(MemDataAlignment, int):
+        MemDataAlignment = DMA_GetMemDataAlignment(MemDataAlignment)
 
     hdma = DMA_HandleTypeDef()
-    hdma.Instance = Instance
-
-    if DMA == 1:
-        hdma.DmaBaseAddress = DMA1
-    elif DMA == 2:
-        hdma.DmaBaseAddress = DMA2
-    else:
-        raise ValueError(f"Don't know DMA base for: {DMA}")
-
-    hdma.ChannelIndex = Channel - 1
+    (
+        hdma.Instance,
+        hdma.DmaBaseAddress,
+        hdma.ChannelIndex,
+        hdma.DMAmuxChannel,
+        hdma.DMAmuxChannelStatusMask,
+    ) = DMA_GetChannel(DMA, Channel)
+    hdma.DMAmuxChannelStatus = _stm_registers.DMAMUX1_ChannelStatus
 
     # Get the CR register value
     tmp = hdma.Instance.CCR
@@ -239,8 +508,6 @@ def HAL_DMA_Init(
 
     # print(f"1. hdma.Instance.CCR = 0x{hdma.Instance.CCR:x}")
 
-    DMA_CalcDMAMUXChannelBaseAndMask(hdma)
-
     if Direction == DMA_MEMORY_TO_MEMORY:
         Request = DMA_REQUEST_MEM2MEM
 
@@ -305,14 +572,136 @@ def DMA_SetConfig(hdma: DMA_HandleTypeDef, Direction, SrcAddress, DstAddress, Da
 def HAL_DMA_Start(hdma: DMA_HandleTypeDef, Direction, SrcAddress, DstAddress, DataLength):
 
     if not isinstance(SrcAddress, int):
-        SrcAddress = uctypes.addressof(SrcAddress)
+        if Direction == DMA_MEMORY_TO_PERIPH:
+            SrcAddress = DMA_CheckBuffer(hdma, SrcAddress, DataLength)
+        else:
+            # Memory to memory source, on the peripheral side of the channel
+            SrcAddress = uctypes.addressof(SrcAddress)
+    if not isinstance(DstAddress, int):
+        DstAddress = DMA_CheckBuffer(hdma, DstAddress, DataLength)
+
+    hdma.ErrorCode = HAL_DMA_ERROR_NONE
 
     # __HAL_DMA_DISABLE(hdma)  ((__HANDLE__)->Instance->CCR &=  ~DMA_CCR_EN)
-    hdma.Instance.CCR &= ~DMA_CCR_EN
+    hdma.Instance.CCR_EN = 0
     # print(f"2. hdma.Instance.CCR = 0x{hdma.Instance.CCR:x}")
 
     DMA_SetConfig(hdma, Direction, SrcAddress, DstAddress, DataLength)
 
     # __HAL_DMA_ENABLE(hdma) ((__HANDLE__)->Instance->CCR |=  DMA_CCR_EN)
-    hdma.Instance.CCR |= DMA_CCR_EN
+    hdma.Instance.CCR_EN = 1
     # print(f"3. hdma.Instance.CCR = 0x{hdma.Instance.CCR:x}")
+
+
+def HAL_DMA_Start_IT(hdma: DMA_HandleTypeDef, Direction, SrcAddress, DstAddress, DataLength):
+
+    if not isinstance(SrcAddress, int):
+        if Direction == DMA_MEMORY_TO_PERIPH:
+            SrcAddress = DMA_CheckBuffer(hdma, SrcAddress, DataLength)
+        else:
+            # Memory to memory source, on the peripheral side of the channel
+            SrcAddress = uctypes.addressof(SrcAddress)
+    if not isinstance(DstAddress, int):
+        DstAddress = DMA_CheckBuffer(hdma, DstAddress, DataLength)
+
+    hdma.ErrorCode = HAL_DMA_ERROR_NONE
+
+    # __HAL_DMA_DISABLE(hdma)
+    hdma.Instance.CCR_EN = 0
+
+    DMA_SetConfig(hdma, Direction, SrcAddress, DstAddress, DataLength)
+
+    # Enable the transfer complete interrupt
+    # Enable the transfer Error interrupt
+    tmp = hdma.Instance.CCR & ~DMA_IT_HT
+    if hdma.XferHalfCpltCallback is not None:
+        # Enable the Half transfer complete interrupt as well
+        tmp |= DMA_IT_HT
+    hdma.Instance.CCR = tmp | DMA_IT_TC | DMA_IT_TE
+
+    # __HAL_DMA_ENABLE(hdma)
+    hdma.Instance.CCR_EN = 1
+
+
+def HAL_DMA_Abort(hdma: DMA_HandleTypeDef):
+    # Disable DMA IT
+    hdma.Instance.CCR &= ~(DMA_IT_TC | DMA_IT_HT | DMA_IT_TE)
+
+    # Disable the channel
+    hdma.Instance.CCR_EN = 0
+
+    # Clear all flags
+    hdma.DmaBaseAddress.IFCR = DMA_ISR_GIF1 << (hdma.ChannelIndex & 0x1C)
+
+    # Clear the DMAMUX synchro overrun flag
+    hdma.DMAmuxChannelStatus.CFR = hdma.DMAmuxChannelStatusMask
+
+
+def HAL_DMA_IRQHandler(hdma: DMA_HandleTypeDef):
+    # The micropython firmware owns the DMA interrupt vectors, so this is not
+    # wired to the NVIC. Instead call it from a pyb.Timer callback (or a loop)
+    # often enough to service every half transfer; the ISR flags are latched
+    # by the hardware regardless.
+    shift = hdma.ChannelIndex & 0x1C
+    flag_it = hdma.DmaBaseAddress.ISR
+    source_it = hdma.Instance.CCR
+
+    # Half Transfer Complete Interrupt management
+    if (flag_it & (DMA_FLAG_HT1 << shift)) and (source_it & DMA_IT_HT):
+        # Disable the half transfer interrupt if the DMA mode is not CIRCULAR
+        if not (source_it & DMA_CCR_CIRC):
+            hdma.Instance.CCR &= ~DMA_IT_HT
+
+        # Clear the half transfer complete flag
+        hdma.DmaBaseAddress.IFCR = DMA_ISR_HTIF1 << shift
+
+        if hdma.XferHalfCpltCallback is not None:
+            hdma.XferHalfCpltCallback(hdma)
+
+    # Transfer Complete Interrupt management
+    elif (flag_it & (DMA_FLAG_TC1 << shift)) and (source_it & DMA_IT_TC):
+        if not (source_it & DMA_CCR_CIRC):
+            # Disable the transfer complete and error interrupt
+            hdma.Instance.CCR &= ~(DMA_IT_TE | DMA_IT_TC)
+
+        # Clear the transfer complete flag
+        hdma.DmaBaseAddress.IFCR = DMA_ISR_TCIF1 << shift
+
+        if hdma.XferCpltCallback is not None:
+            hdma.XferCpltCallback(hdma)
+
+    # Transfer Error Interrupt management
+    elif (flag_it & (DMA_FLAG_TE1 << shift)) and (source_it & DMA_IT_TE):
+        # When a DMA transfer error occurs, the hardware clears the EN bit.
+        # Disable ALL DMA IT
+        hdma.Instance.CCR &= ~(DMA_IT_TC | DMA_IT_HT | DMA_IT_TE)
+
+        # Clear all flags
+        hdma.DmaBaseAddress.IFCR = DMA_ISR_GIF1 << shift
+
+        # Update error code
+        hdma.ErrorCode = HAL_DMA_ERROR_TE
+
+        if hdma.XferErrorCallback is not None:
+            hdma.XferErrorCallback(hdma)
+
+
+def HAL_TIM_DMABurst_MultiWriteStart(
+    TIMER, hdma: DMA_HandleTypeDef, BurstBaseAddress, BurstRequestSrc, BurstBuffer, BurstLength, DataLength
+):
+    # Each BurstRequestSrc DMA request from TIMER writes BurstLength consecutive registers,
+    # starting at BurstBaseAddress, through the DMAR register.
+    HAL_DMA_Start(hdma, DMA_MEMORY_TO_PERIPH, BurstBuffer, TIMER.__reg_addr__("DMAR"), DataLength)
+
+    # Configure the DMA Burst Mode
+    TIMER.DCR = BurstBaseAddress | BurstLength
+
+    # Enable the TIM DMA Request
+    __HAL_TIM_ENABLE_DMA__(TIMER, BurstRequestSrc)
+
+
+def HAL_TIM_DMABurst_WriteStop(TIMER, hdma: DMA_HandleTypeDef, BurstRequestSrc):
+    # Disable the TIM Update DMA request
+    __HAL_TIM_DISABLE_DMA__(TIMER, BurstRequestSrc)
+
+    HAL_DMA_Abort(hdma)
@@ -0,0 +1,110 @@
+from signal_gen.lut import interleave, lut_width_of
+from signal_gen.stm_dma_timer import (
+    __HAL_TIM_ENABLE__,
+    __HAL_TIM_DISABLE__,
+    __HAL_TIM_ENABLE_DMA__,
+    __HAL_TIM_DISABLE_DMA__,
+    HAL_TIMEx_MasterConfigSynchronization,
+    TIM_SlaveTimer_SetConfig,
+    TIM_ITR_CONNECTIONS,
+    TIM_TRGO_ENABLE,
+    TIM_TRGO_RESET,
+    TIM_MASTERSLAVEMODE_ENABLE,
+    TIM_MASTERSLAVEMODE_DISABLE,
+    TIM_SLAVEMODE_TRIGGER,
+    TIM_SLAVEMODE_DISABLE,
+)
+
+
+class SyncGroup:
+    """
+    Phase locked SignalGenerator's, their sample timers started together by the
+    first (master) one's counter enable through its TRGO and the others' slave
+    mode controllers, rather than one after the other from python.
+
+    Only timers with an internal trigger from the master can follow it; on the
+    STM32WB55 that's TIM1 and TIM2 (TIM16 / TIM17 have no slave mode), so the
+    generators' PWM outputs go on the other timers:
+
+        a = SignalGenerator(pwm_pin="A6", pwm_timer=16, pwm_channel=1, sample_timer=1)
+        b = SignalGenerator(pwm_pin="A7", pwm_timer=17, pwm_channel=1, sample_timer=2)
+        group = SyncGroup()
+        group.add(a)
+        group.add(b, phase=90)  # b leads a by 90 degrees
+        group.start()
+
+    phase is in degrees of each generator's waveform period. Whole samples of it
+    are a rotated copy of the LUT, the rest a preset of the sample timer counter.
+    """
+
+    def __init__(self):
+        self.generators = []
+        self.phases = []
+        self._luts = []  # (LUT, rotated copy of it playing)
+
+    def add(self, generator, phase=0):
+        if self.generators:
+            master = self.generators[0].sample_timer_id
+            if (generator.sample_timer_id, master) not in TIM_ITR_CONNECTIONS:
+                raise ValueError(
+                    f"TIM{generator.sample_timer_id} can't be triggered by TIM{master}"
+                )
+        self.generators.append(generator)
+        self.phases.append(phase)
+        self._luts.append((None, None))
+
+    def start(self):
+        """
+        Start (or re-align) every generator: with all the sample timers stopped each
+        DMA is restarted at the top of its LUT and the counters preset, then one
+        counter enable on the master starts them all.
+        """
+        master = self.generators[0]
+        for generator in self.generators:
+            generator.start()
+            __HAL_TIM_DISABLE__(generator.timer_regs)
+            __HAL_TIM_DISABLE_DMA__(generator.timer_regs, generator.dma_source)
+
+        for i, generator in enumerate(self.generators):
+            regs = generator.timer_regs
+            shift = self.phases[i] * generator.samples / 360
+            whole = int(shift)
+            # Rotate the LUT from before any earlier start(), unless it's been changed since
+            source, rotated = self._luts[i]
+            if generator.lut is not rotated:
+                source = generator.lut
+            rotated = source
+            if whole % len(source):
+                rotated = interleave(source, (whole,), lut_width_of(source))
+            self._luts[i] = (source, rotated)
+            # Re-points the (stopped) DMA at the first sample
+            generator.set_waveform(rotated, generator.periods)
+            regs.CNT = int((shift - whole) * (regs.ARR + 1))
+            regs.SR = 0
+            if generator is not master:
+                TIM_SlaveTimer_SetConfig(
+                    regs,
+                    TIM_SLAVEMODE_TRIGGER,
+                    TIM_ITR_CONNECTIONS[(generator.sample_timer_id, master.sample_timer_id)],
+                )
+            __HAL_TIM_ENABLE_DMA__(regs, generator.dma_source)
+
+        HAL_TIMEx_MasterConfigSynchronization(
+            master.timer_regs, TIM_TRGO_ENABLE, TIM_MASTERSLAVEMODE_ENABLE
+        )
+        __HAL_TIM_ENABLE__(master.timer_regs)
+
+    def stop(self):
+        # Stops every generator and returns their timers to free running
+        master = self.generators[0]
+        for generator in self.generators:
+            regs = generator.timer_regs
+            if regs is None:
+                continue
+            if generator is master:
+                HAL_TIMEx_MasterConfigSynchronization(
+                    regs, TIM_TRGO_RESET, TIM_MASTERSLAVEMODE_DISABLE
+                )
+            else:
+                TIM_SlaveTimer_SetConfig(regs, TIM_SLAVEMODE_DISABLE, 0)
+            generator.stop()
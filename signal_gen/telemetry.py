@@ -0,0 +1,208 @@
+import struct
+from array import array
+from collections import namedtuple
+from time import ticks_us, ticks_diff
+
+import micropython
+from micropython import const
+
+from signal_gen.stm_dma_timer import (
+    DMA_HandleTypeDef,
+    DMA_CCR_EN,
+    DMA_FLAG_TE1,
+    HAL_DMA_ERROR_TE,
+)
+
+# ticks_us, transfers, rate (Hz), errors, DMAMUX sync overruns, request generator
+# overruns, stalls, all little endian: 20 bytes per snapshot.
+SNAPSHOT_FORMAT = "<IIIHHHH"
+SNAPSHOT_SIZE = struct.calcsize(SNAPSHOT_FORMAT)
+
+Snapshot = namedtuple(
+    "Snapshot", ("ticks", "transfers", "rate", "errors", "mux_overruns", "gen_overruns", "stalls")
+)
+
+# _addrs: register addresses then flag masks
+_ISR = const(0)
+_IFCR = const(1)
+_CNDTR = const(2)
+_CSR = const(3)
+_CFR = const(4)
+_RGSR = const(5)
+_RGCFR = const(6)
+_TE_FLAG = const(7)
+_MUX_MASK = const(8)
+_GEN_MASK = const(9)
+_LENGTH = const(10)
+
+# _counts
+_REMAINING = const(0)
+_TRANSFERS = const(1)
+_ERRORS = const(2)
+_MUX_OVERRUNS = const(3)
+_GEN_OVERRUNS = const(4)
+_TE_SET = const(5)
+
+# Counts wrap here, to stay in small ints
+_COUNT_MASK = const(0x3FFFFFFF)
+
+
+@micropython.viper
+def _update(addrs: ptr32, counts: ptr32) -> int:
+    # Count and clear the latched overrun flags, and the transfers since the last
+    # call from the change in CNDTR. Returns the transfers.
+    # The TE flag is only read, it's left for HAL_DMA_IRQHandler / DMAEvents to clear.
+    counts[_TE_SET] = ptr32(addrs[_ISR])[0] & addrs[_TE_FLAG]
+
+    mux = addrs[_MUX_MASK]
+    if ptr32(addrs[_CSR])[0] & mux:
+        ptr32(addrs[_CFR])[0] = mux
+        counts[_MUX_OVERRUNS] += 1
+
+    gen = addrs[_GEN_MASK]
+    if gen and ptr32(addrs[_RGSR])[0] & gen:
+        ptr32(addrs[_RGCFR])[0] = gen
+        counts[_GEN_OVERRUNS] += 1
+
+    remaining = ptr32(addrs[_CNDTR])[0]
+    moved = counts[_REMAINING] - remaining
+    if moved < 0:
+        # Wrapped around the circular buffer
+        moved += addrs[_LENGTH]
+    counts[_REMAINING] = remaining
+    counts[_TRANSFERS] = (counts[_TRANSFERS] + moved) & _COUNT_MASK
+    return moved
+
+
+class DMATelemetry:
+    """
+    Health and throughput counters of a running circular DMA channel, for spotting
+    bus starvation in the field:
+     * errors, transfer errors, each of which stops the channel. The TE flag is
+       left set for HAL_DMA_IRQHandler / DMAEvents, which record it in
+       hdma.ErrorCode, so an error is counted whichever of them sees it first
+     * mux_overruns, DMAMUX synchronisation overruns (CSR SOFx)
+     * gen_overruns, DMAMUX request generator overruns (RGSR OFx), if one's used
+     * transfers, counted from CNDTR (wrapping at 2**30), and rate, transfers per
+       second over `window_us`
+     * stalls, updates finding CNDTR hadn't moved (or the channel disabled)
+
+    update() samples the registers, with a viper helper and small int maths only so
+    it can run as a pyb.Timer callback. It needs calling every poll_us at most.
+    Whole passes over the buffer are invisible in CNDTR, so the buffer must take
+    at least twice that at the channel's configured request rate (Hz), eg. for
+    a DDSGenerator's 4096 sample stream at 1MHz:
+
+        telemetry = DMATelemetry(dds.stream.hdma, 4096, dds.sample_rate, 1000)
+        Timer(4, freq=1000, callback=lambda t: telemetry.update())
+        ...
+        log.write(telemetry.snapshot())
+    """
+
+    def __init__(self, hdma: DMA_HandleTypeDef, length, rate, poll_us, window_us=100_000):
+        self.hdma = hdma
+        self.request_rate = rate
+        self.poll_us = poll_us
+        self.window_us = window_us
+        shift = hdma.ChannelIndex & 0x1C
+        mux = hdma.DMAmuxChannelStatus
+        gen = hdma.DMAmuxRequestGenStatus
+        self._addrs = array(
+            "I",
+            (
+                hdma.DmaBaseAddress.__reg_addr__("ISR"),
+                hdma.DmaBaseAddress.__reg_addr__("IFCR"),
+                hdma.Instance.__reg_addr__("CNDTR"),
+                mux.__reg_addr__("CSR"),
+                mux.__reg_addr__("CFR"),
+                gen.__reg_addr__("RGSR") if gen else 0,
+                gen.__reg_addr__("RGCFR") if gen else 0,
+                DMA_FLAG_TE1 << shift,
+                hdma.DMAmuxChannelStatusMask,
+                hdma.DMAmuxRequestGenStatusMask if gen else 0,
+                length,
+            ),
+        )
+        self._counts = array("I", (0, 0, 0, 0, 0, 0))
+        self.stalls = 0
+        self._failed = False
+        # Transfers and microseconds of the last full window, the rate is worked out
+        # from them outside of update()
+        self._window_count = 0
+        self._window_us = 1
+        self.restart(length)
+
+    def restart(self, length):
+        # After (re)starting the channel on a length item buffer
+        if length * 1_000_000 < 2 * self.poll_us * self.request_rate:
+            raise ValueError(
+                f"{length} transfers at {self.request_rate}Hz can wrap between updates "
+                f"{self.poll_us}us apart"
+            )
+        self._addrs[_LENGTH] = length
+        self._counts[_REMAINING] = self.hdma.Instance.CNDTR
+        self._window_start = ticks_us()
+        self._window_transfers = self._counts[_TRANSFERS]
+
+    def update(self):
+        counts = self._counts
+        hdma = self.hdma
+        if not _update(self._addrs, counts) or not hdma.Instance.CCR & DMA_CCR_EN:
+            self.stalls += 1
+        # Sticky until the channel's restarted, so each error's counted once
+        failed = bool(counts[_TE_SET] or hdma.ErrorCode & HAL_DMA_ERROR_TE)
+        if failed and not self._failed:
+            counts[_ERRORS] += 1
+        self._failed = failed
+        now = ticks_us()
+        elapsed = ticks_diff(now, self._window_start)
+        if elapsed >= self.window_us:
+            transfers = self._counts[_TRANSFERS]
+            self._window_count = (transfers - self._window_transfers) & _COUNT_MASK
+            self._window_us = elapsed
+            self._window_start = now
+            self._window_transfers = transfers
+
+    @property
+    def rate(self):
+        return self._window_count * 1_000_000 // self._window_us
+
+    @property
+    def transfers(self):
+        return self._counts[_TRANSFERS]
+
+    @property
+    def errors(self):
+        return self._counts[_ERRORS]
+
+    @property
+    def mux_overruns(self):
+        return self._counts[_MUX_OVERRUNS]
+
+    @property
+    def gen_overruns(self):
+        return self._counts[_GEN_OVERRUNS]
+
+    def snapshot(self, buf=None, offset=0):
+        """
+        The counters packed as SNAPSHOT_FORMAT, into buf at offset if given (eg. a
+        preallocated log buffer) otherwise as new bytes. The 16bit counts wrap.
+        """
+        counts = self._counts
+        values = (
+            ticks_us(),
+            counts[_TRANSFERS],
+            self.rate,
+            counts[_ERRORS] & 0xFFFF,
+            counts[_MUX_OVERRUNS] & 0xFFFF,
+            counts[_GEN_OVERRUNS] & 0xFFFF,
+            self.stalls & 0xFFFF,
+        )
+        if buf is None:
+            return struct.pack(SNAPSHOT_FORMAT, *values)
+        struct.pack_into(SNAPSHOT_FORMAT, buf, offset, *values)
+        return buf
+
+
+def unpack_snapshot(data, offset=0):
+    return Snapshot(*struct.unpack_from(SNAPSHOT_FORMAT, data, offset))
@@ -0,0 +1,285 @@
+from collections import namedtuple
+
+import numpy as np
+
+from signal_gen import lut
+from signal_gen.lut import fill_lut, lut_width, new_lut
+from signal_gen.planner import DEFAULT_CLOCK, Plan, calc_prescaler_period
+
+# Host side (cpython + numpy) spectral analysis of the filtered PWM output, eg.
+#   $ python spectrum.py 40000 100000
+# sweeps the sample / level configurations for a 40kHz sine through a 100kHz RC
+# low pass and prints the Pareto front of quality against DMA rate and memory.
+#
+# One sine period of the PWM bitstream is reconstructed at the timer clock, with
+# the TIM1 compare preload picking up the latest DMA written LUT value at the start
+# of each PWM period, then treated as periodic. When the PWM period doesn't divide
+# the sine period the truncated last PWM pulse shows up as a small extra spur.
+
+# Elements per batch of bitstreams, bounding the numpy working memory
+BATCH_ELEMENTS = 1 << 22
+
+Analysis = namedtuple(
+    "Analysis",
+    (
+        "amplitude",  # filtered fundamental amplitude, fraction of VDD
+        "thd",  # total harmonic distortion, ratio of rms
+        "snr",  # fundamental to non-harmonic power, dB
+        "sinad",  # fundamental to everything else, dB
+        "sfdr",  # fundamental to largest spur, dBc
+        "spur_freq",  # frequency of the largest spur
+        "ripple",  # peak to peak of the carrier residue, fraction of VDD
+        "dma_rate",  # DMA requests per second
+        "memory",  # LUT bytes
+    ),
+)
+
+
+def rc_cutoff(r, c):
+    # Corner frequency of the series resistor, capacitor to ground filter
+    return 1 / (2 * np.pi * r * c)
+
+
+def configs(
+    freq,
+    clock=DEFAULT_CLOCK,
+    max_error=0.01,
+    samples=range(8, 1025),
+    levels=(4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096),
+    max_sample_rate=2_000_000,
+):
+    """
+    Every (samples, levels) combination the timers can run for a sine of freq Hz,
+    as planner Plan's with TIM1 and TIM16 on the same clock.
+    """
+    plans = []
+    for n in samples:
+        psc_arr = calc_prescaler_period(clock, freq * n)
+        if psc_arr is None:
+            continue
+        psc16, arr16 = psc_arr
+        sample_rate = clock / ((psc16 + 1) * (arr16 + 1))
+        if sample_rate > max_sample_rate:
+            break
+        achieved = sample_rate / n
+        error = abs(achieved - freq) / freq
+        if error > max_error:
+            continue
+        for level in levels:
+            # At least one full PWM period per sample
+            if level > clock // sample_rate:
+                break
+            plans.append(
+                Plan(
+                    freq=achieved,
+                    error=error,
+                    samples=n,
+                    levels=level,
+                    sample_rate=sample_rate,
+                    pwm_freq=clock / level,
+                    tim1_psc=0,
+                    tim1_arr=level - 1,
+                    tim16_psc=psc16,
+                    tim16_arr=arr16,
+                )
+            )
+    return plans
+
+
+def _cordic_sin(phase, x0):
+    # lut._cordic_sin on an array of phases at once
+    x = np.full(phase.shape, x0, dtype=np.int64)
+    y = np.zeros(phase.shape, dtype=np.int64)
+    z = phase.copy()
+    for i, atan in enumerate(lut._CORDIC_ATAN):
+        up = z >= 0
+        xs = x >> i
+        ys = y >> i
+        x, y = np.where(up, x - ys, x + ys), np.where(up, y + xs, y - xs)
+        z = np.where(up, z - atan, z + atan)
+    return y
+
+
+def sine_luts(samples, levels):
+    """
+    The values of lut.fill_lut(buf, "sine", levels) for each samples, levels pair,
+    calculated with numpy all at once. Returns rows padded with zeros.
+    """
+    samples = np.asarray(samples, dtype=np.int64)
+    half = np.asarray(levels, dtype=np.int64) // 2
+    x0 = (half - 1) * lut._CORDIC_K_HI + (((half - 1) * lut._CORDIC_K_LO) >> 12)
+    offset = (half << lut._FRAC) + (1 << (lut._FRAC - 1))
+    row = np.repeat(np.arange(len(samples)), samples)
+    i = np.arange(len(row)) - np.repeat(np.cumsum(samples) - samples, samples)
+    n = samples[row]
+
+    # Multiples of 4 samples are mirrored from the first quarter like the device,
+    # the second half negated
+    mirrored = n % 4 == 0
+    mid = n // 2
+    j = np.where(i >= mid, i - mid, i)
+    j = np.minimum(j, mid - j)
+    phase = i * lut._TURN // n
+    quadrant = phase >> lut._QUARTER_BITS
+    angle = phase & (lut._QUARTER - 1)
+    angle = np.where(quadrant & 1, lut._QUARTER - angle, angle)
+    y = _cordic_sin(np.where(mirrored, j * lut._TURN // n, angle), x0[row])
+    negative = np.where(mirrored, i >= mid, (quadrant & 2) != 0)
+
+    luts = np.zeros((len(samples), samples.max()), dtype=np.int64)
+    luts[row, i] = (offset[row] + np.where(negative, -y, y)) >> lut._FRAC
+    return luts
+
+
+def bitstream(luts, pwm_period, sample_period, pwm_psc, length):
+    """
+    PWM output (0 / 1) at each timer clock tick of one sine period, for a batch of
+    configurations. luts is (batch, max samples), the others (batch, 1) in ticks.
+    """
+    bits = np.empty((len(luts), length), dtype=np.float32)
+    tick = np.arange(length)
+    counters = {period: tick % period for period in np.unique(pwm_period)}
+    rows = zip(bits, luts, pwm_period[:, 0], sample_period[:, 0], pwm_psc[:, 0])
+    for row, values, period, sample, psc in rows:
+        # The compare value latched at the start of each PWM period, held across it
+        duty = values[tick[::period] // sample] * psc
+        np.less(counters[period], np.repeat(duty, period)[:length], out=row)
+    return bits
+
+
+def _analyze_batch(plans, cutoff, clock, max_harmonic, periods, order, poles):
+    # One table spans periods sine periods, so the fundamental is FFT bin periods
+    length = plans[0].samples * periods * (plans[0].tim16_psc + 1) * (plans[0].tim16_arr + 1)
+    if periods == 1 and not order:
+        luts = sine_luts([p.samples for p in plans], [p.levels for p in plans])
+    else:
+        luts = np.zeros((len(plans), max(p.samples for p in plans) * periods), dtype=np.int64)
+        for i, p in enumerate(plans):
+            buf = new_lut(p.samples * periods, lut_width(p.levels))
+            values = np.asarray(memoryview(fill_lut(buf, "sine", p.levels, periods, order)))
+            luts[i, : p.samples * periods] = values
+    column = lambda values: np.array(values, dtype=np.int64)[:, np.newaxis]
+    pwm_psc = column([p.tim1_psc + 1 for p in plans])
+    pwm_period = column([(p.tim1_psc + 1) * (p.tim1_arr + 1) for p in plans])
+    sample_period = column([(p.tim16_psc + 1) * (p.tim16_arr + 1) for p in plans])
+
+    spectrum = np.fft.rfft(bitstream(luts, pwm_period, sample_period, pwm_psc, length), axis=1)
+    bins = np.arange(spectrum.shape[1])
+    spectrum *= (1 / (1 + 1j * bins * (clock / length) / cutoff)) ** poles / length
+
+    power = np.abs(spectrum) ** 2
+    power[:, 0] = 0
+    fundamental = power[:, periods].copy()
+    harmonics = power[:, periods * np.arange(2, max_harmonic + 1)[: (len(bins) - 1) // periods - 1]]
+    harmonics = harmonics.sum(axis=1)
+    power[:, periods] = 0
+    other = power.sum(axis=1)
+    tiny = np.finfo(np.float64).tiny
+    spur = np.argmax(power, axis=1)
+    largest = power[np.arange(len(plans)), spur]
+
+    # Carrier residue, everything above half the PWM frequency
+    carrier = length / pwm_period[:, 0]
+    for row, first in zip(spectrum, np.ceil(carrier / 2).astype(np.intp)):
+        row[:first] = 0
+    ripple = np.fft.irfft(spectrum, n=length, axis=1) * length
+
+    return (
+        2 * np.sqrt(fundamental),
+        np.sqrt(harmonics / fundamental),
+        10 * np.log10(fundamental / np.maximum(other - harmonics, tiny)),
+        10 * np.log10(fundamental / np.maximum(other, tiny)),
+        10 * np.log10(fundamental / np.maximum(largest, tiny)),
+        spur * clock / length,
+        np.ptp(ripple, axis=1),
+    )
+
+
+def analyze(plans, cutoff, clock=DEFAULT_CLOCK, max_harmonic=10, periods=1, order=0, poles=1):
+    """
+    THD, SNR, spurs and ripple of each plan's sine after an RC low pass at cutoff Hz,
+    of poles identical buffered stages. Plans are batched by sine period length so each batch is one 2D
+    FFT. Returns an Analysis of arrays indexed like plans.
+
+    periods and order select the noise shaped long tables of lut.fill_lut, with
+    plan.samples still counting the samples per sine period.
+    """
+    results = np.zeros((len(Analysis._fields), len(plans)))
+    groups = {}
+    for i, p in enumerate(plans):
+        length = p.samples * periods * (p.tim16_psc + 1) * (p.tim16_arr + 1)
+        groups.setdefault(length, []).append(i)
+
+    for length, indices in groups.items():
+        batch = max(1, BATCH_ELEMENTS // length)
+        for start in range(0, len(indices), batch):
+            chunk = indices[start : start + batch]
+            values = _analyze_batch(
+                [plans[i] for i in chunk], cutoff, clock, max_harmonic, periods, order, poles
+            )
+            for field, value in enumerate(values):
+                results[field, chunk] = value
+
+    results[-2] = [p.sample_rate for p in plans]
+    results[-1] = [p.samples * periods * lut_width(p.levels) for p in plans]
+    return Analysis(*results)
+
+
+def pareto(analysis, quality="sinad"):
+    """
+    Indices of the configurations not beaten on quality (higher is better) while
+    needing no more DMA rate and memory, in DMA rate order.
+    """
+    cost = np.stack((analysis.dma_rate, analysis.memory, -getattr(analysis, quality)), axis=1)
+    # Sorted, anything that beats a configuration comes before it. Checking against
+    # the front found so far is enough, whatever beats a dominated one beats it too.
+    front = []
+    for i in np.lexsort(cost.T[::-1]):
+        if front:
+            found = cost[front]
+            if ((found <= cost[i]).all(axis=1) & (found < cost[i]).any(axis=1)).any():
+                continue
+        front.append(i)
+    return np.array(front, dtype=np.intp)
+
+
+def report(plans, analysis, indices):
+    lines = [
+        f"{'samples':>7} {'levels':>6} {'freq':>10} {'dma rate':>10} {'bytes':>6} "
+        f"{'thd %':>7} {'snr dB':>7} {'sinad dB':>8} {'sfdr dBc':>8} {'ripple %':>8}"
+    ]
+    for i in indices:
+        p = plans[i]
+        lines.append(
+            f"{p.samples:>7} {p.levels:>6} {p.freq:>10.1f} {analysis.dma_rate[i]:>10.0f} "
+            f"{analysis.memory[i]:>6.0f} {analysis.thd[i] * 100:>7.3f} {analysis.snr[i]:>7.1f} "
+            f"{analysis.sinad[i]:>8.1f} {analysis.sfdr[i]:>8.1f} {analysis.ripple[i] * 100:>8.3f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    args = sys.argv[1:]
+    if len(args) < 2:
+        raise SystemExit(
+            f"usage: {sys.argv[0]} freq rc_cutoff [max_error] [timer_clock] [periods] [order] [poles]"
+        )
+    freq = float(args[0])
+    cutoff = float(args[1])
+    max_error = float(args[2]) if len(args) > 2 else 0.01
+    clock = int(float(args[3])) if len(args) > 3 else DEFAULT_CLOCK
+    periods = int(args[4]) if len(args) > 4 else 1
+    order = int(args[5]) if len(args) > 5 else 0
+    poles = int(args[6]) if len(args) > 6 else 1
+
+    plans = [p for p in configs(freq, clock, max_error) if p.levels >= 4 + 2 * order]
+    if not plans:
+        raise SystemExit(f"No configuration within {max_error} of {freq}Hz")
+    start = time.perf_counter()
+    analysis = analyze(plans, cutoff, clock, periods=periods, order=order, poles=poles)
+    elapsed = time.perf_counter() - start
+    print(f"{len(plans)} configurations analysed in {elapsed:.2f}s, Pareto front:")
+    print(report(plans, analysis, pareto(analysis)))
@@ -1,40 +1,45 @@
+import ast
 import fnmatch
+import hashlib
+import json
+import os
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from collections import OrderedDict
-from functools import partial
 from pathlib import Path
 from unittest import mock
 
 # Stub in cpython mocks for the micropython modules included in the template below.
 sys.modules["uctypes"] = mock.MagicMock()
 sys.modules["micropython"] = mock.MagicMock()
+# and the viper types
+uint = ptr32 = mock.MagicMock()
 
 
 # TEMPLATE MARK
 import uctypes
+import micropython
 from micropython import const
 
 
+_UINT32 = uctypes.UINT32
+_BFUINT32 = uctypes.BFUINT32
+_BF_POS = uctypes.BF_POS
+_BF_LEN = uctypes.BF_LEN
+
+
 class Register:
-    def __init__(self, addr) -> None:
-        if not hasattr(self.__class__, "__regs__"):
-            # We have register definitions defined on Register subclasses, which are used
-            # to create the uctypes.struct instances.
-            # These attributes get in the way of reading the struct attrs though, so move
-            # them to an class.__regs__ dict for referencing and delete from the class itself.
-            __regs__ = {k: v for k, v in self.__class__.__dict__.items() if not k.startswith("_")}
-            setattr(self.__class__, "__regs__", __regs__)
-            for k in __regs__:
-                delattr(self.__class__, k)
+    # Register offsets and the matching uctypes descriptor, generated on each subclass.
+    # The descriptor also has a <REGISTER>_<FIELD> bitfield for each field of the
+    # registers named in the requirements, eg. DMA1_Channel1.CCR_PL = 2 does a single
+    # masked write of CCR.
+    __regs__ = {}
+    __desc__ = {}
 
+    def __init__(self, addr) -> None:
         self.__addr__ = addr
 
-        descriptor = {
-            k: (v | uctypes.UINT32) for k, v in self.__class__.__regs__.items()  # type: ignore
-        }
-        self.__struct__ = uctypes.struct(addr, descriptor)
-
     def __reg_addr__(self, register: str):
         return self.__addr__ + self.__regs__[register]
 
@@ -52,6 +57,12 @@ class Register:
             print(f"{k : 10} (0x{v:04x}):  0x{val:04x}")
 
     def __getattr__(self, __name: str):
+        if __name == "__struct__":
+            # The uctypes struct is only created on first access of the peripheral.
+            struct = uctypes.struct(self.__addr__, self.__desc__)
+            self.__struct__ = struct
+            return struct
+
         if __name.startswith("_"):
             raise AttributeError(__name)
 
@@ -65,55 +76,460 @@ class Register:
             setattr(self.__struct__, __name, __value)
 
 
+# Fast path register access, bypassing the Register attribute lookups.
+# Use with the generated <INSTANCE>_<REGISTER>_ADDR constants (only those named in the
+# requirements are generated), eg.
+#   reg_set_bits(TIM16_DIER_ADDR, TIM_DIER_CC1DE)
+
+
+@micropython.viper
+def reg_read(addr: uint) -> uint:
+    return ptr32(addr)[0]
+
+
+@micropython.viper
+def reg_write(addr: uint, value: uint):
+    ptr32(addr)[0] = value
+
+
+@micropython.viper
+def reg_set_bits(addr: uint, bits: uint):
+    p = ptr32(addr)
+    p[0] = p[0] | bits
+
+
+@micropython.viper
+def reg_clear_bits(addr: uint, bits: uint):
+    p = ptr32(addr)
+    p[0] = p[0] & ~bits
+
+
+@micropython.viper
+def reg_modify(addr: uint, clear_bits: uint, set_bits: uint):
+    p = ptr32(addr)
+    p[0] = (p[0] & ~clear_bits) | set_bits
+
+
 # TEMPLATE MARK
 
+HEADER_CACHE = ".stm_register_cache.json"
+# Bump when the index format changes, to invalidate existing caches
+HEADER_CACHE_VERSION = 1
+
+DEFINE_RE = re.compile(r"#define (\S+) +(.+)")
+FIELD_RE = re.compile(r".*uint32_t *(\S+) *;( */\*!<.*\*/)")
+STRUCT_END_RE = re.compile(r"\} ?(\S+TypeDef);")
+BRIEF_RE = re.compile(r".*@brief (.+)")
+INSTANCE_RE = re.compile(r"\((\S+TypeDef) *\*\) (\S+)")
+IDENTIFIER_RE = re.compile(r"\b[A-Za-z_]\w*")
+
+
+def __parse_define(details):
+    comment = ""
+    for comments in re.findall(r"(/\*!?<?(.*?)\*/)", details):
+        comment = "  # " + comments[1].strip()
+        details = details.split("/*")[0]
+        break
+
+    value = details.strip()
+    if not value:
+        return None, comment
+
+    # Remove UL suffix from numbers
+    value = re.sub(r"(0x[a-fA-F0-9]+)[UL]*", r"\1", value)
+    value = re.sub(r"([0-9]+)[uUL]*", r"\1", value)
+    # Parse out any type casting
+    value = re.sub(r"\(uint\d+_t\)(.*)", r"\1", value)
+    if value.startswith("(") and value.endswith(")"):
+        value = value[1:-1]
+    return value, comment
+
+
+def __parse_struct(lines, start):
+    # lines[start] is "typedef struct", returns (name, title, fields), end line
+    if lines[start + 1 : start + 2] != ["{"]:
+        return None, start + 1
+
+    title = None
+    if start >= 2 and re.fullmatch(r" *\*/", lines[start - 1]):
+        brief = BRIEF_RE.match(lines[start - 2])
+        if brief:
+            title = brief[1]
+
+    fields = []
+    i_off = 0
+    blank = False
+    for i in range(start + 2, len(lines)):
+        line = lines[i]
+        row = FIELD_RE.fullmatch(line)
+        if row:
+            field = row[1]
+            if "[" in field:
+                # Don't support arrays, just fix index
+                i_off += int(field.split("[")[-1].split("]")[0]) - 1
+                field = "# " + field
+            if field.startswith("RESERVED"):
+                field = "# " + field
+            index = (len(fields) + i_off) * 4
+            comment = row[2].strip().replace("  ", " ")
+            fields.append((field, index, comment))
+            blank = False
+        elif not line and fields and not blank:
+            # A single blank line is allowed after each field
+            blank = True
+        else:
+            end = STRUCT_END_RE.match(line)
+            if end and fields:
+                return (end[1], title, fields), i + 1
+            # Only plain uint32_t register structs are supported
+            return None, i
+    return None, len(lines)
+
+
+def __parse_header(text):
+    """
+    Tokenize a c header line by line in a single pass, building an index of its
+    #define values, peripheral instances and register typedef structs.
+    """
+    defines = []
+    instances = []
+    structs = []
+    device_ids = []
+
+    lines = text.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line == "typedef struct":
+            struct, i = __parse_struct(lines, i)
+            if struct:
+                structs.append(struct)
+            continue
+
+        i += 1
+        if "#define " in line:
+            match = DEFINE_RE.search(line)
+            if not match or "(" in match[1]:
+                # ignore macros
+                continue
+            name, details = match.groups()
+            if details.endswith("\\"):
+                continue
+
+            value, comment = __parse_define(details)
+            if value is None:
+                continue
+
+            if "TypeDef *)" in value:
+                for typedef, base in INSTANCE_RE.findall(value):
+                    instances.append((name, typedef, base, comment))
+                    break
+            else:
+                defines.append((name, value, comment))
+
+        elif "the device ID is " in line:
+            device_ids.extend(re.findall(r"the device ID is (0x[0-9a-fA-F]+)", line))
+
+    return dict(defines=defines, instances=instances, structs=structs, device_ids=device_ids)
+
+
+def __load_cache(cache_file: Path):
+    try:
+        cache = json.loads(cache_file.read_text())
+        if cache.get("version") == HEADER_CACHE_VERSION:
+            return cache
+    except (OSError, ValueError):
+        pass
+    return dict(version=HEADER_CACHE_VERSION, headers={})
+
+
+def __save_cache(cache_file: Path, cache):
+    cache_file.write_text(json.dumps(cache))
+
+
+def __cached_index(header: Path, cache):
+    """
+    Return the cached index of a header, or None if it needs re-parsing because
+    both its modification time and content hash have changed since it was cached.
+    """
+    entry = cache["headers"].get(str(header.resolve()))
+    if not entry:
+        return None
+
+    mtime = header.stat().st_mtime_ns
+    if entry["mtime"] == mtime:
+        return entry["index"]
+
+    if entry["hash"] == hashlib.sha1(header.read_bytes()).hexdigest():
+        entry["mtime"] = mtime
+        return entry["index"]
+    return None
+
+
+def __parse_header_file(header: Path):
+    data = header.read_bytes()
+    entry = dict(
+        mtime=header.stat().st_mtime_ns,
+        hash=hashlib.sha1(data).hexdigest(),
+        index=__parse_header(data.decode(errors="replace")),
+    )
+    return str(header.resolve()), entry
+
+
+def __index_headers(headers, cache, pool=None):
+    """
+    Make sure all the headers are indexed in the cache, parsing
+    any that aren't up to date (in parallel when given a pool).
+    """
+    stale = [h for h in headers if __cached_index(h, cache) is None]
+    for key, entry in (pool.map if pool else map)(__parse_header_file, stale):
+        cache["headers"][key] = entry
 
-def __register_file_generator(stm_cpu, requirements):
+
+def __header_index(header: Path, cache):
+    index = __cached_index(header, cache)
+    if index is None:
+        key, entry = __parse_header_file(header)
+        cache["headers"][key] = entry
+        index = entry["index"]
+    return index
+
+
+def __requirement_symbols(path: Path):
+    """
+    Collect the identifiers used in a python file, or all python files in a folder.
+    String constants that look like identifiers are included too, to catch
+    names used with getattr / globals() lookups or listed in __all__.
+    """
+    if path.is_dir():
+        files = sorted(f for f in path.rglob("*.py") if not f.name.startswith("_stm_registers"))
+    else:
+        files = [path]
+
+    symbols = set()
+    for file in files:
+        for node in ast.walk(ast.parse(file.read_text(), str(file))):
+            if isinstance(node, ast.Name):
+                symbols.add(node.id)
+            elif isinstance(node, ast.Attribute):
+                symbols.add(node.attr)
+            elif isinstance(node, ast.alias):
+                symbols.add(node.name)
+            elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+                if node.value.isidentifier():
+                    symbols.add(node.value)
+    return symbols
+
+
+def __symbol_closure(graph, roots):
+    """
+    All symbols transitively referenced from roots in the dependency graph.
+    """
+    closure = set()
+    pending = [r for r in roots if r in graph]
+    while pending:
+        name = pending.pop()
+        if name not in closure:
+            closure.add(name)
+            pending.extend(dep for dep in graph[name] if dep in graph and dep not in closure)
+    return closure
+
+
+def __emit_register_class(name, title, fields, bitfields=()):
+    """
+    Source lines of the Register subclass for a typedef struct, with both the
+    register offsets and the ready-made uctypes descriptor.
+    """
+    lines = ["", f"# {title}", f"class {name}(Register):", "    __regs__ = {"]
+    for field, index, comment in fields:
+        if field.startswith("#"):
+            lines.append(f'        # "{field[2:]}": 0x{index:02X},  # {comment}')
+        else:
+            lines.append(f'        "{field}": 0x{index:02X},  # {comment}')
+    lines.append("    }")
+    lines.append("    __desc__ = {")
+    for field, index, _ in fields:
+        if not field.startswith("#"):
+            lines.append(f'        "{field}": 0x{index:02X} | _UINT32,')
+    for field, index, pos, length in bitfields:
+        lines.append(f'        "{field}": 0x{index:02X} | _BFUINT32 | {pos} << _BF_POS | {length} << _BF_LEN,')
+    lines.append("    }")
+    return lines
+
+
+def __bitfield_value(value):
+    # Evaluate the simple numeric expressions used by the _Pos / _Msk defines
+    if not re.fullmatch(r"[0-9A-Fa-fx<>()| ]+", value):
+        return None
+    try:
+        return eval(value, {"__builtins__": {}})
+    except SyntaxError:
+        return None
+
+
+def __register_bitfields(typedef, fields, bitfield_defines):
+    """
+    The (name, offset, position, length) of each bitfield in the registers of
+    typedef, from the <PERIPH>_<REGISTER>_<FIELD>_Pos / _Msk defines.
+    """
+    prefix = typedef.split("_")[0]
+    bitfields = []
+    for register, index, _ in fields:
+        if register.startswith("#"):
+            continue
+        for field, pos, mask in bitfield_defines.get((prefix, register), ()):
+            pos = __bitfield_value(pos)
+            mask = __bitfield_value(mask)
+            if pos is None or mask is None:
+                continue
+            length = (mask >> pos).bit_length()
+            # uctypes can't describe a full width bitfield, the register itself covers that.
+            if mask != ((1 << length) - 1) << pos or length >= 32:
+                continue
+            bitfields.append((f"{register}_{field}", index, pos, length))
+    return bitfields
+
+
+def __family_headers(stm32lib: Path):
+    """
+    Find every device header in stm32lib, grouped by family as
+    {(cmsis include dir, hal include dir): [device headers]}
+    """
+    families = {}
+    for include_dir in sorted((stm32lib / "CMSIS").glob("*/Include")):
+        family = include_dir.parent.name
+        hal_include = stm32lib / f"{family}_HAL_Driver" / "Inc"
+        devices = sorted(
+            h
+            for h in include_dir.glob("stm32*xx.h")
+            if h.stem.lower() != family.lower()
+        )
+        if devices and hal_include.exists():
+            families[(include_dir, hal_include)] = devices
+    return families
+
+
+def __register_file_generator(stm_cpu, *requirements):
     """
     This function can be run from cpython with the stm hal cpu name
     for the target processor to generate the register definitions required.
     eg. stm32wb55
+    Requirements are python files / folders using the registers, or
+    space separated register names (with optional * wildcards).
     """
 
     project_dir = Path(__file__).parent.resolve()
     stm32lib = project_dir / "stm32lib"
 
-    include_dir = stm32lib / "CMSIS" / "STM32WBxx" / "Include"
-    if not include_dir.exists():
+    if not (stm32lib / "CMSIS").exists():
         raise ValueError("stm32lib submodule needs to be checked out")
 
-    includes = list(include_dir.glob(f"{stm_cpu}*"))
+    includes = list((stm32lib / "CMSIS").glob(f"*/Include/{stm_cpu}*"))
     if len(includes) > 1:
         names = [f.stem for f in includes]
         raise ValueError(f"{stm_cpu} isn't specific enough, choose from: {names}")
     elif not includes:
-        raise ValueError(f"No matching header found, see list in {include_dir}")
+        raise ValueError(f"No matching header found, see list in {stm32lib / 'CMSIS' / '*' / 'Include'}")
     else:
         filename = includes[0]
 
+    family = filename.parent.parent.name
+    hal_include = stm32lib / f"{family}_HAL_Driver" / "Inc"
+
+    # Headers are indexed through the cache, only re-parsing any that have changed.
+    cache_file = project_dir / HEADER_CACHE
+    cache = __load_cache(cache_file)
+    output = project_dir / "signal_gen" / "_stm_registers.py"
+    __generate(filename, hal_include, requirements, output, cache)
+    __save_cache(cache_file, cache)
+
+
+__worker_cache = None
+
+
+def __generate_worker(cache_file, *args):
+    # Each worker process loads the shared header index cache once, on its first job
+    global __worker_cache
+    if __worker_cache is None:
+        __worker_cache = __load_cache(cache_file)
+    try:
+        __generate(*args, cache=__worker_cache)
+    except (Exception, SystemExit) as ex:
+        return str(ex)
+
+
+def __batch_register_file_generator(*requirements, jobs=None):
+    """
+    Generate register definitions for every device header found in stm32lib,
+    across all families, into build/registers/<device>.py
+    """
+    project_dir = Path(__file__).parent.resolve()
+    stm32lib = project_dir / "stm32lib"
+    output_dir = project_dir / "build" / "registers"
+
+    families = __family_headers(stm32lib)
+    if not families:
+        raise ValueError("stm32lib submodule needs to be checked out")
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    cache_file = project_dir / HEADER_CACHE
+    cache = __load_cache(cache_file)
+
+    devices = [(device, hal_include) for (_, hal_include), ds in families.items() for device in ds]
+
+    with ProcessPoolExecutor(jobs or os.cpu_count()) as pool:
+        # Index every header that's not already cached first, so the HAL headers of each
+        # family are only parsed once then shared by all of its devices through the cache.
+        headers = [device for device, _ in devices]
+        for _, hal_include in families:
+            headers.extend(sorted(h for h in hal_include.iterdir() if h.suffix == ".h"))
+        __index_headers(headers, cache, pool)
+        __save_cache(cache_file, cache)
+
+        results = [
+            pool.submit(
+                __generate_worker,
+                cache_file,
+                device,
+                hal_include,
+                requirements,
+                output_dir / f"{device.stem}.py",
+            )
+            for device, hal_include in devices
+        ]
+        failed = [(device, r.result()) for (device, _), r in zip(devices, results) if r.result()]
+
+    print(f"Generated {len(devices) - len(failed)} of {len(devices)} devices into {output_dir}")
+    for device, error in failed:
+        print(f"  {device.stem}: {error}")
+
+
+def __generate(filename: Path, hal_include: Path, requirements, output: Path, cache):
+    """
+    Write the register definitions for device header filename, using the
+    (cached) indexes of it and the HAL headers in hal_include.
+    """
+    project_dir = Path(__file__).parent.resolve()
+    stm32lib = project_dir / "stm32lib"
+
     print(f"Generating register definitions from {filename.relative_to(project_dir)}")
 
     cpu = filename.stem[0:7]
 
-    hal_include = stm32lib / f"{cpu.upper()}xx_HAL_Driver" / "Inc"
-    # header_ll_dma = hal_include / f"{cpu}xx_ll_dma.h"
-    # header_ll_dmamux = hal_include / f"{cpu}xx_ll_dmamux.h"
     header_ll_system = hal_include / f"{cpu}xx_ll_system.h"
     if not header_ll_system.exists():
         raise SystemExit(f"Can't find matching system headers: {header_ll_system}")
 
-    system_header = header_ll_system.read_text()
-    expected_dev_id = re.findall(r"the device ID is (0x[0-9a-fA-F]+)", system_header)[0]
+    headers = [filename] + sorted(h for h in hal_include.iterdir() if h.suffix == ".h")
+    indexes = [__header_index(header, cache) for header in headers]
 
-    content = filename.read_text()
-    for header in hal_include.iterdir():
-        if header.suffix == ".h":
-            content += header.read_text()
-    # content += header_ll_dmamux.read_text()
+    device_ids = __header_index(header_ll_system, cache)["device_ids"]
+    if not device_ids:
+        raise SystemExit(f"Can't find the device id in: {header_ll_system}")
+    expected_dev_id = device_ids[0]
 
     template = Path(__file__).read_text().split("# TEMPLATE MARK")[1]
 
-    output = Path(__file__).parent / "signal_gen" / f"_stm_registers.py"
     out_content = [
         "# AUTOGENERATED from:",
         f"# $ python {Path(__file__).name} {filename.relative_to(stm32lib.parent)}",
@@ -122,132 +538,102 @@ def __register_file_generator(stm_cpu, requirements):
     ]
     out_elements = OrderedDict()
 
-    # Track text that contains register names we need to filter for
-    __desired__ = [partial(fnmatch.fnmatch, pat='DBGMCU*')]
-    if Path(requirements).exists():
-        contents = Path(requirements).read_text()
-        __desired__.append(lambda v: v in contents)
-    else:
-        for field in requirements.split(" "):
-            if "*" in field:
-                __desired__.append(
-                    partial(fnmatch.fnmatch, pat=field)
-                )
-            else:
-                __desired__.append(
-                    partial(lambda v, f: f in v, f=field)
-                )
-
-    # Parse #defines in the header files
+    # Dependency graph of every symbol that could be output, to the symbols it references
+    graph = {}
 
     register_instances = OrderedDict()
-    register_instances_content = ""
+    register_instance_bases = OrderedDict()
+    for index in indexes:
+        for name, typedef, base, comment in index["instances"]:
+            register_instances[name] = f'    "{name}": ({typedef}, {base}),{comment}'
+            register_instance_bases[name] = (typedef, base)
+            graph[name] = (typedef, base)
+
+    # Resolve the #defines from the header indexes
     defines = {}
-    for line in re.findall(r"#define (\S+) +(.+)\n", content):
-        name, details = line
-        if "(" in name:
-            # ignore macros
-            continue
-
-        if details.endswith("\\"):
-            continue
-        comment = ""
-        for comments in re.findall(r"(/\*!?<?(.*?)\*/)", details):
-            comment = "  # " + comments[1].strip()
-            details = details.split("/*")[0]
-            break
-
-        value = details.strip()
-        if not value:
-            continue
-
-        # Remove UL suffix from numbers
-        value = re.sub(r"(0x[a-fA-F0-9]+)[UL]*", r"\1", value)
-        value = re.sub(r"([0-9]+)[uUL]*", r"\1", value)
-        # Parse out any type casting
-        value = re.sub(r"\(uint\d+_t\)(.*)", r"\1", value)
-        if value.startswith("(") and value.endswith(")"):
-            value = value[1:-1]
-
-        # The headers have bitfields broken out into 3 lines. Optimise them when possible...
-        if name.endswith("_Pos"):
-            defines[name] = (value, comment)
-            continue
-
-        elif name.endswith("_Msk"):
-            pos = name.replace("_Msk", "_Pos")
-            if pos in value and pos in defines:
-                pos_value, pos_comment = defines[pos]
-                value = value.replace(pos, pos_value)
-                comment += pos_comment
-            defines[name] = (value, comment)
-            continue
-
-        for ptn in re.findall(r"(\S+_(Msk|Pos))", value):
-            if ptn[0] in defines:
-                ptn_value, ptn_comment = defines[ptn[0]]
-                value = value.replace(ptn[0], ptn_value)
-                comment += ptn_comment
-
-        if "TypeDef *)" in value:
-            for details in re.findall(r"\((\S+TypeDef) *\*\) (\S+)", value):
-                value = f"{details[0]}({details[1]})"
-                break
-            if any((check(name) for check in __desired__)):
-                register_instances[name] = f"{name} = {value}{comment}"
-                register_instances_content += value
-        else:
+    for index in indexes:
+        for name, value, comment in index["defines"]:
+            # The headers have bitfields broken out into 3 lines. Optimise them when possible...
+            if name.endswith("_Pos"):
+                defines[name] = (value, comment)
+                continue
+
+            elif name.endswith("_Msk"):
+                pos = name.replace("_Msk", "_Pos")
+                if pos in value and pos in defines:
+                    pos_value, pos_comment = defines[pos]
+                    value = value.replace(pos, pos_value)
+                    comment += pos_comment
+                defines[name] = (value, comment)
+                continue
+
+            for ptn in re.findall(r"(\S+_(Msk|Pos))", value):
+                if ptn[0] in defines:
+                    ptn_value, ptn_comment = defines[ptn[0]]
+                    value = value.replace(ptn[0], ptn_value)
+                    comment += ptn_comment
+
+            graph[name] = IDENTIFIER_RE.findall(value)
             if "*" in value:
                 value = "# " + value
             out_elements[name] = f"{name} = const({value}){comment}"
 
     # Register TypeDef's
-    # out_content.append("")
-
-    registers = []
-
-    registers_h = re.findall(
-        r"((@brief (.+)\n *\*/\n)?typedef struct\n\{\n(.*uint32_t *\S+ *; */\*!<.*\*/\n\n?)+\} ?(\S+TypeDef);)",
-        content,
-    )
-
-    for reg in registers_h:
-        name = reg[4]
-        fields = []
-        i_off = 0
-        for i, row in enumerate(re.findall("\n.*uint32_t *(\S+) *;( */\*!<(.*)\*/)?", reg[0])):
-            field = row[0]
-            if "[" in field:
-                # Don't support arrays, just fix index
-                i_off += int(field.split("[")[-1].split("]")[0]) - 1
-                field = "# " + field
-            if field.startswith("RESERVED"):
-                field = "# " + field
-            index = (i + i_off) * 4
-            comment = row[1].strip().replace("  ", " ")
-            fields.append((field, index, comment))
-
-        title = reg[2] or name
+    register_structs = OrderedDict()
+    register_fields = {}
+    for index in indexes:
+        for name, title, fields in index["structs"]:
+            register_structs[name] = title or name
+            register_fields[name] = fields
+            graph[name] = ()
+
+    # Fixed addresses of the registers on each instance, for the reg_* fast path functions.
+    # Only output when named in the requirements, they'd all stay in RAM as globals otherwise.
+    register_addresses = OrderedDict()
+    for name, (typedef, base) in register_instance_bases.items():
+        for field, index, _ in register_fields.get(typedef, ()):
+            if not field.startswith("#"):
+                addr = f"{name}_{field}_ADDR"
+                register_addresses[addr] = f"{addr} = const({base} + 0x{index:02X})"
+                graph[addr] = (base,)
+
+    # Group the bitfield _Pos / _Msk pairs by (peripheral, register)
+    bitfield_defines = {}
+    for name, (value, _) in defines.items():
+        if name.endswith("_Pos") and name[:-4] + "_Msk" in defines:
+            tokens = name[:-4].split("_", 2)
+            if len(tokens) == 3:
+                mask = defines[name[:-4] + "_Msk"][0]
+                bitfield_defines.setdefault(tuple(tokens[:2]), []).append((tokens[2], value, mask))
+
+    # Bitfields are looked up by attribute name, eg. TIM1.CR1_UDIS. Each one costs a
+    # descriptor entry in RAM, so like the register addresses they're only output
+    # when named in the requirements.
+    register_bitfields = {}
+    for name in register_structs:
+        register_bitfields[name] = __register_bitfields(name, register_fields[name], bitfield_defines)
+        for bitfield in register_bitfields[name]:
+            graph.setdefault(bitfield[0], ())
+
+    # Find the symbols requested, DBGMCU is always needed for the device id check.
+    roots = {"DBGMCU"}
+    for requirement in requirements:
+        if Path(requirement).exists():
+            roots |= __requirement_symbols(Path(requirement))
+        else:
+            for field in requirement.split(" "):
+                if "*" in field:
+                    roots.update(fnmatch.filter(graph, field))
+                elif field:
+                    roots.add(field)
 
-        if name in register_instances_content or any((check(name) for check in __desired__)):
-            registers.extend(
-                [
-                    "",
-                    f"# {title}",
-                    f"class {name}(Register):",
-                ]
-                + [f"    {fn}: int = 0x{i:02X}  # {c}" for fn, i, c in fields]
-            )
+    keep = __symbol_closure(graph, roots)
 
-    keep = set()
-    keep_content = ""
-    last_keep_len = None
-    while last_keep_len != len(keep):
-        last_keep_len = len(keep)
-        for name, val in out_elements.items():
-            if name in register_instances_content or name in keep_content or any((check(name) for check in __desired__)):
-                keep.add(name)
-                keep_content += val
+    registers = []
+    for name, title in register_structs.items():
+        if name in keep:
+            bitfields = [b for b in register_bitfields[name] if b[0] in keep]
+            registers.extend(__emit_register_class(name, title, register_fields[name], bitfields))
 
     out_content.append("")
 
@@ -258,24 +644,49 @@ def __register_file_generator(stm_cpu, requirements):
     out_content.append("")
     out_content.extend(registers)
 
+    # Peripherals are created on first access by the module __getattr__, so the unused
+    # ones cost nothing. Star imports don't see them, import them by name.
     out_content.append("")
-    out_content.extend(register_instances.values())
+    out_content.append("_PERIPHERALS = {")
+    out_content.extend(v for k, v in register_instances.items() if k in keep)
+    out_content.extend([
+        "}",
+        "",
+        "",
+        "def __getattr__(name):",
+        "    if name not in _PERIPHERALS:",
+        "        raise AttributeError(name)",
+        "    typedef, base = _PERIPHERALS[name]",
+        "    peripheral = globals()[name] = typedef(base)",
+        "    return peripheral",
+        "",
+    ])
+
+    out_content.append("")
+    out_content.extend(v for k, v in register_addresses.items() if k in keep)
 
     out_content.append("")
     out_content.extend([
         f"",
-        f"__dev_id = DBGMCU.IDCODE & 0xFFF",
+        f"__dev_id = __getattr__(\"DBGMCU\").IDCODE & 0xFFF",
         f"if __dev_id != {expected_dev_id}:",
         f'    raise RuntimeError(f"{output.name} was generated for {cpu} ({expected_dev_id}), running on {{__dev_id}}")',
         f"",
     ])
 
     Path(output).write_text("\n".join(out_content))
-    print(f"Written: {output}")
+    print(
+        f"Written: {output} ({len(keep & register_structs.keys())} register types, "
+        f"{len(keep & register_instances.keys())} peripherals, {len(keep & out_elements.keys())} constants)"
+    )
 
 
 if __name__ == "__main__":
     import sys
 
-    __register_file_generator(sys.argv[1], sys.argv[2])
+    if sys.argv[1] == "--all":
+        # $ python stm_register_builder.py --all signal_gen
+        __batch_register_file_generator(*sys.argv[2:])
+    else:
+        __register_file_generator(sys.argv[1], *sys.argv[2:])
     sys.exit()
@@ -0,0 +1,72 @@
+"""
+Host simulation backend for the signal generator, emulating the STM32WB55 timers,
+DMA, DMAMUX and RCC registers, so the driver runs unmodified under cpython or the
+micropython unix port:
+
+    import stm_sim
+    sim = stm_sim.install()
+    from signal_gen import SignalGenerator
+    SignalGenerator().start()  # configures TIM1 / TIM16 / DMA1 on the simulated device
+    sim.run_us(100)
+    sim.write_timeline(open("ccr.csv", "w"))
+
+install() puts work-alikes of uctypes, micropython, pyb and machine in sys.modules,
+so it needs calling before anything imports them. Under cpython it also adds
+asyncio.ThreadSafeFlag and time.ticks_us() etc, the latter counting simulated time.
+On the unix port the compiler still emits native code for @micropython.viper
+functions, so the reg_* fast path helpers would access real process memory and
+can't be used there.
+"""
+import sys
+
+from stm_sim.core import Simulator
+
+_sim = None
+
+
+def get():
+    if _sim is None:
+        raise RuntimeError("stm_sim.install() hasn't been called")
+    return _sim
+
+
+def install(**config):
+    # Returns a fresh Simulator, replacing any previous one
+    global _sim
+    _sim = Simulator(**config)
+
+    from stm_sim import machine, micropython, pyb, uctypes
+
+    sys.modules["uctypes"] = uctypes
+    sys.modules["micropython"] = micropython
+    sys.modules["pyb"] = pyb
+    sys.modules["machine"] = machine
+
+    if sys.implementation.name != "micropython":
+        import builtins
+        from stm_sim import viper
+
+        builtins.uint = viper.uint
+        builtins.ptr8 = viper.ptr8
+        builtins.ptr16 = viper.ptr16
+        builtins.ptr32 = viper.ptr32
+
+        import asyncio
+        from stm_sim.threadsafeflag import ThreadSafeFlag
+
+        asyncio.ThreadSafeFlag = ThreadSafeFlag
+
+        import time
+        from stm_sim import ticks
+
+        for name in ("ticks_us", "ticks_ms", "ticks_add", "ticks_diff"):
+            setattr(time, name, getattr(ticks, name))
+
+    try:
+        import typing
+    except ImportError:
+        from stm_sim import typing
+
+        sys.modules["typing"] = typing
+
+    return _sim
@@ -0,0 +1,19 @@
+# Run the default signal generator on the simulator and write out the PWM compare timeline:
+# $ python -m stm_sim [microseconds] [timeline.csv]
+import sys
+
+import stm_sim
+
+sim = stm_sim.install()
+
+from signal_gen import SignalGenerator
+
+SignalGenerator().start()
+us = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+sim.run_us(us)
+
+if len(sys.argv) > 2:
+    with open(sys.argv[2], "w") as f:
+        sim.write_timeline(f)
+else:
+    sim.write_timeline(sys.stdout)
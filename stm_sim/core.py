@@ -0,0 +1,116 @@
+from stm_sim import peripherals
+from stm_sim.memory import Memory
+
+
+class Simulator:
+    """
+    Event driven model of the STM32 timers, DMA, DMAMUX and RCC.
+
+    Time is counted in kernel clock cycles. run() jumps straight from one timer
+    event (update, compare match) to the next, so it's exact to the cycle while
+    only costing python time per event. DMA transfers requested by an event
+    complete in the same cycle.
+
+    Time otherwise stands still while python code runs. With access_cycles set each
+    CPU access to a peripheral register moves it on that much, so code busy-waiting
+    on a register (eg. DMA CNDTR) sees the hardware progress.
+    """
+
+    def __init__(self, sysclk=64_000_000, dev_id=0x495, access_cycles=0):
+        self.sysclk = sysclk
+        self.now = 0
+        self.access_cycles = access_cycles
+        self._running = False
+        self._horizon = -1  # cycle of the next timer event, None for none, -1 unknown
+        self.memory = Memory(self)
+        # (cycle, timer name, channel, compare value) each time a PWM output's active
+        # compare value changes.
+        self.timeline = []
+        self._scheduled = []
+
+        self.rcc = peripherals.RCC(self)
+        self.dbgmcu = peripherals.DBGMCU(self, dev_id)
+        self.dma = {n: peripherals.DMA(self, n) for n in (1, 2)}
+        self.dmamux = peripherals.DMAMUX(self)
+        self.timers = {n: peripherals.TIM(self, n) for n in peripherals.TIMERS}
+        for device in (self.rcc, self.dbgmcu, self.dmamux):
+            self.memory.map_device(device)
+        for device in self.dma.values():
+            self.memory.map_device(device)
+        for device in self.timers.values():
+            self.memory.map_device(device)
+
+    def pclk(self, bus):
+        # APB bus clock, from the RCC CFGR prescalers
+        return self.sysclk // self.rcc.apb_divider(bus)
+
+    def timer_clock(self, bus):
+        # Timers run at twice the APB clock when it's divided down
+        divider = self.rcc.apb_divider(bus)
+        return self.sysclk if divider == 1 else 2 * self.sysclk // divider
+
+    def request(self, request_id):
+        # A peripheral DMA request, routed by the DMAMUX to any DMA channels selecting it.
+        self.dmamux.route(request_id)
+
+    def schedule(self, func, arg):
+        self._scheduled.append((func, arg))
+
+    def run_scheduled(self):
+        while self._scheduled:
+            func, arg = self._scheduled.pop(0)
+            func(arg)
+
+    def run(self, cycles):
+        self.run_scheduled()
+        self._advance(self.now + cycles, True)
+
+    def cpu_access(self):
+        # Called for every CPU peripheral register access. Scheduled callbacks are
+        # left for the next run(), as they wouldn't interrupt the accessing code.
+        if not self.access_cycles or self._running:
+            return
+        end = self.now + self.access_cycles
+        if self._horizon == -1 or (self._horizon is not None and self._horizon <= end):
+            self._advance(end, False)
+        else:
+            self.now = end
+
+    def changed(self):
+        # A CPU register write may have moved the next timer event
+        self._horizon = -1
+
+    def _advance(self, end, scheduled):
+        self._running = True
+        try:
+            timers = list(self.timers.values())
+            while True:
+                next_cycle = None
+                next_timer = None
+                for timer in timers:
+                    cycle = timer.next_event()
+                    if cycle is not None and (next_cycle is None or cycle < next_cycle):
+                        next_cycle = cycle
+                        next_timer = timer
+                if next_timer is None or next_cycle > end:
+                    self._horizon = next_cycle
+                    break
+                self.now = next_cycle
+                next_timer.event(next_cycle)
+                if scheduled:
+                    self.run_scheduled()
+            self.now = end
+        finally:
+            self._running = False
+
+    def run_us(self, us):
+        self.run(us * self.sysclk // 1_000_000)
+
+    def outputs(self, timer, channel):
+        # The compare value timeline of one PWM output, as (cycle, value)
+        return [(t, v) for t, name, ch, v in self.timeline if name == timer and ch == channel]
+
+    def write_timeline(self, f):
+        f.write("cycle,timer,channel,compare\n")
+        for row in self.timeline:
+            f.write("%d,%s,%d,%d\n" % row)
@@ -0,0 +1,31 @@
+# machine module work-alike for the simulator.
+import stm_sim
+from stm_sim.pyb import Pin, freq
+
+
+class _Mem:
+    def __init__(self, size):
+        self.size = size
+
+    def __getitem__(self, addr):
+        return stm_sim.get().memory.read(addr, self.size)
+
+    def __setitem__(self, addr, value):
+        stm_sim.get().memory.write(addr, value, self.size)
+
+
+mem8 = _Mem(1)
+mem16 = _Mem(2)
+mem32 = _Mem(4)
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state=0):
+    pass
+
+
+def idle():
+    pass
@@ -0,0 +1,122 @@
+SRAM_BASE = 0x20000000
+
+
+class BusError(Exception):
+    pass
+
+
+def _itemsize(buf):
+    n = len(buf)
+    if not n:
+        return 1
+    return len(bytes(buf)) // n
+
+
+class Memory:
+    """
+    Sparse 32bit address space made up of peripheral devices, python buffers
+    mapped into (fake) SRAM by uctypes.addressof(), and plain words for anything else.
+    """
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.devices = []  # (base, end, device)
+        self.regions = []  # (base, end, buffer, itemsize)
+        self.words = {}
+        self._buffers = {}  # id(buffer): base address
+        self._next_ram = SRAM_BASE
+
+    def map_device(self, device):
+        self.devices.append((device.base, device.base + device.size, device))
+
+    def addressof(self, buf):
+        parent = getattr(buf, "obj", None)
+        if parent is not None and not buf.readonly:
+            # A cpython memoryview (slice) addresses into the buffer it views, as on
+            # the device, so zero-copy DMA from part of a buffer behaves the same.
+            import ctypes
+
+            offset = ctypes.addressof(ctypes.c_char.from_buffer(buf))
+            offset -= ctypes.addressof(ctypes.c_char.from_buffer(parent))
+            return self.addressof(parent) + offset
+
+        base = self._buffers.get(id(buf))
+        if base is None:
+            itemsize = _itemsize(buf)
+            size = len(buf) * itemsize
+            base = self._next_ram
+            # Keep each buffer word aligned with a gap so overruns don't hit the next one
+            self._next_ram += (size + 7) & ~3
+            # The region holds a reference so the id can't be reused
+            self.regions.append((base, base + size, buf, itemsize))
+            self._buffers[id(buf)] = base
+        return base
+
+    def _device(self, addr):
+        for base, end, device in self.devices:
+            if base <= addr < end:
+                return device
+        return None
+
+    def _region(self, addr, size):
+        for base, end, buf, itemsize in self.regions:
+            if base <= addr and addr + size <= end:
+                return base, buf, itemsize
+        return None
+
+    def read(self, addr, size=4, bus=False):
+        device = self._device(addr)
+        if device is not None:
+            if not bus:
+                self.sim.cpu_access()
+            if not device.clocked():
+                return 0
+            offset = addr - device.base
+            word = device.read(offset & ~3)
+            return (word >> ((offset & 3) * 8)) & ((1 << (size * 8)) - 1)
+
+        region = self._region(addr, size)
+        if region is not None:
+            base, buf, itemsize = region
+            offset = addr - base
+            if itemsize == size and not offset % size:
+                return buf[offset // size] & ((1 << (size * 8)) - 1)
+            value = 0
+            for i in range(size):
+                o = offset + i
+                value |= ((buf[o // itemsize] >> ((o % itemsize) * 8)) & 0xFF) << (i * 8)
+            return value
+
+        if bus:
+            raise BusError(f"read of unmapped address 0x{addr:08x}")
+        return self.words.get(addr, 0)
+
+    def write(self, addr, value, size=4, bus=False):
+        value &= (1 << (size * 8)) - 1
+        device = self._device(addr)
+        if device is not None:
+            if not bus:
+                self.sim.cpu_access()
+            if device.clocked():
+                # Narrow writes to peripherals are zero extended to the whole register
+                device.write((addr - device.base) & ~3, value)
+                self.sim.changed()
+            return
+
+        region = self._region(addr, size)
+        if region is not None:
+            base, buf, itemsize = region
+            offset = addr - base
+            if itemsize == size and not offset % size:
+                buf[offset // size] = value
+                return
+            for i in range(size):
+                o = offset + i
+                shift = (o % itemsize) * 8
+                item = buf[o // itemsize] & ~(0xFF << shift)
+                buf[o // itemsize] = item | (((value >> (i * 8)) & 0xFF) << shift)
+            return
+
+        if bus:
+            raise BusError(f"write of unmapped address 0x{addr:08x}")
+        self.words[addr] = value
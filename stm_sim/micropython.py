@@ -0,0 +1,22 @@
+# micropython module work-alike. Code generators are no-ops, schedule() queues the
+# callback to be run by the simulator after the current (interrupt) event.
+import stm_sim
+
+
+def const(value):
+    return value
+
+
+def native(func):
+    return func
+
+
+viper = native
+
+
+def schedule(func, arg):
+    stm_sim.get().schedule(func, arg)
+
+
+def alloc_emergency_exception_buf(size):
+    pass
@@ -0,0 +1,469 @@
+# Register level models of the STM32WB55 peripherals used by the signal generator.
+# Addresses, offsets and bits are from RM0434 rather than the generated registers module,
+# so the model is an independent check on it.
+from stm_sim.memory import BusError
+
+RCC_BASE = 0x58000000
+DBGMCU_BASE = 0xE0042000
+DMA_BASES = {1: 0x40020000, 2: 0x40020400}
+DMAMUX1_BASE = 0x40020800
+
+# Timer number: (base, APB bus, RCC enable register offset, enable bit, DMAMUX request ids)
+TIMERS = {
+    1: (0x40012C00, 2, 0x60, 11, dict(CH1=21, CH2=22, CH3=23, CH4=24, UP=25, TRIG=26, COM=27)),
+    2: (0x40000000, 1, 0x58, 0, dict(CH1=28, CH2=29, CH3=30, CH4=31, UP=32)),
+    16: (0x40014400, 2, 0x60, 17, dict(CH1=33, UP=34)),
+    17: (0x40014800, 2, 0x60, 18, dict(CH1=35, UP=36)),
+}
+
+# Slave timer number: {internal trigger (ITRx): master timer number}
+TIMER_TRIGGERS = {
+    1: {1: 2},
+    2: {0: 1},
+}
+
+# RCC
+RCC_CFGR = 0x08
+RCC_AHB1ENR = 0x48
+RCC_APB1ENR1 = 0x58
+RCC_APB2ENR = 0x60
+RCC_CFGR_PPRE1_Pos = 8
+RCC_CFGR_PPRE2_Pos = 11
+
+# TIM
+TIM_CR1 = 0x00
+TIM_CR2 = 0x04
+TIM_SMCR = 0x08
+TIM_DIER = 0x0C
+TIM_SR = 0x10
+TIM_EGR = 0x14
+TIM_CCMR1 = 0x18
+TIM_CCMR2 = 0x1C
+TIM_CCER = 0x20
+TIM_CNT = 0x24
+TIM_PSC = 0x28
+TIM_ARR = 0x2C
+TIM_RCR = 0x30
+TIM_CCR1 = 0x34
+TIM_BDTR = 0x44
+TIM_DCR = 0x48
+TIM_DMAR = 0x4C
+
+TIM_CR1_CEN = 1 << 0
+TIM_CR1_UDIS = 1 << 1
+TIM_CR1_ARPE = 1 << 7
+TIM_CR2_MMS_Pos = 4
+TIM_SMCR_TS_Pos = 4
+TIM_MMS_ENABLE = 0b001
+TIM_SMS_TRIGGER = 0b110
+TIM_DIER_UIE = 1 << 0
+TIM_DIER_UDE = 1 << 8
+TIM_SR_UIF = 1 << 0
+TIM_EGR_UG = 1 << 0
+TIM_BDTR_MOE = 1 << 15
+
+# DMA
+DMA_ISR = 0x00
+DMA_IFCR = 0x04
+DMA_CCR = 0x00
+DMA_CNDTR = 0x04
+DMA_CPAR = 0x08
+DMA_CMAR = 0x0C
+
+DMA_CCR_EN = 1 << 0
+DMA_CCR_DIR = 1 << 4
+DMA_CCR_CIRC = 1 << 5
+DMA_CCR_PINC = 1 << 6
+DMA_CCR_MINC = 1 << 7
+DMA_CCR_MEM2MEM = 1 << 14
+DMA_ISR_GIF = 1 << 0
+DMA_ISR_TCIF = 1 << 1
+DMA_ISR_HTIF = 1 << 2
+DMA_ISR_TEIF = 1 << 3
+
+DMA_CHANNELS = 7
+
+# DMAMUX
+DMAMUX_CHANNELS = 14
+DMAMUX_CxCR_DMAREQ_ID = 0x3F
+DMAMUX_CSR = 0x80
+DMAMUX_CFR = 0x84
+DMAMUX_RGSR = 0x140
+DMAMUX_RGCFR = 0x144
+
+
+class Device:
+    base = 0
+    size = 0x400
+    # (RCC register offset, bit) of the peripheral clock enable, None if always on
+    clock = None
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.regs = {}
+
+    def clocked(self):
+        if self.clock is None:
+            return True
+        offset, bit = self.clock
+        return bool(self.sim.rcc.regs.get(offset, 0) & (1 << bit))
+
+    def read(self, offset):
+        return self.regs.get(offset, 0)
+
+    def write(self, offset, value):
+        self.regs[offset] = value
+
+
+class RCC(Device):
+    base = RCC_BASE
+
+    def apb_divider(self, bus):
+        pos = RCC_CFGR_PPRE1_Pos if bus == 1 else RCC_CFGR_PPRE2_Pos
+        ppre = (self.regs.get(RCC_CFGR, 0) >> pos) & 0x7
+        # 0xx: not divided, 100: /2, 101: /4, 110: /8, 111: /16
+        return 1 if ppre < 4 else 2 << (ppre - 4)
+
+
+class DBGMCU(Device):
+    base = DBGMCU_BASE
+
+    def __init__(self, sim, dev_id):
+        super().__init__(sim)
+        # REV_ID 0x2001 on the DEV_ID
+        self.regs[0x00] = 0x20010000 | dev_id
+
+    def write(self, offset, value):
+        if offset:
+            self.regs[offset] = value
+
+
+class TIM(Device):
+    """
+    Up counting timer with prescaler, auto-reload and repetition counter, the
+    shadow (preload) registers loaded on update events (unless UDIS holds them
+    off), update / compare DMA
+    requests and DMA burst access through DCR/DMAR. A master with its counter enable as
+    TRGO starts the counters of slaves in trigger mode in the same cycle.
+    """
+
+    def __init__(self, sim, number):
+        super().__init__(sim)
+        self.number = number
+        self.name = f"TIM{number}"
+        self.base, self.bus, enr, bit, self.requests = TIMERS[number]
+        self.clock = (enr, bit)
+        self.has_rcr = "COM" in self.requests or number in (16, 17)
+        self.irq = None  # called on update events with UIE set, ie. the pyb.Timer callback
+
+        self.running = False
+        self.c0 = 0  # counter value at cycle `start`
+        self.start = 0
+        self.psc = 0  # shadow registers
+        self.arr = 0xFFFF
+        self.rcr = 0
+        self.ccr = [0, 0, 0, 0]
+        self.burst = 0
+
+    # Counter
+
+    def _tick(self):
+        # Simulator (sysclk) cycles per counter tick
+        return (self.psc + 1) * (self.sim.sysclk // self.sim.timer_clock(self.bus))
+
+    def counter(self):
+        if not self.running:
+            return self.c0
+        return self.c0 + (self.sim.now - self.start) // self._tick()
+
+    def _restart(self, cycle, value=0):
+        self.c0 = value
+        self.start = cycle
+
+    def _overflow_cycle(self):
+        return self.start + (self.arr + 1 - self.c0) * self._tick()
+
+    def _compare_cycle(self, ch, dier):
+        # Cycle of the next match of an enabled compare channel before the overflow, or None
+        if dier & ((1 << (ch + 1)) | (1 << (ch + 9))):
+            value = self.ccr[ch]
+            if self.c0 < value <= self.arr:
+                return self.start + (value - self.c0) * self._tick()
+        return None
+
+    def next_event(self):
+        if not self.running or not self.clocked():
+            return None
+        # Counter overflow
+        cycle = self._overflow_cycle()
+        dier = self.regs.get(TIM_DIER, 0)
+        now = self.sim.now
+        for ch in range(4):
+            at = self._compare_cycle(ch, dier)
+            if at is not None and now < at < cycle:
+                cycle = at
+        return cycle
+
+    def event(self, cycle):
+        if cycle == self._overflow_cycle():
+            self._overflow(cycle)
+            return
+        dier = self.regs.get(TIM_DIER, 0)
+        for ch in range(4):
+            if self._compare_cycle(ch, dier) == cycle:
+                self._compare(ch)
+
+    def _overflow(self, cycle):
+        self._restart(cycle)
+        if self.has_rcr and self.rcr:
+            self.rcr -= 1
+        elif not self.regs.get(TIM_CR1, 0) & TIM_CR1_UDIS:
+            self._update()
+        # A compare value of 0 matches as the counter wraps
+        for ch in range(4):
+            if not self.ccr[ch]:
+                self._compare(ch)
+
+    def _update(self):
+        regs = self.regs
+        self.psc = regs.get(TIM_PSC, 0)
+        self.arr = regs.get(TIM_ARR, 0xFFFF)
+        if self.has_rcr:
+            self.rcr = regs.get(TIM_RCR, 0)
+        for ch in range(4):
+            if self._preload(ch):
+                self._set_ccr(ch, regs.get(TIM_CCR1 + 4 * ch, 0))
+        regs[TIM_SR] = regs.get(TIM_SR, 0) | TIM_SR_UIF
+
+        dier = regs.get(TIM_DIER, 0)
+        if dier & TIM_DIER_UDE:
+            self._request("UP")
+        if dier & TIM_DIER_UIE and self.irq:
+            self.irq()
+
+    def _compare(self, ch):
+        regs = self.regs
+        regs[TIM_SR] = regs.get(TIM_SR, 0) | (1 << (ch + 1))
+        if regs.get(TIM_DIER, 0) & (1 << (ch + 9)):
+            self._request(f"CH{ch + 1}")
+
+    def _request(self, name):
+        request = self.requests.get(name)
+        if request is None:
+            return
+        # With a DMA burst configured, each request is repeated for every register of the burst
+        self.burst = 0
+        for _ in range(((self.regs.get(TIM_DCR, 0) >> 8) & 0x1F) + 1):
+            self.sim.request(request)
+
+    # Output compare channels
+
+    def _ccmr(self, ch):
+        return (self.regs.get(TIM_CCMR1 + 4 * (ch >> 1), 0) >> (8 * (ch & 1))) & 0xFF
+
+    def _preload(self, ch):
+        return bool(self._ccmr(ch) & (1 << 3))
+
+    def _pwm_output(self, ch):
+        # PWM mode 1 or 2 with the output enabled
+        mode = (self._ccmr(ch) >> 4) & 0x7
+        return mode in (6, 7) and self.regs.get(TIM_CCER, 0) & (1 << (4 * ch))
+
+    def _set_ccr(self, ch, value):
+        if self.ccr[ch] != value:
+            self.ccr[ch] = value
+            if self._pwm_output(ch):
+                self.sim.timeline.append((self.sim.now, self.name, ch + 1, value))
+
+    # Register access
+
+    def read(self, offset):
+        if offset == TIM_CNT:
+            return self.counter()
+        if offset == TIM_DMAR:
+            return self.read(self._burst_offset())
+        return self.regs.get(offset, 0)
+
+    def write(self, offset, value):
+        regs = self.regs
+        if offset == TIM_CR1:
+            cen = value & TIM_CR1_CEN
+            if cen and not self.running:
+                self._restart(self.sim.now, self.c0)
+            elif not cen and self.running:
+                self._restart(self.sim.now, self.counter())
+            started = cen and not self.running
+            self.running = bool(cen)
+            regs[offset] = value
+            if started and (regs.get(TIM_CR2, 0) >> TIM_CR2_MMS_Pos) & 0x7 == TIM_MMS_ENABLE:
+                self._trigger_slaves()
+        elif offset == TIM_SR:
+            # rc_w0
+            regs[offset] = regs.get(offset, 0) & value
+        elif offset == TIM_EGR:
+            if value & TIM_EGR_UG:
+                # Re-initialises the counter and loads the shadow registers
+                self._restart(self.sim.now)
+                self._update()
+        elif offset == TIM_CNT:
+            self._restart(self.sim.now, value)
+        elif offset == TIM_DMAR:
+            self.write(self._burst_offset(), value)
+            self.burst += 1
+        else:
+            previous = regs.get(offset, 0)
+            regs[offset] = value
+            if offset == TIM_ARR and not regs.get(TIM_CR1, 0) & TIM_CR1_ARPE:
+                self.arr = value
+            elif TIM_CCR1 <= offset < TIM_CCR1 + 16:
+                ch = (offset - TIM_CCR1) >> 2
+                if not self._preload(ch):
+                    self._set_ccr(ch, value)
+            elif offset == TIM_CCER:
+                # Log the starting value of newly enabled outputs
+                for ch in range(4):
+                    enable = 1 << (4 * ch)
+                    if value & enable and not previous & enable and self._pwm_output(ch):
+                        self.sim.timeline.append((self.sim.now, self.name, ch + 1, self.ccr[ch]))
+
+    def _trigger_slaves(self):
+        for number, triggers in TIMER_TRIGGERS.items():
+            slave = self.sim.timers[number]
+            smcr = slave.regs.get(TIM_SMCR, 0)
+            itr = (smcr >> TIM_SMCR_TS_Pos) & 0x7
+            if smcr & 0x7 == TIM_SMS_TRIGGER and triggers.get(itr) == self.number:
+                # The trigger sets the slave's CEN
+                slave.write(TIM_CR1, slave.regs.get(TIM_CR1, 0) | TIM_CR1_CEN)
+
+    def _burst_offset(self):
+        dba = self.regs.get(TIM_DCR, 0) & 0x1F
+        return (dba + self.burst) * 4
+
+
+class DMA(Device):
+    """
+    DMA controller with 7 channels, each stepped one data item per routed request.
+    """
+
+    def __init__(self, sim, number):
+        super().__init__(sim)
+        self.number = number
+        self.base = DMA_BASES[number]
+        self.clock = (RCC_AHB1ENR, number - 1)
+        # Per channel: [remaining, index, reload]
+        self.state = {ch: [0, 0, 0] for ch in range(1, DMA_CHANNELS + 1)}
+
+    def _channel(self, offset):
+        # channel number and register offset within it, or None for ISR/IFCR
+        if offset < 0x08 or offset >= 0x08 + 20 * DMA_CHANNELS:
+            return None, offset
+        return (offset - 0x08) // 20 + 1, (offset - 0x08) % 20
+
+    def read(self, offset):
+        ch, reg = self._channel(offset)
+        if ch and reg == DMA_CNDTR and self.regs.get(offset - reg, 0) & DMA_CCR_EN:
+            return self.state[ch][0]
+        return self.regs.get(offset, 0)
+
+    def write(self, offset, value):
+        regs = self.regs
+        if offset == DMA_ISR:
+            return
+        if offset == DMA_IFCR:
+            clear = 0
+            for ch in range(DMA_CHANNELS):
+                bits = (value >> (4 * ch)) & 0xF
+                if bits & DMA_ISR_GIF:
+                    # Clearing the global flag clears all the flags of the channel
+                    bits = 0xF
+                clear |= bits << (4 * ch)
+            regs[DMA_ISR] = regs.get(DMA_ISR, 0) & ~clear
+            return
+
+        ch, reg = self._channel(offset)
+        if ch is None:
+            regs[offset] = value
+            return
+        ccr = offset - reg
+        enabled = regs.get(ccr, 0) & DMA_CCR_EN
+        if reg == DMA_CCR:
+            if value & DMA_CCR_EN and not enabled:
+                length = regs.get(ccr + DMA_CNDTR, 0)
+                self.state[ch] = [length, 0, length]
+            regs[offset] = value
+            if value & DMA_CCR_EN and value & DMA_CCR_MEM2MEM:
+                while self.state[ch][0] and regs.get(ccr, 0) & DMA_CCR_EN:
+                    self.transfer(ch)
+        elif enabled and reg in (DMA_CNDTR, DMA_CPAR, DMA_CMAR):
+            # Read only while the channel is enabled
+            pass
+        else:
+            regs[offset] = value
+
+    def transfer(self, ch):
+        regs = self.regs
+        ccr_offset = 0x08 + 20 * (ch - 1)
+        ccr = regs.get(ccr_offset, 0)
+        state = self.state[ch]
+        remaining, index, reload = state
+        if not ccr & DMA_CCR_EN or not remaining:
+            return
+
+        psize = 1 << ((ccr >> 8) & 3)
+        msize = 1 << ((ccr >> 10) & 3)
+        paddr = regs.get(ccr_offset + DMA_CPAR, 0) + (index * psize if ccr & DMA_CCR_PINC else 0)
+        maddr = regs.get(ccr_offset + DMA_CMAR, 0) + (index * msize if ccr & DMA_CCR_MINC else 0)
+        if ccr & (DMA_CCR_DIR | DMA_CCR_MEM2MEM) == DMA_CCR_DIR:
+            src, ssize, dst, dsize = maddr, msize, paddr, psize
+        else:
+            src, ssize, dst, dsize = paddr, psize, maddr, msize
+
+        memory = self.sim.memory
+        flags = 0
+        try:
+            # Narrower sources are zero extended, wider ones truncated to the destination
+            memory.write(dst, memory.read(src, ssize, bus=True), dsize, bus=True)
+        except BusError:
+            # Transfer error, the channel is disabled by hardware
+            regs[ccr_offset] = ccr & ~DMA_CCR_EN
+            flags = DMA_ISR_TEIF
+        else:
+            remaining -= 1
+            index += 1
+            if remaining == reload >> 1:
+                flags |= DMA_ISR_HTIF
+            if not remaining:
+                flags |= DMA_ISR_TCIF
+                if ccr & DMA_CCR_CIRC:
+                    remaining = reload
+                    index = 0
+            state[0] = remaining
+            state[1] = index
+
+        if flags:
+            regs[DMA_ISR] = regs.get(DMA_ISR, 0) | ((flags | DMA_ISR_GIF) << (4 * (ch - 1)))
+
+
+class DMAMUX(Device):
+    base = DMAMUX1_BASE
+    clock = (RCC_AHB1ENR, 2)
+
+    def write(self, offset, value):
+        regs = self.regs
+        if offset == DMAMUX_CFR:
+            regs[DMAMUX_CSR] = regs.get(DMAMUX_CSR, 0) & ~value
+        elif offset == DMAMUX_RGCFR:
+            regs[DMAMUX_RGSR] = regs.get(DMAMUX_RGSR, 0) & ~value
+        elif offset not in (DMAMUX_CSR, DMAMUX_RGSR):
+            regs[offset] = value
+
+    def route(self, request_id):
+        if not self.clocked():
+            return
+        dma = self.sim.dma
+        for channel in range(DMAMUX_CHANNELS):
+            if self.regs.get(4 * channel, 0) & DMAMUX_CxCR_DMAREQ_ID == request_id:
+                # DMAMUX channels 0-6 feed DMA1 channels 1-7, 7-13 feed DMA2
+                controller = dma[1 + channel // DMA_CHANNELS]
+                if controller.clocked():
+                    controller.transfer(channel % DMA_CHANNELS + 1)
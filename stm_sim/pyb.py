@@ -0,0 +1,220 @@
+# pyb.Timer and Pin work-alikes, the timers configured through their registers the
+# same way as micropython's stm32 port (ports/stm32/timer.c).
+import stm_sim
+from stm_sim import peripherals as p
+
+# OCxM output compare modes
+_OC_MODES = {2: 0b000, 3: 0b001, 4: 0b010, 5: 0b011, 6: 0b101, 7: 0b100}
+
+
+class Pin:
+    # Only accepted by Timer.channel(), not modelled. machine.Pin is this class too.
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 17
+    ALT = 2
+    ALT_OPEN_DRAIN = 18
+    ANALOG = 3
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    def __init__(self, id, mode=-1, pull=-1, *, value=None, alt=-1):
+        self.id = id
+        self.mode = mode
+        self._value = value or 0
+
+    def __repr__(self):
+        return f"Pin({self.id!r})"
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self._value = value
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+
+def freq():
+    sim = stm_sim.get()
+    return (sim.sysclk, sim.sysclk, sim.pclk(1), sim.pclk(2))
+
+
+class TimerChannel:
+    def __init__(self, timer, channel, mode):
+        self._timer = timer
+        self._channel = channel
+        self._mode = mode
+        self._ccr = p.TIM_CCR1 + 4 * (channel - 1)
+
+    def __repr__(self):
+        return f"TimerChannel(timer={self._timer._id}, channel={self._channel}, mode={self._mode})"
+
+    def compare(self, value=None):
+        if value is None:
+            return self._timer._read(self._ccr)
+        self._timer._write(self._ccr, value)
+
+    capture = compare
+    pulse_width = compare
+
+    def pulse_width_percent(self, value=None):
+        period = self._timer._read(p.TIM_ARR) + 1
+        if value is None:
+            return self.compare() * 100 / period
+        self.compare(min(period, int(value * period / 100)))
+
+
+class Timer:
+    UP = 0
+    DOWN = 1
+    CENTER = 2
+
+    PWM = 0
+    PWM_INVERTED = 1
+    OC_TIMING = 2
+    OC_ACTIVE = 3
+    OC_INACTIVE = 4
+    OC_TOGGLE = 5
+    OC_FORCED_ACTIVE = 6
+    OC_FORCED_INACTIVE = 7
+
+    HIGH = 0
+    LOW = 2
+
+    def __init__(self, id, **kwargs):
+        self._id = id
+        self._tim = stm_sim.get().timers[id]
+        self._channels = {}
+        if kwargs:
+            self.init(**kwargs)
+
+    def __repr__(self):
+        return f"Timer({self._id})"
+
+    def _read(self, offset):
+        return stm_sim.get().memory.read(self._tim.base + offset)
+
+    def _write(self, offset, value):
+        stm_sim.get().memory.write(self._tim.base + offset, value)
+
+    def _modify(self, offset, clear, set):
+        self._write(offset, (self._read(offset) & ~clear) | set)
+
+    def _counter_mask(self):
+        return 0xFFFFFFFF if self._id == 2 else 0xFFFF
+
+    def _prescaler_period(self, freq):
+        # compute_prescaler_period_from_freq()
+        source = self.source_freq()
+        prescaler = 1
+        period = max(1, int(source / freq))
+        while period > self._counter_mask():
+            # if we can divide exactly, do that first
+            if period % 5 == 0:
+                prescaler *= 5
+                period //= 5
+            elif period % 3 == 0:
+                prescaler *= 3
+                period //= 3
+            else:
+                prescaler <<= 1
+                period >>= 1
+        return prescaler - 1, (period - 1) & self._counter_mask()
+
+    def init(self, *, freq=None, prescaler=None, period=None, mode=UP, div=1, callback=None, deadtime=0):
+        if mode != Timer.UP:
+            raise NotImplementedError("only up counting timers are simulated")
+        sim = stm_sim.get()
+        _, bus, enr, bit, _ = p.TIMERS[self._id]
+        sim.memory.write(p.RCC_BASE + enr, sim.memory.read(p.RCC_BASE + enr) | (1 << bit))
+
+        if freq is not None:
+            prescaler, period = self._prescaler_period(freq)
+        elif prescaler is None or period is None:
+            raise ValueError("must specify either freq, or prescaler and period")
+
+        self._write(p.TIM_CR1, 0)
+        self._write(p.TIM_PSC, prescaler)
+        self._write(p.TIM_ARR, period)
+        if self._tim.has_rcr:
+            self._write(p.TIM_RCR, 0)
+            self._modify(p.TIM_BDTR, 0, p.TIM_BDTR_MOE)
+        # HAL_TIM_Base_Init loads the shadow registers
+        self._write(p.TIM_EGR, p.TIM_EGR_UG)
+        self._write(p.TIM_SR, 0)
+        self.callback(callback)
+        self._write(p.TIM_CR1, p.TIM_CR1_CEN)
+
+    def deinit(self):
+        self.callback(None)
+        self._write(p.TIM_CCER, 0)
+        self._write(p.TIM_CR1, 0)
+
+    def callback(self, fun):
+        if fun is None:
+            self._tim.irq = None
+            self._modify(p.TIM_DIER, p.TIM_DIER_UIE, 0)
+        else:
+            self._tim.irq = lambda: fun(self)
+            self._modify(p.TIM_DIER, 0, p.TIM_DIER_UIE)
+
+    def channel(self, channel, mode=None, pin=None, pulse_width=None, pulse_width_percent=None, compare=0, polarity=HIGH):
+        if mode is None:
+            return self._channels.get(channel)
+
+        if pin is not None and not isinstance(pin, Pin):
+            # As ports/stm32/timer.c
+            raise ValueError("pin argument needs to be be a Pin type")
+
+        ch = channel - 1
+        ccmr = p.TIM_CCMR1 + 4 * (ch >> 1)
+        shift = 8 * (ch & 1)
+        ccer = 0b11 << (4 * ch)
+        self._modify(p.TIM_CCER, ccer, 0)
+
+        tc = TimerChannel(self, channel, mode)
+        if mode in (Timer.PWM, Timer.PWM_INVERTED):
+            # PWM mode 1 / 2 with the compare register preloaded
+            ocm = 0b110 if mode == Timer.PWM else 0b111
+            self._modify(ccmr, 0xFF << shift, ((ocm << 4) | (1 << 3)) << shift)
+            if pulse_width_percent is not None:
+                tc.pulse_width_percent(pulse_width_percent)
+            else:
+                tc.pulse_width(pulse_width or 0)
+        elif mode in _OC_MODES:
+            self._modify(ccmr, 0xFF << shift, (_OC_MODES[mode] << 4) << shift)
+            tc.compare(compare)
+        else:
+            raise NotImplementedError("only PWM and OC channel modes are simulated")
+
+        self._modify(p.TIM_CCER, 0, (1 | (polarity & 2)) << (4 * ch))
+        self._channels[channel] = tc
+        return tc
+
+    def counter(self, value=None):
+        if value is None:
+            return self._read(p.TIM_CNT)
+        self._write(p.TIM_CNT, value)
+
+    def source_freq(self):
+        return stm_sim.get().timer_clock(self._tim.bus)
+
+    def freq(self, value=None):
+        if value is None:
+            ticks = (self._read(p.TIM_PSC) + 1) * (self._read(p.TIM_ARR) + 1)
+            source = self.source_freq()
+            return source // ticks if not source % ticks else source / ticks
+        prescaler, period = self._prescaler_period(value)
+        self._write(p.TIM_PSC, prescaler)
+        self._write(p.TIM_ARR, period)
+
+    def prescaler(self, value=None):
+        if value is None:
+            return self._read(p.TIM_PSC)
+        self._write(p.TIM_PSC, value)
+
+    def period(self, value=None):
+        if value is None:
+            return self._read(p.TIM_ARR)
+        self._write(p.TIM_ARR, value)
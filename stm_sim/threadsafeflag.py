@@ -0,0 +1,9 @@
+# asyncio.ThreadSafeFlag work-alike for cpython. The simulated interrupts run in the
+# thread calling Simulator.run(), ie. from a task, so an asyncio.Event will do.
+import asyncio
+
+
+class ThreadSafeFlag(asyncio.Event):
+    async def wait(self):
+        await super().wait()
+        self.clear()
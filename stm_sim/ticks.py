@@ -0,0 +1,25 @@
+# time.ticks_* work-alikes for cpython, counting simulated rather than wall clock time
+# and wrapping like micropython's.
+import stm_sim
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = _TICKS_PERIOD >> 1
+
+
+def ticks_us():
+    sim = stm_sim.get()
+    return (sim.now * 1_000_000 // sim.sysclk) & _TICKS_MAX
+
+
+def ticks_ms():
+    sim = stm_sim.get()
+    return (sim.now * 1000 // sim.sysclk) & _TICKS_MAX
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(end, start):
+    return ((end - start + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
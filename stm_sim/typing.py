@@ -0,0 +1,10 @@
+# Minimal typing for micropython ports without it, annotations are never evaluated.
+
+
+class _Generic:
+    def __getitem__(self, item):
+        return self
+
+
+Any = Optional = Union = List = Dict = Tuple = Callable = _Generic()
+TYPE_CHECKING = False
@@ -0,0 +1,97 @@
+# uctypes work-alike, reading and writing the simulator memory model.
+# The descriptor encoding matches micropython's moductypes.c
+import stm_sim
+
+_TYPE_SHIFT = 27
+_OFFSET_MASK = 0x1FFFF
+
+UINT8 = 0 << _TYPE_SHIFT
+INT8 = 1 << _TYPE_SHIFT
+UINT16 = 2 << _TYPE_SHIFT
+INT16 = 3 << _TYPE_SHIFT
+UINT32 = 4 << _TYPE_SHIFT
+INT32 = 5 << _TYPE_SHIFT
+BFUINT8 = 8 << _TYPE_SHIFT
+BFINT8 = 9 << _TYPE_SHIFT
+BFUINT16 = 10 << _TYPE_SHIFT
+BFINT16 = 11 << _TYPE_SHIFT
+BFUINT32 = 12 << _TYPE_SHIFT
+BFINT32 = 13 << _TYPE_SHIFT
+
+BF_POS = 17
+BF_LEN = 22
+
+LITTLE_ENDIAN = 0
+BIG_ENDIAN = 1
+NATIVE = 2
+
+# type number: (size in bytes, signed, bitfield)
+_TYPES = {
+    0: (1, False, False),
+    1: (1, True, False),
+    2: (2, False, False),
+    3: (2, True, False),
+    4: (4, False, False),
+    5: (4, True, False),
+    8: (1, False, True),
+    9: (1, True, True),
+    10: (2, False, True),
+    11: (2, True, True),
+    12: (4, False, True),
+    13: (4, True, True),
+}
+
+
+def _decode(value):
+    if not isinstance(value, int) or (value >> _TYPE_SHIFT) & 0xF not in _TYPES:
+        raise NotImplementedError("only scalar and bitfield fields are simulated")
+    size, signed, bitfield = _TYPES[(value >> _TYPE_SHIFT) & 0xF]
+    pos = (value >> BF_POS) & 0x1F if bitfield else 0
+    bits = (value >> BF_LEN) & 0x1F if bitfield else size * 8
+    return value & _OFFSET_MASK, size, signed, pos, bits
+
+
+class struct:
+    def __init__(self, addr, descriptor, layout=NATIVE):
+        object.__setattr__(self, "_addr", addr)
+        object.__setattr__(self, "_desc", descriptor)
+
+    def _field(self, name):
+        try:
+            return _decode(self._desc[name])
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getattr__(self, name):
+        offset, size, signed, pos, bits = self._field(name)
+        value = (stm_sim.get().memory.read(self._addr + offset, size) >> pos) & ((1 << bits) - 1)
+        if signed and value & (1 << (bits - 1)):
+            value -= 1 << bits
+        return value
+
+    def __setattr__(self, name, value):
+        offset, size, signed, pos, bits = self._field(name)
+        memory = stm_sim.get().memory
+        addr = self._addr + offset
+        mask = ((1 << bits) - 1) << pos
+        if bits < size * 8:
+            # Bitfields are a read-modify-write of the whole word
+            value = (memory.read(addr, size) & ~mask) | ((value << pos) & mask)
+        memory.write(addr, value, size)
+
+
+def sizeof(descriptor, layout=NATIVE):
+    end = 0
+    for value in descriptor.values():
+        offset, size, _, _, _ = _decode(value)
+        end = max(end, offset + size)
+    return end
+
+
+def addressof(obj):
+    return stm_sim.get().memory.addressof(obj)
+
+
+def bytes_at(addr, size):
+    memory = stm_sim.get().memory
+    return bytes(memory.read(addr + i, 1) for i in range(size))
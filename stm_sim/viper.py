@@ -0,0 +1,71 @@
+# cpython stand-ins for the viper builtin types, so @micropython.viper functions run as
+# plain python: uint wraps at 32 bits and the ptr types index the simulator memory.
+import operator
+
+import stm_sim
+from stm_sim.memory import _itemsize
+
+_MASK = 0xFFFFFFFF
+
+
+class uint(int):
+    def __new__(cls, value=0):
+        return int.__new__(cls, int(value) & _MASK)
+
+    def __invert__(self):
+        return uint(~int(self))
+
+
+def _wrap(op, reflected=False):
+    if reflected:
+        return lambda self, other: uint(op(int(other), int(self)))
+    return lambda self, other: uint(op(int(self), int(other)))
+
+
+for _name, _op in (
+    ("add", operator.add),
+    ("sub", operator.sub),
+    ("mul", operator.mul),
+    ("floordiv", operator.floordiv),
+    ("mod", operator.mod),
+    ("lshift", operator.lshift),
+    ("rshift", operator.rshift),
+    ("and", operator.and_),
+    ("or", operator.or_),
+    ("xor", operator.xor),
+):
+    setattr(uint, f"__{_name}__", _wrap(_op))
+    setattr(uint, f"__r{_name}__", _wrap(_op, reflected=True))
+
+
+class _Pointer:
+    def __init__(self, addr, size):
+        self.addr = int(addr)
+        self.size = size
+
+    def __getitem__(self, index):
+        return stm_sim.get().memory.read(self.addr + index * self.size, self.size)
+
+    def __setitem__(self, index, value):
+        stm_sim.get().memory.write(self.addr + index * self.size, int(value), self.size)
+
+
+def _ptr(obj, size):
+    if isinstance(obj, int):
+        return _Pointer(obj, size)
+    if _itemsize(obj) == size:
+        # Index the buffer directly
+        return obj
+    return _Pointer(stm_sim.get().memory.addressof(obj), size)
+
+
+def ptr8(obj):
+    return _ptr(obj, 1)
+
+
+def ptr16(obj):
+    return _ptr(obj, 2)
+
+
+def ptr32(obj):
+    return _ptr(obj, 4)
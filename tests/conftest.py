@@ -0,0 +1,34 @@
+# The tests run the driver against the stm_sim simulated registers, from the project
+# folder: $ python -m pytest tests
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import stm_sim
+
+# Before anything imports pyb / machine / uctypes
+stm_sim.install()
+
+from signal_gen.resources import dma_resources
+
+
+@pytest.fixture
+def sim():
+    # A fresh simulator per test, with no timers or DMA channels left claimed
+    yield stm_sim.install()
+    dma_resources._owners.clear()
+
+
+def samples(sim, timer, channel, period):
+    """
+    The output compare values of a PWM channel as (sample index, value), from the
+    first sample on. The timeline only records changes, so indices can skip.
+    """
+    outputs = sim.outputs(timer, channel)[1:]
+    first = outputs[0][0]
+    for cycle, _ in outputs:
+        assert (cycle - first) % period == 0, "sample off the sample clock"
+    return [((cycle - first) // period, value) for cycle, value in outputs]
@@ -0,0 +1,41 @@
+import pytest
+
+
+def test_events_count_every_period(sim):
+    from signal_gen import SignalGenerator
+
+    gen = SignalGenerator(2000, event_timer=2)
+    gen.start()
+    assert gen.events.timer.freq() == 8000
+    sim.run_us(10_000)
+    events = gen.events
+    gen.deinit()
+    assert events.periods in (19, 20) and events.halves in (events.periods, events.periods + 1)
+
+
+def test_poll_freq_follows_set_frequency(sim):
+    from signal_gen import SignalGenerator
+
+    gen = SignalGenerator(1000, event_timer=2)
+    gen.start()
+    gen.set_frequency(4000)
+    assert gen.events.timer.freq() == 16_000
+    sim.run_us(10_000)
+    assert gen.events.periods in (39, 40)
+    gen.deinit()
+
+
+def test_too_low_event_freq(sim):
+    from signal_gen import SignalGenerator
+    from signal_gen.resources import dma_resources
+
+    with pytest.raises(ValueError):
+        SignalGenerator(event_timer=2, event_freq=1000).start()
+    assert not dma_resources._owners
+
+    gen = SignalGenerator(250, event_timer=2, event_freq=1000)
+    gen.start()
+    with pytest.raises(ValueError):
+        gen.set_frequency(500)
+    assert gen.freq == 250
+    gen.deinit()
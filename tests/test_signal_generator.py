@@ -0,0 +1,90 @@
+import pytest
+
+from conftest import samples
+
+
+def test_output_follows_lut(sim):
+    from signal_gen import SignalGenerator
+
+    gen = SignalGenerator(1000, samples=100)
+    gen.start()
+    sim.run_us(2500)
+    out = samples(sim, "TIM1", 3, sim.sysclk // 100_000)
+    gen.deinit()
+
+    lut = list(gen.lut)
+    assert len(out) > 200
+    assert all(value == lut[i % len(lut)] for i, value in out)
+
+
+def test_stop_releases_resources(sim):
+    from signal_gen import SignalGenerator
+    from signal_gen.resources import ResourceConflict
+
+    gen = SignalGenerator()
+    gen.start()
+    with pytest.raises(ResourceConflict):
+        SignalGenerator().start()
+    gen.deinit()
+
+    other = SignalGenerator()
+    other.start()
+    assert other.running()
+    other.deinit()
+
+
+def test_set_frequency_keeps_dma_running(sim):
+    from signal_gen import SignalGenerator
+
+    gen = SignalGenerator(1000, samples=100)
+    gen.start()
+    sim.run_us(500)
+    hdma = gen.hdma
+    assert gen.set_frequency(2000) == 2000
+    sim.run_us(500)
+    assert gen.hdma is hdma and hdma.Instance.CCR & 1
+    gen.deinit()
+
+
+def test_timer_channel_needs_a_pin(sim):
+    from machine import Pin
+    from pyb import Timer
+
+    timer = Timer(1, freq=1000)
+    with pytest.raises(ValueError):
+        timer.channel(3, Timer.PWM, pin="A10")
+    timer.channel(3, Timer.PWM, pin=Pin("A10", Pin.OUT))
+
+
+def test_failed_start_leaves_nothing_claimed(sim):
+    from signal_gen import SignalGenerator
+    from signal_gen.resources import dma_resources
+
+    gen = SignalGenerator(levels=5000)
+    with pytest.raises(ValueError):
+        gen.start()
+    assert not gen.running() and gen.pwm_timer is None
+    assert not dma_resources._owners
+    assert sim.memory.read(sim.timers[1].base) == 0  # TIM1 CR1
+
+    SignalGenerator().start()
+
+
+def test_failed_events_stop_the_dma(sim, monkeypatch):
+    from signal_gen import SignalGenerator
+    from signal_gen.dma_events import DMAEvents
+    from signal_gen.resources import dma_resources
+
+    started = []
+
+    def fail(events):
+        started.append(events.hdma)
+        raise OSError("no timer")
+
+    monkeypatch.setattr(DMAEvents, "start", fail)
+    gen = SignalGenerator(event_timer=17)
+    with pytest.raises(OSError):
+        gen.start()
+    assert not gen.running() and gen.events is None
+    assert not started[0].Instance.CCR & 1
+    assert not dma_resources._owners
@@ -0,0 +1,27 @@
+from conftest import samples
+
+
+def test_generators_start_together_at_their_phases(sim):
+    from signal_gen import SignalGenerator
+    from signal_gen.sync import SyncGroup
+
+    a = SignalGenerator(1000, samples=100, pwm_pin="A6", pwm_timer=16, pwm_channel=1, sample_timer=1)
+    b = SignalGenerator(1000, samples=100, pwm_pin="A7", pwm_timer=17, pwm_channel=1, sample_timer=2)
+    group = SyncGroup()
+    group.add(a)
+    group.add(b, phase=90)
+    group.start()
+    sim.run_us(3000)
+    # The first samples of both go out on the same cycle
+    assert sim.outputs("TIM16", 1)[1][0] == sim.outputs("TIM17", 1)[1][0]
+    period = sim.sysclk // 100_000
+    out_a = samples(sim, "TIM16", 1, period)
+    out_b = samples(sim, "TIM17", 1, period)
+    group.stop()
+
+    lut = list(a.lut)
+    assert all(value == lut[i % 100] for i, value in out_a)
+    # 90 degrees is 25 samples ahead
+    assert all(value == lut[(i + 25) % 100] for i, value in out_b)
+    a.deinit()
+    b.deinit()